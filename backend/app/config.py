@@ -11,6 +11,30 @@ class Settings(BaseSettings):
     # OpenAI Configuration
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL: str = "gpt-4o-mini"
+    # Alternative API endpoint (e.g. the local stub in loadtest/), empty = OpenAI
+    OPENAI_BASE_URL: str = ""
+    OPENAI_KEEPALIVE_SECONDS: float = 60.0  # Idle API connections (and their TLS sessions) kept this long
+    # Pricing (USD per 1M tokens, gpt-4o-mini) used for api_cost_estimate
+    OPENAI_INPUT_COST_PER_1M: float = 0.15
+    OPENAI_CACHED_INPUT_COST_PER_1M: float = 0.075
+    OPENAI_OUTPUT_COST_PER_1M: float = 0.60
+    # Input token budgets (documents are trimmed to these before sending)
+    EXPLANATION_INPUT_TOKENS: int = 1000
+    CLASSIFICATION_INPUT_TOKENS: int = 750
+
+    # Deadlines & Hedging (LLM tail latency)
+    REQUEST_DEADLINE_SECONDS: float = 60.0  # Whole upload pipeline budget
+    LLM_TIMEOUT_SECONDS: float = 45.0  # Per-call cap when no deadline is set
+    HEDGE_ENABLED: bool = True  # Hedge slow classification calls
+    HEDGE_PERCENTILE: float = 0.95  # Hedge once an attempt passes this latency
+    HEDGE_DELAY_MS: int = 0  # Fixed hedge delay (0 = adaptive percentile)
+    HEDGE_INITIAL_DELAY_MS: int = 3000  # Delay used until enough samples exist
+    HEDGE_MIN_DELAY_MS: int = 500  # Never hedge sooner than this
+    HEDGE_MIN_SAMPLES: int = 20
+    # LLM governor (process-wide cap on concurrent OpenAI calls)
+    LLM_MAX_CONCURRENT: int = 32
+    LLM_MAX_BACKGROUND: int = 4  # Share of those usable by speculative work
+    TRANSLATION_PREFETCH_ENABLED: bool = True  # Pre-translate for non-English users
 
     # File Upload Settings
     MAX_FILE_SIZE_MB: int = 50
@@ -38,6 +62,97 @@ class Settings(BaseSettings):
     CACHE_ENABLED: bool = True
     CACHE_TTL_SECONDS: int = 3600  # 1 hour cache for document analysis
     CACHE_MAX_SIZE: int = 100  # Maximum cache entries
+    REJECTION_CACHE_MAX_SIZE: int = 500  # Generated rejection messages kept
+    RESULT_STORE_TTL_SECONDS: int = 3600  # Explanations addressable by content ID
+    RESULT_STORE_MAX_SIZE: int = 1000
+
+    # Classification Micro-batching (opt-in)
+    # Concurrent classifications within the window share one multi-document prompt
+    CLASSIFICATION_BATCH_ENABLED: bool = False
+    CLASSIFICATION_BATCH_WINDOW_MS: int = 15  # Max extra delay per request
+    CLASSIFICATION_BATCH_MAX_SIZE: int = 8  # Flush early once this many are queued
+
+    # Admission control (per-stage capacity; excess load gets 503 + Retry-After)
+    EXTRACTION_MAX_CONCURRENT: int = max(2, os.cpu_count() or 2)  # PDF/Word parsing
+    OCR_MAX_CONCURRENT: int = max(1, (os.cpu_count() or 2) // 2)  # Tesseract is CPU-heavy
+    ADMISSION_MAX_QUEUE: int = 32  # Requests allowed to wait per stage
+    ADMISSION_MAX_WAIT_SECONDS: float = 10.0  # Shed when a stage's estimated wait exceeds this
+    # Initial service time estimates, refined from observed timings
+    ADMISSION_EXTRACTION_SERVICE_SECONDS: float = 0.5
+    ADMISSION_OCR_SERVICE_SECONDS: float = 3.0
+    ADMISSION_LLM_SERVICE_SECONDS: float = 3.0
+
+    # Extraction sandbox (untrusted documents are parsed in worker processes)
+    SANDBOX_ENABLED: bool = True  # False = parse in threads of the API process
+    SANDBOX_WORKERS: int = 0  # 0 = one per extraction + OCR slot (from the final settings)
+    SANDBOX_TASK_TIMEOUT_SECONDS: float = 30.0  # Wall clock per task; the worker is killed after
+    SANDBOX_TASK_CPU_SECONDS: int = 60  # RLIMIT_CPU per task (all page threads together)
+    SANDBOX_MEMORY_LIMIT_MB: int = 2048  # RLIMIT_AS per worker (address space, not RSS)
+    SANDBOX_MAX_TASKS_PER_WORKER: int = 200  # Then the worker is replaced
+    SANDBOX_MAX_RSS_MB: int = 512  # Replace a worker once its peak RSS passes this
+
+    # Per-user rate limiting (GCRA on the anonymous user ID)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_MINUTE: float = 30  # Cost units replenished per minute
+    RATE_LIMIT_BURST: int = 30  # Cost units a user can spend at once
+    RATE_LIMIT_HIT_COST: int = 1  # Request served from cache
+    RATE_LIMIT_MISS_COST: int = 5  # Request that needed OpenAI calls
+    RATE_LIMIT_PER_SESSION: bool = False  # Count each session of a user separately
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "")  # Shared limits across workers
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    # Proxies in front of the app that append to X-Forwarded-For (Render: 1).
+    # 0 = use the socket address; never more than really exist, or clients can pick their IP
+    TRUSTED_PROXY_HOPS: int = 0
+
+    # Metrics (/metrics, Prometheus format)
+    METRICS_DIR: str = os.getenv("METRICS_DIR", "")  # Shared by uvicorn workers; empty = this process only
+    METRICS_FLUSH_SECONDS: float = 5.0  # How often each worker publishes its snapshot
+    METRICS_STALE_SECONDS: float = 60.0  # Snapshots older than this belong to exited workers
+
+    # Request tracing (Server-Timing header, optional OTLP/JSON export)
+    TRACE_SAMPLE_RATE: float = 0.0  # Fraction of requests traced; 0 = only callers sending a sampled traceparent
+    TRACE_SERVER_TIMING: bool = False  # Show stage timings to every traced caller, not only traceparent ones
+    TRACE_EXPORT_PATH: str = os.getenv("TRACE_EXPORT_PATH", "")  # Append traces here; empty = header only
+    TRACE_SERVICE_NAME: str = "sacha-advisor"
+    TRACE_MAX_SPANS: int = 512  # Per request (batch uploads of long PDFs)
+
+    # On-demand profiling (signed X-Profile header or /admin/profile)
+    PROFILER_SECRET: str = os.getenv("PROFILER_SECRET", "")  # Signs profile tokens; empty = disabled
+    PROFILER_TOKEN_MAX_TTL_SECONDS: int = 3600  # Longer-lived tokens are refused
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_INTERVAL_MS: float = 5.0  # Stack sampling interval
+    PROFILE_MAX_SECONDS: float = 60.0  # Longest request or window profile
+    PROFILE_MAX_DOCUMENTS: int = 20  # Documents kept per profile
+
+    # Event-loop monitoring (lag metric, stacks of blocking calls)
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_MS: float = 100.0  # Lag probe period
+    LOOP_BLOCK_THRESHOLD_MS: float = 250.0  # Capture the stack of anything blocking this long
+    LOOP_BLOCK_HISTORY: int = 20  # Blocking events listed on /health
+
+    # Cold start (heavy imports are deferred to first use, see services/preload.py)
+    PRELOAD_ENABLED: bool = True  # Import them in the background once the server is up
+    PRELOAD_DELAY_SECONDS: float = 1.0  # Wait this long after startup first (warm-up off)
+
+    # Startup warm-up (see services/warmup.py); /ready answers 503 until it is done
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT_SECONDS: float = 20.0  # Ready after this even if some steps haven't finished
+    WARMUP_DB_CONNECTIONS: int = 10  # Supabase pool connections opened up front
+    WARMUP_SANDBOX_WORKERS: int = 2  # Sandbox workers started up front (the rest start on demand)
+
+    # Background jobs (/api/jobs)
+    JOB_WORKERS: int = 4  # Documents processed concurrently
+    JOB_QUEUE_MAX_SIZE: int = 50  # Waiting jobs before submissions get 503
+    JOB_TTL_SECONDS: int = 3600  # How long finished jobs can be fetched (from when they finish)
+    JOB_MAX_SIZE: int = 1000  # Finished jobs kept for fetching; the oldest go first
+
+    # Batch uploads (/api/upload-batch)
+    BATCH_MAX_FILES: int = 30
+    BATCH_MAX_CONCURRENCY: int = 8  # Documents of one batch analyzed at once
+
+    # SSE streaming: explanation deltas are merged into frames of this size/age
+    SSE_COALESCE_INTERVAL_MS: int = 30
+    SSE_COALESCE_MAX_BYTES: int = 256
 
     class Config:
         env_file = ".env"
@@ -2,15 +2,21 @@
 Supabase PostgreSQL connection management
 Provides async connection pooling for all database operations
 """
-import asyncpg
+import asyncio
+import re
 from app.config import settings
-from typing import Optional
+from app.services.metrics import db_write_seconds
+from app.services.tracing import span
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import asyncpg
 
 # Global connection pool
-_pool: Optional[asyncpg.Pool] = None
+_pool: Optional["asyncpg.Pool"] = None
 
 
-async def get_pool() -> asyncpg.Pool:
+async def get_pool() -> "asyncpg.Pool":
     """
     Get or create the global connection pool
     Optimized for high concurrency with larger pool and faster timeout
@@ -21,6 +27,8 @@ async def get_pool() -> asyncpg.Pool:
     global _pool
 
     if _pool is None:
+        import asyncpg  # Deferred until the first write (see services/preload.py)
+
         _pool = await asyncpg.create_pool(
             dsn=settings.DATABASE_URL,
             min_size=5,   # Increased from 2 for better concurrency
@@ -37,6 +45,28 @@ async def get_pool() -> asyncpg.Pool:
     return _pool
 
 
+async def warm_up_pool(connections: int) -> None:
+    """
+    Open up to `connections` pool connections now, so the first burst of writes
+    doesn't wait for the pool to grow past min_size (idle ones close after
+    max_inactive_connection_lifetime)
+    """
+    if _pool is None:
+        return  # Not connected - nothing to warm
+
+    acquired = await asyncio.gather(
+        *(_pool.acquire() for _ in range(min(connections, _pool.get_max_size()))),
+        return_exceptions=True)
+    held = [conn for conn in acquired if not isinstance(conn, BaseException)]
+    try:
+        await asyncio.gather(*(conn.execute("SELECT 1") for conn in held))
+    finally:
+        for conn in held:
+            await _pool.release(conn)
+    if len(held) < len(acquired):
+        raise next(error for error in acquired if isinstance(error, BaseException))
+
+
 async def close_pool():
     """
     Close the connection pool gracefully
@@ -79,6 +109,15 @@ async def init_db():
         raise
 
 
+_TABLE_PATTERN = re.compile(r"\b(?:INTO|UPDATE|FROM)\s+(\w+)", re.IGNORECASE)
+
+
+def _table_of(query: str) -> str:
+    """Table a write goes to (metrics label)"""
+    match = _TABLE_PATTERN.search(query)
+    return match.group(1) if match else "unknown"
+
+
 async def execute_query(query: str, *args):
     """
     Execute a query without returning results (INSERT, UPDATE, DELETE)
@@ -87,9 +126,15 @@ async def execute_query(query: str, *args):
         query: SQL query string
         *args: Query parameters
     """
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        await conn.execute(query, *args)
+    # Analytics logging is off when Supabase isn't configured (local runs, load tests)
+    if not settings.DATABASE_URL:
+        return
+
+    table = _table_of(query)
+    with db_write_seconds.time(db="supabase", table=table), span("db_write", db="supabase", table=table):
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            await conn.execute(query, *args)
 
 
 async def fetch_one(query: str, *args):
@@ -2,13 +2,26 @@
 Sacha Advisor - FastAPI Backend
 Main application entry point
 """
+import asyncio
+import time
+_import_started = time.perf_counter()
+
 from app.routers import acknowledge
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.routers import upload, health, translate
+from app.routers import upload, health, translate, jobs, metrics, profiling
+from app.services.metrics import metrics as metrics_registry
+from app.services.tracing import TracingMiddleware
+from app.services.profiler import ProfilingMiddleware
+from app.services.loop_monitor import loop_monitor
+from app.services.sandbox import sandbox
 from app.db.database import init_db
 from app.db.supabase import init_db as init_supabase_db, close_pool
+from app.services.preload import preloader
+from app.services.warmup import warmup
+
+preloader.app_import_ms = round((time.perf_counter() - _import_started) * 1000)
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -26,14 +39,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request spans -> Server-Timing header (and TRACE_EXPORT_PATH)
+app.add_middleware(TracingMiddleware)
+# Stack sampling for requests sent with a signed X-Profile header
+app.add_middleware(ProfilingMiddleware)
+
 # Initialize databases
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize SQLite (legacy) and Supabase (production) databases"""
+    """Initialize SQLite (legacy) and Supabase (production) databases, then warm up"""
     init_db()  # Legacy SQLite for backward compatibility
+    metrics_registry.start()  # Publish this worker's metrics for /metrics (multi-worker)
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()  # Event-loop lag and blocking-call stacks
+    await connect_supabase()
+
+    if settings.WARMUP_ENABLED:
+        warmup.start()  # Includes the deferred imports; /ready answers 503 until it is done
+    elif settings.PRELOAD_ENABLED:
+        preloader.start(delay=settings.PRELOAD_DELAY_SECONDS)  # Deferred imports, off the loop
+
 
+async def connect_supabase():
+    """Connect to Supabase if it is configured (failures only disable analytics logging)"""
     # Check if Supabase environment variables are set
     if not settings.DATABASE_URL:
         print("⚠️  WARNING: DATABASE_URL not set! Supabase logging will NOT work.")
@@ -64,12 +94,18 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Gracefully close Supabase connection pool"""
+    warmup.stop()  # /ready answers 503 while draining
+    loop_monitor.stop()
+    await asyncio.to_thread(sandbox.shutdown)
     await close_pool()
 
 # Include routers
 app.include_router(health.router, tags=["Health"])
+app.include_router(metrics.router, tags=["Health"])
 app.include_router(upload.router, prefix="/api", tags=["Upload"])
 app.include_router(translate.router, prefix="/api", tags=["Translation"])
+app.include_router(jobs.router, prefix="/api", tags=["Jobs"])
+app.include_router(profiling.router, prefix="/admin", tags=["Admin"])
 
 # Import and include acknowledge router
 app.include_router(acknowledge.router, prefix="/api", tags=["Acknowledgment"])
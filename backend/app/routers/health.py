@@ -1,8 +1,23 @@
 """
-Health check router with cache statistics
+Health check router with cache and LLM usage statistics
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from app.services.cache_service import cache_service
+from app.services.usage_tracker import usage_tracker
+from app.services.hedging import get_hedging_stats
+from app.services.rejection_messages import rejection_messages
+from app.services.llm_governor import llm_governor
+from app.services.translation_service import get_translation_stats
+from app.services.result_store import result_store
+from app.services.stream_hub import stream_hub
+from app.services.disconnect import get_disconnect_stats
+from app.services.job_queue import job_queue
+from app.services.admission import admission
+from app.services.rate_limiter import rate_limiter
+from app.services.loop_monitor import loop_monitor
+from app.services.sandbox import sandbox
+from app.services.preload import preloader
+from app.services.warmup import warmup
 
 router = APIRouter()
 
@@ -12,5 +27,28 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "Sacha Advisor API",
-        "cache": cache_service.get_stats()
+        "cache": cache_service.get_stats(),
+        "llm_usage": usage_tracker.get_stats(),
+        "hedging": get_hedging_stats(),
+        "rejection_messages": rejection_messages.get_stats(),
+        "llm_governor": llm_governor.get_stats(),
+        "translation": get_translation_stats(),
+        "result_store": result_store.get_stats(),
+        "stream_hub": stream_hub.get_stats(),
+        "disconnects": get_disconnect_stats(),
+        "jobs": job_queue.get_stats(),
+        "admission": admission.get_stats(),
+        "rate_limit": rate_limiter.get_stats(),
+        "event_loop": loop_monitor.get_stats(),
+        "sandbox": sandbox.get_stats(),
+        "startup": preloader.get_stats(),
+        "warmup": warmup.get_stats()
     }
+
+
+@router.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: 503 until startup warm-up is done (liveness stays on /health)"""
+    if not warmup.ready:
+        response.status_code = 503
+    return {"ready": warmup.ready, "warmup": warmup.get_stats()}
@@ -0,0 +1,101 @@
+"""
+Job router - Background document processing
+Submit returns a job ID immediately; the analysis runs on the worker pool
+and clients poll GET /jobs/{id} or subscribe to /jobs/{id}/events (SSE).
+Useful for large scans/OCR that would otherwise hold a connection open
+past proxy timeouts
+"""
+from fastapi import APIRouter, UploadFile, File, HTTPException, Header, Request, BackgroundTasks
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.services.job_queue import job_queue, QueueFull
+from app.services.sse import SSE_HEADERS, sse_event
+from app.schemas.responses import JobResponse
+from app.services.admission import admission
+from app.routers.upload import check_admission, check_rate_limit, log_upload_start, request_analytics
+from app.config import settings
+from typing import Optional
+import os
+
+router = APIRouter()
+
+# Keep-alive comment interval for idle SSE subscribers (seconds)
+_KEEPALIVE_SECONDS = 15
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(
+    request: Request,
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    language: Optional[str] = Header("english", alias="X-Language"),
+    user_agent: Optional[str] = Header(None, alias="User-Agent"),
+    background_tasks: BackgroundTasks = None
+):
+    """
+    Queue a financial document for analysis and return its job ID right away
+    Returns 503 with Retry-After when the queue is full or a stage it needs is
+    backed up (429 when the user is rate limited)
+    """
+    file_content = await file.read()
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    analytics = request_analytics(request, session_id, user_agent)
+    rate_key = await check_rate_limit(analytics.user_id, session_id, settings.RATE_LIMIT_HIT_COST)
+    # Same load shedding as /upload - don't queue work for a stage that is backed up
+    check_admission(admission.stages_for(file_extension))
+
+    try:
+        job = job_queue.submit(
+            file_content, file_extension, file.filename,
+            analytics=analytics, language=language, rate_key=rate_key)
+    except QueueFull as e:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is busy. Please try again shortly."},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    log_upload_start(background_tasks, analytics, language, file_extension, len(file_content))
+
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Poll a job's status, progress and (once completed) result"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job ID")
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Subscribe to a job over Server-Sent Events
+    Sends the current state, then every change, and ends after the job
+    completes or fails
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job ID")
+
+    async def generate():
+        """Generate SSE stream of job snapshots"""
+        last_sent = None
+        while True:
+            snapshot = job.to_dict()
+            if snapshot != last_sent:
+                yield sse_event(snapshot)
+                last_sent = snapshot
+            if job.done:
+                return
+            await job.wait_for_change(_KEEPALIVE_SECONDS)
+            if job.to_dict() == last_sent:
+                # Idle - keep proxies from closing the connection
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
@@ -0,0 +1,50 @@
+"""
+Metrics router - Prometheus scrape endpoint
+Latency histograms come from the services themselves; queue depths and
+shed/limited counts are read from the services at scrape time
+"""
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.services.metrics import metrics
+from app.services.admission import admission
+from app.services.llm_governor import llm_governor
+from app.services.job_queue import job_queue
+from app.services.rate_limiter import rate_limiter
+
+router = APIRouter()
+
+
+def _stage_stats() -> dict:
+    return admission.get_stats()['stages']
+
+
+metrics.collected(
+    "sacha_stage_waiting", "Requests waiting for a stage slot", ("stage",),
+    lambda: [((stage,), stats['waiting']) for stage, stats in _stage_stats().items()])
+metrics.collected(
+    "sacha_stage_in_flight", "Requests holding a stage slot", ("stage",),
+    lambda: [((stage,), stats['in_flight']) for stage, stats in _stage_stats().items()])
+metrics.collected(
+    "sacha_admission_shed_total", "Uploads refused by admission control", ("stage",),
+    lambda: [((stage,), count) for stage, count in admission.shed.items()], type="counter")
+metrics.collected(
+    "sacha_llm_background_in_flight", "Background OpenAI calls (prefetches) in flight", (),
+    lambda: [((), llm_governor.background_in_flight)])
+metrics.collected(
+    "sacha_job_queue_depth", "Background jobs waiting for a worker", (),
+    lambda: [((), job_queue.get_stats()['queued'])])
+metrics.collected(
+    "sacha_rate_limited_total", "Requests refused by the per-user rate limit", (),
+    lambda: [((), rate_limiter.stats['limited'])], type="counter")
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """All metrics in Prometheus text format (summed across workers when METRICS_DIR is set)"""
+    if metrics.directory:
+        # Reads every worker's snapshot file - keep the file I/O off the event loop
+        body = await asyncio.to_thread(metrics.render)
+    else:
+        body = metrics.render()
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,69 @@
+"""
+Profiling admin router
+Starts a profiling window, reports on running or finished profiles and
+shows the stacks of recent event-loop blocks. Every call needs a signed profile token in X-Profile (see services/profiler.py);
+the routes don't exist while PROFILER_SECRET is unset
+"""
+import os
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+from app.config import settings
+from app.services.loop_monitor import loop_monitor
+from app.services.profiler import profiler, verify_profile_token, ProfilerBusy
+
+router = APIRouter()
+
+
+def _authorize(token: Optional[str]) -> None:
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not verify_profile_token(token):
+        raise HTTPException(status_code=403, detail="Invalid or expired profile token")
+
+
+@router.post("/profile", status_code=202)
+async def start_profile_window(
+    seconds: float = Query(10.0, gt=0),
+    token: Optional[str] = Header(None, alias="X-Profile")
+):
+    """
+    Profile the whole process for the next `seconds` (capped at PROFILE_MAX_SECONDS)
+    Documents uploaded meanwhile are kept with the profile
+    """
+    _authorize(token)
+    try:
+        profile = profiler.start_window(seconds)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profile.summary()
+
+
+@router.get("/profile/{profile_id}")
+async def get_profile(profile_id: str, token: Optional[str] = Header(None, alias="X-Profile")):
+    """Status of a profile, its sample count and the documents it kept"""
+    _authorize(token)
+    summary = profiler.get(profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
+
+
+@router.get("/profile/{profile_id}/stacks")
+async def get_profile_stacks(profile_id: str, token: Optional[str] = Header(None, alias="X-Profile")):
+    """The finished profile's collapsed stacks (flamegraph.pl / speedscope input)"""
+    _authorize(token)
+    summary = profiler.get(profile_id)
+    if summary is None or summary['status'] != "finished":
+        raise HTTPException(status_code=404, detail="Profile not found or still running")
+    path = os.path.join(settings.PROFILE_DIR, f"{profile_id}.collapsed")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile file not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.collapsed")
+
+
+@router.get("/event-loop")
+async def get_event_loop(token: Optional[str] = Header(None, alias="X-Profile")):
+    """Event-loop lag plus the stacks of the calls that recently blocked it"""
+    _authorize(token)
+    return {**loop_monitor.get_stats(), 'recent_blocks': loop_monitor.get_blocks()}
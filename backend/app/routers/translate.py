@@ -1,11 +1,22 @@
 """
 Translation router
 Handles translation requests for multilingual support
+Only explanations this server produced (and still holds in the result
+store) can be translated, so the endpoints can't be used as a general
+purpose translation proxy
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.services.translation_service import translate_to_hindi
-from app.schemas.responses import TranslationResponse
+from app.services.translation_service import (
+    SUPPORTED_LANGUAGES, translate, translate_many, stream_translation, translation_available
+)
+from app.services.result_store import content_id_for, result_store
+from app.services.sse import SSE_HEADERS, sse_event
+from app.schemas.responses import TranslationResponse, BatchTranslationResponse
+from app.routers.upload import client_ip, generate_user_id, check_rate_limit
+from app.config import settings
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -15,20 +26,106 @@ class TranslateRequest(BaseModel):
     target_language: str = "hi"  # Hindi by default
 
 
-@router.post("/translate", response_model=TranslationResponse)
-async def translate_text(request: TranslateRequest):
+class TranslateByIdRequest(BaseModel):
+    content_id: str  # From the upload response / stream complete event
+    target_language: str = "hi"
+
+
+class TranslateBatchRequest(BaseModel):
+    content_id: str
+    target_languages: List[str]
+
+
+def _check_language(target_language: str) -> None:
+    """Reject target languages we don't translate to"""
+    if target_language not in SUPPORTED_LANGUAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported language '{target_language}'. Supported: {', '.join(SUPPORTED_LANGUAGES)}"
+        )
+
+
+def _resolve_content(content_id: str) -> str:
+    """Look up a stored explanation or 404"""
+    explanation = result_store.get(content_id)
+    if explanation is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Unknown or expired content ID. Please upload the document again."
+        )
+    return explanation
+
+
+def _resolve_text(text: str) -> str:
+    """Content ID of posted explanation text, or 404 if this server didn't produce it (recently)"""
+    content_id = content_id_for(text)
+    if result_store.get(content_id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Only explanations returned by an upload can be translated. Please upload the document again."
+        )
+    return content_id
+
+
+async def _rate_limit(http_request: Request, user_agent: Optional[str], session_id: Optional[str],
+                      text: str, codes: List[str], content_id: Optional[str] = None) -> None:
+    """Spend the user's allowance: cheap for cached/in-flight translations, full price otherwise"""
+    cost = sum(settings.RATE_LIMIT_HIT_COST if translation_available(text, code, content_id)
+               else settings.RATE_LIMIT_MISS_COST for code in dict.fromkeys(codes))
+    await check_rate_limit(generate_user_id(client_ip(http_request), user_agent or "unknown"), session_id, cost)
+
+
+@router.post("/translate", response_model=TranslationResponse, deprecated=True)
+async def translate_text(
+    request: TranslateRequest,
+    http_request: Request,
+    session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    user_agent: Optional[str] = Header(None, alias="User-Agent")
+):
     """
-    Translate text to target language
-    Currently supports Hindi (hi)
+    Translate a stored explanation, posted as text (deprecated - use /translate-by-id)
+    Supports Hindi (hi), Tamil (ta), Telugu (te), Marathi (mr) and Bengali (bn)
     """
+    _check_language(request.target_language)
+    content_id = _resolve_text(request.text)
+    await _rate_limit(http_request, user_agent, session_id, request.text,
+                      [request.target_language], content_id)
+
     try:
-        if request.target_language != "hi":
-            raise HTTPException(
-                status_code=400,
-                detail="Currently only Hindi (hi) translation is supported"
-            )
+        translated_text = await translate(request.text, request.target_language, content_id)
+
+        return TranslationResponse(
+            status="success",
+            translated_text=translated_text,
+            language=request.target_language
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Translation failed: {str(e)}"
+        )
+
+
+@router.post("/translate-by-id", response_model=TranslationResponse)
+async def translate_by_id(
+    request: TranslateByIdRequest,
+    http_request: Request,
+    session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    user_agent: Optional[str] = Header(None, alias="User-Agent")
+):
+    """
+    Translate a previously returned explanation by its content ID
+    Only explanations this server produced can be translated this way
+    """
+    _check_language(request.target_language)
+    explanation = _resolve_content(request.content_id)
+    await _rate_limit(http_request, user_agent, session_id, explanation,
+                      [request.target_language], request.content_id)
 
-        translated_text = await translate_to_hindi(request.text)
+    try:
+        translated_text = await translate(
+            explanation, request.target_language, request.content_id)
 
         return TranslationResponse(
             status="success",
@@ -41,3 +138,80 @@ async def translate_text(request: TranslateRequest):
             status_code=500,
             detail=f"Translation failed: {str(e)}"
         )
+
+
+@router.post("/translate-batch", response_model=BatchTranslationResponse)
+async def translate_batch(
+    request: TranslateBatchRequest,
+    http_request: Request,
+    session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    user_agent: Optional[str] = Header(None, alias="User-Agent")
+):
+    """
+    Translate a stored explanation into several languages at once
+    Languages are translated concurrently, so asking for more of them
+    doesn't make the response slower
+    """
+    if not request.target_languages:
+        raise HTTPException(status_code=400, detail="No target languages given")
+    for target_language in request.target_languages:
+        _check_language(target_language)
+    explanation = _resolve_content(request.content_id)
+    await _rate_limit(http_request, user_agent, session_id, explanation,
+                      request.target_languages, request.content_id)
+
+    results = await translate_many(
+        explanation, request.target_languages, request.content_id)
+
+    translations = {code: result for code, result in results.items()
+                    if not isinstance(result, Exception)}
+    errors = {code: f"Translation failed: {str(result)}" for code, result in results.items()
+              if isinstance(result, Exception)}
+    if not translations:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Translation failed: {'; '.join(errors.values())}"
+        )
+
+    return BatchTranslationResponse(
+        status="success" if not errors else "partial",
+        translations=translations,
+        errors=errors
+    )
+
+
+@router.post("/translate-stream")
+async def translate_text_stream(
+    request: TranslateRequest,
+    http_request: Request,
+    session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    user_agent: Optional[str] = Header(None, alias="User-Agent")
+):
+    """
+    Stream a translation of a stored explanation (posted as text) as
+    Server-Sent Events, one event per section. Sections are translated concurrently and sent in document order as
+    soon as each is ready, so the first section arrives well before the
+    whole translation is done
+    """
+    _check_language(request.target_language)
+    content_id = _resolve_text(request.text)
+    await _rate_limit(http_request, user_agent, session_id, request.text,
+                      [request.target_language], content_id)
+
+    async def generate():
+        """Generate SSE stream of translated sections"""
+        try:
+            async for index, total, section in stream_translation(request.text, request.target_language, content_id):
+                yield sse_event({'index': index, 'total': total, 'section': section})
+
+            yield sse_event({'status': 'complete', 'language': request.target_language})
+
+        except Exception as e:
+            print(f"Translation streaming error: {str(e)}")
+            yield sse_event({'status': 'error', 'message': f'Translation failed: {str(e)}'})
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
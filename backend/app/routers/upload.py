@@ -8,25 +8,28 @@ Performance optimizations:
 - Streaming responses (/upload-stream endpoint)
 """
 from fastapi import APIRouter, UploadFile, File, HTTPException, Header, Request, BackgroundTasks
-from fastapi.responses import StreamingResponse
-from starlette.concurrency import run_in_threadpool
-from app.services.file_validation import validate_file
-from app.services.insurance_check import classify_document_with_ai, generate_rejection_message
-from app.services.extractor import extract_text
-from app.services.openai_client import get_insurance_explanation, get_insurance_explanation_stream
-from app.services.logger_service import log_request
-from app.services.logger_tier1 import log_tier1, update_tier1_status
-from app.services.logger_tier2 import log_tier2, update_tier2_event
+from fastapi.responses import Response, StreamingResponse
+from app.services.logger_tier1 import log_tier1
+from app.services.logger_tier2 import log_tier2
 from app.services.logger_tier3 import log_tier3
-from app.services.cache_service import cache_service, cache_key_from_text
+from app.services.sse import SSE_HEADERS, ndjson_line, sse_event
+from app.services.usage_tracker import start_request_usage
+from app.services.deadline import start_deadline
+from app.services.disconnect import DisconnectWatcher
+from app.services.admission import admission, Overloaded
+from app.services.rate_limiter import rate_limiter, rate_limit_key, RateLimited
+from app.services.tracing import span, timing_event, traced
+from app.services.translation_service import cancel_prefetch
+from app.services.document_pipeline import (
+    Analytics, EventOutput, PipelineError, ResponseOutput, analyze_document
+)
+from app.config import settings
 from app.schemas.responses import UploadResponse
 import os
 import asyncio
 import hashlib
 import time
-import json
-from typing import Optional
-from user_agents import parse
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -36,6 +39,98 @@ def generate_user_id(ip: str, user_agent: str) -> str:
     return hashlib.sha256(f"{ip}:{user_agent}".encode()).hexdigest()[:16]
 
 
+def client_ip(request: Request) -> str:
+    """
+    The caller's IP: behind TRUSTED_PROXY_HOPS proxies it is the
+    X-Forwarded-For entry the outermost trusted proxy appended (entries
+    left of it come from the client and can be forged)
+    """
+    hops = settings.TRUSTED_PROXY_HOPS
+    forwarded = request.headers.get("x-forwarded-for")
+    if hops > 0 and forwarded:
+        addresses = [address.strip() for address in forwarded.split(",") if address.strip()]
+        if addresses:
+            return addresses[-min(hops, len(addresses))]
+    return request.client.host if request.client else "unknown"
+
+
+# Extra rate limit cost of a request that needed OpenAI calls (charged once it has)
+MISS_SURCHARGE = settings.RATE_LIMIT_MISS_COST - settings.RATE_LIMIT_HIT_COST
+
+
+async def check_rate_limit(user_id: str, session_id: Optional[str], cost: int) -> str:
+    """
+    Spend the user's rate limit allowance or refuse with 429 + Retry-After
+
+    Returns:
+        str: Rate limit key (to charge MISS_SURCHARGE to later)
+    """
+    key = rate_limit_key(user_id, session_id)
+    try:
+        await rate_limiter.acquire(key, cost)
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Please wait a moment and try again.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return key
+
+
+def check_admission(stages: List[str]) -> None:
+    """Shed the request with 503 + Retry-After if a stage it needs is backed up"""
+    try:
+        admission.admit(stages)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def request_analytics(request: Request, session_id: Optional[str],
+                      user_agent: Optional[str]) -> Analytics:
+    """Anonymous user, device and browser of an upload request (for tier logging)"""
+    from user_agents import parse  # Deferred - compiles its regexes on import (see services/preload.py)
+
+    ua = parse(user_agent or "")
+    return Analytics(
+        session_id=session_id or "no-session",
+        user_id=generate_user_id(client_ip(request), user_agent or "unknown"),
+        device_type="mobile" if ua.is_mobile else "tablet" if ua.is_tablet else "desktop",
+        browser=f"{ua.browser.family} {ua.browser.version_string}"
+    )
+
+
+def log_upload_start(background_tasks: BackgroundTasks, analytics: Analytics,
+                     language: Optional[str], file_extension: str, file_size_bytes: int) -> None:
+    """LOG AT START: track the upload attempt immediately (in background)"""
+    background_tasks.add_task(
+        traced("background_log", log_tier1, task="log_tier1"),
+        user_id=analytics.user_id,
+        session_id=analytics.session_id,
+        user_language_preference=language,
+        file_type=file_extension,
+        extraction_method="ocr" if file_extension in [
+            ".jpg", ".jpeg", ".png"] else "text",
+        request_status="processing"
+    )
+    background_tasks.add_task(
+        traced("background_log", log_tier2, task="log_tier2"),
+        session_id=analytics.session_id,
+        user_id=analytics.user_id,
+        file_size_bytes=file_size_bytes
+    )
+    background_tasks.add_task(
+        traced("background_log", log_tier3, task="log_tier3"),
+        session_id=analytics.session_id,
+        user_id=analytics.user_id,
+        device_type=analytics.device_type,
+        browser=analytics.browser
+    )
+
+
 @router.post("/upload", response_model=UploadResponse)
 async def upload_document(
     request: Request,
@@ -51,340 +146,55 @@ async def upload_document(
     Enhanced with comprehensive analytics tracking across 3 tiers
     OPTIMIZED: Background tasks for 20-30% faster response
     """
-    # Performance tracking
-    start_time = time.time()
-    time_extraction = 0
-    time_classification = 0
-    time_explanation = 0
+    request_usage = start_request_usage()
+    # Every OpenAI call below is bounded by this request's deadline
+    start_deadline(settings.REQUEST_DEADLINE_SECONDS)
+    analytics = request_analytics(request, session_id, user_agent)
 
-    # User tracking
-    client_ip = request.client.host if request.client else "unknown"
-    user_id = generate_user_id(client_ip, user_agent or "unknown")
+    with span("upload_read"):
+        file_content = await file.read()
+    file_extension = os.path.splitext(file.filename)[1].lower()
 
-    # Parse user agent
-    ua = parse(user_agent or "")
-    device_type = "mobile" if ua.is_mobile else "tablet" if ua.is_tablet else "desktop"
-    browser = f"{ua.browser.family} {ua.browser.version_string}"
+    # Charged as a cache hit now; MISS_SURCHARGE is added below if OpenAI was called
+    rate_key = await check_rate_limit(analytics.user_id, session_id, settings.RATE_LIMIT_HIT_COST)
+    # Turn the upload away now rather than queue it behind a backlog
+    check_admission(admission.stages_for(file_extension))
 
-    # Track file info early for failure logging
-    file_content = None
-    file_extension = None
-    file_size_bytes = 0
+    log_upload_start(background_tasks, analytics, language, file_extension, len(file_content))
 
-    # Check if client is still connected
-    async def check_disconnect():
-        """Check periodically if client disconnected"""
-        try:
-            while True:
-                if await request.is_disconnected():
-                    # User closed window/tab during loading - abandoned by user
-                    await update_tier1_status(
-                        session_id=session_id or "no-session",
-                        request_status="abandoned_by_user",
-                        processing_time_total=int(
-                            (time.time() - start_time) * 1000)
-                    )
-                    # Update tier2 with abandoned step (record already created)
-                    await update_tier2_event(
-                        session_id=session_id or "no-session",
-                        event_type="abandoned_at_step",
-                        value="client_disconnect"
-                    )
-                    break
-                await asyncio.sleep(1)  # Check every second
-        except:
-            pass
+    # Cancels this request's pipeline as soon as the client disconnects
+    # (event-driven, no polling)
+    disconnect_watcher = DisconnectWatcher(request)
+    disconnect_watcher.start()
 
     try:
-        # Read file content
-        file_content = await file.read()
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        file_size_bytes = len(file_content)
-
-        # LOG AT START: Track upload attempt immediately (in background)
-        background_tasks.add_task(
-            log_tier1,
-            user_id=user_id,
-            session_id=session_id or "no-session",
-            user_language_preference=language,
-            file_type=file_extension,
-            extraction_method="ocr" if file_extension in [
-                ".jpg", ".jpeg", ".png"] else "text",
-            request_status="processing"
-        )
-        background_tasks.add_task(
-            log_tier2,
-            session_id=session_id or "no-session",
-            user_id=user_id,
-            file_size_bytes=file_size_bytes
-        )
-        background_tasks.add_task(
-            log_tier3,
-            session_id=session_id or "no-session",
-            user_id=user_id,
-            device_type=device_type,
-            browser=browser
-        )
-
-        # Start background task to monitor client disconnect
-        disconnect_task = asyncio.create_task(check_disconnect())
-
-        # Step 1: Validate file (type, size, page count)
-        try:
-            validation_result = await validate_file(file_content, file_extension, file.filename)
-            if not validation_result["valid"]:
-                # Validation error: wrong file type, too many pages, file too large, etc.
-                await update_tier1_status(
-                    session_id=session_id or "no-session",
-                    request_status="invalid_file",
-                    processing_time_total=int(
-                        (time.time() - start_time) * 1000)
-                )
-                await update_tier2_event(
-                    session_id=session_id or "no-session",
-                    event_type="abandoned_at_step",
-                    value="validation"
-                )
-
-                raise HTTPException(
-                    status_code=400,
-                    detail=validation_result["error"]
-                )
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"File validation error: {str(e)}")
+        result = await analyze_document(
+            file_content, file_extension, file.filename, language,
+            output=ResponseOutput(background_tasks), analytics=analytics)
 
-        # Step 2: Extract text from document
-        try:
-            extraction_start = time.time()
-            extracted_text = await extract_text(file_content, file_extension)
-            time_extraction = int((time.time() - extraction_start) * 1000)
-
-            if not extracted_text or len(extracted_text.strip()) < 50:
-                # Document unreadable: can't extract text (poor scan, corrupted file, etc.)
-                await update_tier1_status(
-                    session_id=session_id or "no-session",
-                    request_status="unreadable_document",
-                    processing_time_total=int(
-                        (time.time() - start_time) * 1000)
-                )
-                await update_tier2_event(
-                    session_id=session_id or "no-session",
-                    event_type="abandoned_at_step",
-                    value="extraction"
-                )
-
-                raise HTTPException(
-                    status_code=400,
-                    detail="Could not extract enough text from the document. Please ensure the file is readable."
-                )
-        except HTTPException:
-            raise
-        except Exception as e:
-            # Document unreadable: extraction failed
-            await update_tier1_status(
-                session_id=session_id or "no-session",
-                request_status="unreadable_document",
-                processing_time_total=int((time.time() - start_time) * 1000)
-            )
-            await update_tier2_event(
-                session_id=session_id or "no-session",
-                event_type="abandoned_at_step",
-                value="extraction"
-            )
-            raise HTTPException(
-                status_code=500, detail=f"Text extraction error: {str(e)}")
-
-        # Step 3 & 4: Parallel execution with caching
-        # Run classification and explanation in parallel for 40% speed boost
-        cache_hit = False
-        classification = None
-        explanation = None
+    except PipelineError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
 
-        try:
-            # Check cache first
-            cache_key_classification = cache_key_from_text(
-                extracted_text, "classification")
-            cache_key_explanation = cache_key_from_text(
-                extracted_text, "explanation")
-
-            cached_classification = cache_service.get(cache_key_classification)
-            cached_explanation = cache_service.get(cache_key_explanation)
-
-            cache_hit = cached_classification is not None and cached_explanation is not None
-
-            # Run both operations in parallel if not cached
-            tasks = []
-            classification_start = time.time()
-
-            if cached_classification is None:
-                tasks.append(classify_document_with_ai(extracted_text))
-            else:
-                tasks.append(asyncio.create_task(asyncio.sleep(0)))
-
-            if cached_explanation is None:
-                tasks.append(get_insurance_explanation(extracted_text))
-            else:
-                tasks.append(asyncio.create_task(asyncio.sleep(0)))
-
-            # Execute in parallel
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Process classification result
-            if cached_classification is None:
-                time_classification = int(
-                    (time.time() - classification_start) * 1000)
-                if isinstance(results[0], Exception):
-                    raise HTTPException(
-                        status_code=500, detail=f"Document classification error: {str(results[0])}")
-                classification = results[0]
-                cache_service.set(cache_key_classification, classification)
-            else:
-                time_classification = 0
-                classification = cached_classification
-
-            # Check if document is insurance-related
-            if not classification["is_insurance"] or classification["confidence"] < 0.4:
-                rejection_message = await generate_rejection_message(
-                    classification["document_type"],
-                    classification["reason"]
-                )
-
-                # Rejected by SachAdvisor: not an insurance document
-                await update_tier1_status(
-                    session_id=session_id or "no-session",
-                    request_status="rejected_by_sachadvisor",
-                    processing_time_total=int(
-                        (time.time() - start_time) * 1000)
-                )
-                await update_tier2_event(
-                    session_id=session_id or "no-session",
-                    event_type="abandoned_at_step",
-                    value="classification"
-                )
-
-                raise HTTPException(
-                    status_code=400,
-                    detail=rejection_message
-                )
-
-            # Process explanation result
-            explanation_start = time.time()
-            if cached_explanation is None:
-                time_explanation = int(
-                    (time.time() - explanation_start) * 1000)
-                if isinstance(results[1], Exception):
-                    raise HTTPException(
-                        status_code=500, detail=f"AI explanation error: {str(results[1])}")
-                explanation = results[1]
-                cache_service.set(cache_key_explanation, explanation)
-            else:
-                time_explanation = 0
-                explanation = cached_explanation
-
-        except HTTPException:
+    except asyncio.CancelledError:
+        if not disconnect_watcher.disconnected:
             raise
-        except Exception as e:
-            # System error: unexpected backend failure
-            await update_tier1_status(
-                session_id=session_id or "no-session",
-                request_status="system_error",
-                processing_time_total=int((time.time() - start_time) * 1000)
-            )
-            await update_tier2_event(
-                session_id=session_id or "no-session",
-                event_type="abandoned_at_step",
-                value="processing"
-            )
-            raise HTTPException(
-                status_code=500, detail=f"Processing error: {str(e)}")
-
-        # Calculate total processing time and API cost estimate
-        processing_time_total = int((time.time() - start_time) * 1000)
-
-        # Estimate API cost (GPT-4o-mini: ~$0.15/1M input tokens, ~$0.60/1M output tokens)
-        # Average request: ~2000 input + ~500 output tokens ≈ $0.0006
-        api_cost = 0.0006 if not cache_hit else 0.0
-
-        # Cancel disconnect monitoring (request completed successfully)
-        disconnect_task.cancel()
-
-        # Step 5: Update to completed_not_viewed status (will be updated to 'completed' when user acknowledges)
-        # Move all logging to background tasks for 20-30% faster response
-        try:
-            # Update tier1 - backend processing complete but waiting for user acknowledgment (in background)
-            background_tasks.add_task(
-                update_tier1_status,
-                session_id=session_id or "no-session",
-                request_status="completed_not_viewed",
-                processing_time_total=processing_time_total,
-                explanation=explanation
-            )
-
-            # Tier 3: Advanced analytics (in background)
-            word_count = len(explanation.split()) if explanation else 0
-            background_tasks.add_task(
-                log_tier3,
-                session_id=session_id or "no-session",
-                user_id=user_id,
-                key_entities_found=None,  # Could add NER
-                summary_word_count=word_count,
-                complexity_score=None,  # Could add readability scoring
-                language_detected="en",
-                contains_personal_info=None,
-                referrer_source=None,  # Could track from headers
-                device_type=device_type,
-                browser=browser,
-                came_from_ad_campaign=False
-            )
-
-            # Legacy SQLite logging (in background)
-            background_tasks.add_task(
-                log_request,
-                file_type=file_extension,
-                page_count=validation_result.get("page_count", 1),
-                text_length=len(extracted_text),
-                explanation=explanation or ""
-            )
-        except Exception as e:
-            # Log errors shouldn't crash the response
-            print(f"Background task queueing error: {str(e)}")
-
-        # Return success response
-        return UploadResponse(
-            status="success",
-            is_insurance=True,
-            summary=explanation,
-            filename=file.filename
-        )
-
-    except HTTPException as http_err:
-        # HTTPExceptions are already logged in their respective try blocks
-        raise
-    except Exception as e:
-        # Catch unexpected errors and mark as abandoned
-        try:
-            await update_tier1_status(
-                session_id=session_id or "no-session",
-                request_status="abandoned",
-                processing_time_total=int((time.time() - start_time) * 1000)
-            )
-            if session_id:
-                await log_tier2(
-                    session_id=session_id,
-                    user_id=user_id,
-                    abandoned_at_step="unexpected_error",
-                    file_size_bytes=file_size_bytes
-                )
-        except:
-            pass  # Don't let logging errors crash error handling
-
-        raise HTTPException(
-            status_code=500,
-            detail=f"Unexpected error: {str(e)}"
-        )
+        # User closed window/tab during loading - abandoned by user (logged by the pipeline)
+        disconnect_watcher.acknowledge()
+        # Nobody is listening any more; 499 = client closed request
+        return Response(status_code=499)
+
+    finally:
+        disconnect_watcher.stop()
+        if request_usage.calls:
+            await rate_limiter.charge(rate_key, MISS_SURCHARGE)
+
+    return UploadResponse(
+        status="success",
+        is_insurance=True,
+        summary=result["summary"],
+        filename=file.filename,
+        content_id=result["content_id"]
+    )
 
 
 @router.post("/upload-stream")
@@ -402,135 +212,195 @@ async def upload_document_stream(
     OPTIMIZED: 50% faster perceived speed with streaming
     """
 
+    # Read the upload before returning - FastAPI closes the file once the
+    # endpoint returns, before the stream body is generated
+    with span("upload_read"):
+        file_content = await file.read()
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    analytics = request_analytics(request, session_id, user_agent)
+
+    # Refuse before the stream starts, while a real 429/503 can still be sent
+    rate_key = await check_rate_limit(analytics.user_id, session_id, settings.RATE_LIMIT_HIT_COST)
+    check_admission(admission.stages_for(file_extension))
+
+    log_upload_start(background_tasks, analytics, language, file_extension, len(file_content))
+
     async def generate():
         """Generate SSE stream with progressive updates"""
-        start_time = time.time()
+        request_usage = start_request_usage()
+        start_deadline(settings.REQUEST_DEADLINE_SECONDS)
+        events = EventOutput(background_tasks)
 
+        # Starlette cancels the stream when the ASGI server reports
+        # http.disconnect, which cancels the pipeline (logged as abandoned)
+        delivered = False
         try:
-            # User tracking
-            client_ip = request.client.host if request.client else "unknown"
-            user_id = generate_user_id(client_ip, user_agent or "unknown")
+            async for event in events.follow(analyze_document(
+                    file_content, file_extension, file.filename, language,
+                    output=events, analytics=analytics)):
+                yield sse_event(event)
+
+            yield sse_event({'status': 'complete', 'progress': 100, 'filename': file.filename,
+                             'content_id': events.result["content_id"]})
+            delivered = True
+
+        except PipelineError as e:
+            yield sse_event({'status': 'error', 'message': e.message})
+
+        finally:
+            if not delivered and events.result is not None:
+                # Gone after the pipeline finished - nobody will ask for the translation
+                cancel_prefetch(events.result["prefetch_key"])
+            if request_usage.calls:
+                await rate_limiter.charge(rate_key, MISS_SURCHARGE)
+
+        # Trailer: the stream's Server-Timing (the headers went out before any stage ran)
+        timing = timing_event()
+        if timing is not None:
+            yield sse_event(timing)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
-            # Parse user agent
-            ua = parse(user_agent or "")
-            device_type = "mobile" if ua.is_mobile else "tablet" if ua.is_tablet else "desktop"
-            browser = f"{ua.browser.family} {ua.browser.version_string}"
 
-            # Read file
+@router.post("/upload-batch")
+async def upload_documents_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    language: Optional[str] = Header("english", alias="X-Language"),
+    user_agent: Optional[str] = Header(None, alias="User-Agent"),
+    accept: Optional[str] = Header(None, alias="Accept")
+):
+    """
+    Analyze many financial documents in one request
+    Files are analyzed concurrently (identical files only once) and each
+    result is streamed as soon as it is ready - NDJSON by default, SSE
+    when the client accepts text/event-stream. Total time approaches the
+    slowest single file instead of the sum of all of them
+    """
+    if len(files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files ({len(files)}). Please upload at most {settings.BATCH_MAX_FILES} at a time."
+        )
+
+    # Read every upload before returning - FastAPI closes the files once the endpoint returns
+    # Identical files (same content hash) are analyzed once and reported for each copy
+    documents = {}  # content hash -> (file content, extension, filename)
+    copies = {}  # content hash -> indexes of the files with that content
+    filenames = []
+    for index, file in enumerate(files):
+        with span("upload_read", file=index):
             file_content = await file.read()
-            file_extension = os.path.splitext(file.filename)[1].lower()
-            file_size_bytes = len(file_content)
-
-            # Log start (in background)
-            background_tasks.add_task(
-                log_tier1,
-                user_id=user_id,
-                session_id=session_id or "no-session",
-                user_language_preference=language,
-                file_type=file_extension,
-                extraction_method="ocr" if file_extension in [
-                    ".jpg", ".jpeg", ".png"] else "text",
-                request_status="processing"
-            )
-
-            yield f"data: {json.dumps({'status': 'validating', 'progress': 10})}\n\n"
-
-            # Step 1: Validate
-            validation_result = await validate_file(file_content, file_extension, file.filename)
-            if not validation_result["valid"]:
-                yield f"data: {json.dumps({'status': 'error', 'message': validation_result['error']})}\n\n"
-                return
-
-            yield f"data: {json.dumps({'status': 'extracting', 'progress': 30})}\n\n"
-
-            # Step 2: Extract text
-            extracted_text = await extract_text(file_content, file_extension)
-
-            if not extracted_text or len(extracted_text.strip()) < 50:
-                yield f"data: {json.dumps({'status': 'error', 'message': 'Could not extract enough text from document'})}\n\n"
-                return
-
-            yield f"data: {json.dumps({'status': 'classifying', 'progress': 50})}\n\n"
-
-            # Step 3: Check cache and classify
-            cache_key_classification = cache_key_from_text(
-                extracted_text, "classification")
-            cache_key_explanation = cache_key_from_text(
-                extracted_text, "explanation")
-
-            cached_classification = cache_service.get(cache_key_classification)
-            cached_explanation = cache_service.get(cache_key_explanation)
-
-            # Classify document
-            if cached_classification is None:
-                classification = await classify_document_with_ai(extracted_text)
-                cache_service.set(cache_key_classification, classification)
-            else:
-                classification = cached_classification
-
-            if not classification["is_insurance"] or classification["confidence"] < 0.4:
-                rejection_message = await generate_rejection_message(
-                    classification["document_type"],
-                    classification["reason"]
-                )
-                yield f"data: {json.dumps({'status': 'error', 'message': rejection_message})}\n\n"
-                return
-
-            yield f"data: {json.dumps({'status': 'generating', 'progress': 60, 'is_insurance': True})}\n\n"
-
-            # Step 4: Stream explanation
-            if cached_explanation is None:
-                full_explanation = ""
-                async for chunk in get_insurance_explanation_stream(extracted_text):
-                    full_explanation += chunk
-                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-
-                cache_service.set(cache_key_explanation, full_explanation)
-                explanation = full_explanation
-            else:
-                # Send cached explanation in chunks for consistent experience
-                explanation = cached_explanation
-                chunk_size = 50
-                for i in range(0, len(explanation), chunk_size):
-                    chunk = explanation[i:i+chunk_size]
-                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-                    # Small delay to simulate streaming
-                    await asyncio.sleep(0.01)
-
-            # Calculate processing time
-            processing_time_total = int((time.time() - start_time) * 1000)
-
-            # Log completion (in background)
-            background_tasks.add_task(
-                update_tier1_status,
-                session_id=session_id or "no-session",
-                request_status="completed_not_viewed",
-                processing_time_total=processing_time_total,
-                explanation=explanation
-            )
-
-            word_count = len(explanation.split()) if explanation else 0
-            background_tasks.add_task(
-                log_tier3,
-                session_id=session_id or "no-session",
-                user_id=user_id,
-                summary_word_count=word_count,
-                device_type=device_type,
-                browser=browser
-            )
-
-            yield f"data: {json.dumps({'status': 'complete', 'progress': 100, 'filename': file.filename})}\n\n"
-
-        except Exception as e:
-            print(f"Streaming error: {str(e)}")
-            yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+        content_hash = hashlib.sha256(file_content).hexdigest()
+        filenames.append(file.filename)
+        copies.setdefault(content_hash, []).append(index)
+        if content_hash not in documents:
+            documents[content_hash] = (
+                file_content, os.path.splitext(file.filename)[1].lower(), file.filename)
+
+    # Each unique document costs as much as a single upload, paid as it starts:
+    # the first one now (an exhausted user gets a 429), the rest in analyze() -
+    # so a batch never costs more than the allowance left, and MISS_SURCHARGE
+    # debt is bounded by the documents in flight rather than the batch size
+    rate_key = await check_rate_limit(
+        generate_user_id(client_ip(request), user_agent or "unknown"), session_id,
+        settings.RATE_LIMIT_HIT_COST)
+    check_admission(sorted({stage for _, file_extension, _ in documents.values()
+                   for stage in admission.stages_for(file_extension)}))
+
+    use_sse = "text/event-stream" in (accept or "")
+    encode = sse_event if use_sse else ndjson_line
+    slots = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    prefetch_keys: List[str] = []  # Translations started for this batch's documents
+
+    async def analyze(content_hash: str, paid: bool) -> dict:
+        """Analyze one unique document under its own deadline"""
+        file_content, file_extension, filename = documents[content_hash]
+        async with slots:
+            if not paid:
+                try:
+                    await rate_limiter.acquire(rate_key, settings.RATE_LIMIT_HIT_COST)
+                except RateLimited as e:
+                    return {"status": "error", "status_code": 429, "retry_after": e.retry_after,
+                            "message": f"Rate limit reached. Please try this file again in {e.retry_after}s."}
+            start_deadline(settings.REQUEST_DEADLINE_SECONDS)
+            document_usage = start_request_usage()
+            try:
+                result = await analyze_document(file_content, file_extension, filename, language)
+                if result["prefetch_key"]:
+                    prefetch_keys.append(result["prefetch_key"])
+                return {
+                    "status": "success",
+                    "is_insurance": True,
+                    "summary": result["summary"],
+                    "content_id": result["content_id"]
+                }
+            except PipelineError as e:
+                return {"status": "error", "status_code": e.status_code, "message": e.message}
+            except Exception as e:
+                return {"status": "error", "status_code": 500, "message": f"Processing error: {str(e)}"}
+            finally:
+                if document_usage.calls:
+                    await rate_limiter.charge(rate_key, MISS_SURCHARGE)
 
+    async def generate():
+        """Stream one record per file, in completion order"""
+        start_time = time.time()
+        start_request_usage()
+        tasks = {asyncio.create_task(analyze(content_hash, paid=index == 0)): content_hash
+                 for index, content_hash in enumerate(documents)}
+        succeeded = failed = 0
+        delivered = False
+
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    indexes = copies[tasks[task]]
+                    for index in indexes:
+                        if result["status"] == "success":
+                            succeeded += 1
+                        else:
+                            failed += 1
+                        record = {"index": index, "filename": filenames[index], **result}
+                        if index != indexes[0]:
+                            record["duplicate_of"] = indexes[0]
+                        yield encode(record)
+
+            yield encode({
+                "status": "complete",
+                "total": len(filenames),
+                "unique": len(documents),
+                "succeeded": succeeded,
+                "failed": failed,
+                "processing_time_ms": int((time.time() - start_time) * 1000)
+            })
+            delivered = True
+            timing = timing_event()
+            if timing is not None:
+                yield encode(timing)
+
+        finally:
+            # Client went away - stop analyzing the rest
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            if not delivered:
+                # ...and translating the ones it will never ask to translate
+                for prefetch_key in prefetch_keys:
+                    cancel_prefetch(prefetch_key)
+
+    if use_sse:
+        return StreamingResponse(generate(), media_type="text/event-stream", headers=SSE_HEADERS)
     return StreamingResponse(
         generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",  # Disable nginx buffering
-            "Connection": "keep-alive"
-        }
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
@@ -2,7 +2,7 @@
 Response schemas for API endpoints
 """
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 
 
 class UploadResponse(BaseModel):
@@ -10,6 +10,7 @@ class UploadResponse(BaseModel):
     is_insurance: bool
     summary: str
     filename: Optional[str] = None
+    content_id: Optional[str] = None  # Pass to /translate-by-id instead of the summary
 
 
 class TranslationResponse(BaseModel):
@@ -18,6 +19,22 @@ class TranslationResponse(BaseModel):
     language: str
 
 
+class BatchTranslationResponse(BaseModel):
+    status: str  # "success", or "partial" if some languages failed
+    translations: Dict[str, str]  # Language code -> translated text
+    errors: Dict[str, str] = {}
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed, failed
+    stage: str
+    progress: int
+    filename: Optional[str] = None
+    result: Optional[dict] = None  # Same fields as UploadResponse once completed
+    error: Optional[dict] = None  # status_code and message if failed
+
+
 class ErrorResponse(BaseModel):
     status: str = "error"
     message: str
@@ -0,0 +1,168 @@
+"""
+Admission control
+Every upload passes through the same capacity-limited stages - CPU text
+extraction, OCR, and the OpenAI calls (the LLM governor). Each stage
+tracks how many requests are waiting and how long it takes to serve one,
+so an upload can be turned away up front with 503 + Retry-After when a
+stage it needs is already backed up, instead of being accepted and
+dragging everyone's latency up with it
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, List
+from app.config import settings
+from app.services.llm_governor import llm_governor
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class Overloaded(Exception):
+    """A stage the request needs is over capacity"""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"Server is busy ({stage}), please retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """
+    Concurrency limit for one pipeline stage with wait-time estimation
+    """
+
+    def __init__(self, name: str, capacity: int, service_seconds: float):
+        """
+        Args:
+            name: Stage name (for metrics and errors)
+            capacity: Requests served at once
+            service_seconds: Initial per-request service time estimate
+        """
+        self.name = name
+        self.capacity = capacity
+        self._slots = asyncio.Semaphore(capacity)
+        self.in_flight = 0
+        self.waiting = 0
+        self.avg_service_seconds = service_seconds  # EWMA of observed service times
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the stage's slots for the duration of the block"""
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            served = time.perf_counter() - started
+            self.avg_service_seconds = 0.9 * self.avg_service_seconds + 0.1 * served
+            self.in_flight -= 1
+            self._slots.release()
+
+    def estimated_wait_seconds(self) -> float:
+        """Expected wait for a slot right now, from the observed service times"""
+        if self.in_flight < self.capacity:
+            return 0.0
+        return (self.waiting + 1) * self.avg_service_seconds / self.capacity
+
+    def get_stats(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'capacity': self.capacity,
+            'avg_service_ms': round(self.avg_service_seconds * 1000),
+            'estimated_wait_ms': round(self.estimated_wait_seconds() * 1000)
+        }
+
+
+class AdmissionController:
+    """
+    Decides whether a new upload is accepted, based on the stages it will use
+    """
+
+    def __init__(self, max_queue: int, max_wait_seconds: float):
+        """
+        Args:
+            max_queue: Requests allowed to wait per stage
+            max_wait_seconds: Largest estimated wait an accepted request may face per stage
+        """
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.extraction = StageLimiter(
+            "extraction", settings.EXTRACTION_MAX_CONCURRENT,
+            settings.ADMISSION_EXTRACTION_SERVICE_SECONDS)
+        self.ocr = StageLimiter(
+            "ocr", settings.OCR_MAX_CONCURRENT, settings.ADMISSION_OCR_SERVICE_SECONDS)
+        self.admitted = 0
+        self.shed = {'extraction': 0, 'ocr': 0, 'llm': 0}
+
+    def extraction_stage(self, file_extension: str) -> StageLimiter:
+        """The extraction stage a file type runs in"""
+        return self.ocr if file_extension in IMAGE_EXTENSIONS else self.extraction
+
+    def stages_for(self, file_extension: str) -> List[str]:
+        """Stages an upload of this type passes through"""
+        return [self.extraction_stage(file_extension).name, "llm"]
+
+    def _stage_load(self, stage: str):
+        """(waiting, estimated wait) for a stage"""
+        if stage == "llm":
+            return llm_governor.waiting, llm_governor.estimated_wait_seconds()
+        limiter = self.ocr if stage == "ocr" else self.extraction
+        return limiter.waiting, limiter.estimated_wait_seconds()
+
+    def admit(self, stages: Iterable[str]) -> None:
+        """
+        Accept a request or shed it
+
+        Args:
+            stages: Stages the request will use (see stages_for)
+
+        Raises:
+            Overloaded: A stage's wait queue is full or its estimated wait
+                exceeds the limit; retry_after is when its backlog should have drained
+        """
+        for stage in stages:
+            waiting, wait_seconds = self._stage_load(stage)
+            if waiting >= self.max_queue or wait_seconds > self.max_wait_seconds:
+                self.shed[stage] += 1
+                raise Overloaded(stage, max(1, math.ceil(wait_seconds)))
+        self.admitted += 1
+
+    def get_stats(self) -> dict:
+        """
+        Get admission statistics
+
+        Returns:
+            Dictionary with admitted/shed counts and per-stage queue depth
+        """
+        return {
+            'admitted': self.admitted,
+            'shed': dict(self.shed),
+            'max_queue': self.max_queue,
+            'max_wait_ms': round(self.max_wait_seconds * 1000),
+            'stages': {
+                'extraction': self.extraction.get_stats(),
+                'ocr': self.ocr.get_stats(),
+                'llm': {
+                    'in_flight': llm_governor.in_flight,
+                    'waiting': llm_governor.waiting,
+                    'capacity': llm_governor.max_concurrent,
+                    'avg_service_ms': round(llm_governor.avg_service_seconds * 1000),
+                    'estimated_wait_ms': round(llm_governor.estimated_wait_seconds() * 1000)
+                }
+            }
+        }
+
+
+# Global admission controller
+admission = AdmissionController(
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_wait_seconds=settings.ADMISSION_MAX_WAIT_SECONDS
+)
@@ -4,9 +4,12 @@ Implements TTL-based in-memory caching for expensive operations
 """
 import hashlib
 import json
+import time
 from typing import Optional, Any
 from cachetools import TTLCache
 from app.config import settings
+from app.services.metrics import cache_lookup_seconds
+from app.services.tracing import span
 
 
 class CacheService:
@@ -53,7 +56,15 @@ class CacheService:
         """
         if not self.enabled or self.cache is None:
             return None
-        return self.cache.get(key)
+        # Keys are "<operation>:<hash>"; anything else is one label so hashes never become labels
+        operation = key.split(":", 1)[0] if ":" in key else "other"
+        lookup_start = time.perf_counter()
+        with span("cache_lookup", operation=operation):
+            value = self.cache.get(key)
+        cache_lookup_seconds.observe(
+            time.perf_counter() - lookup_start, operation=operation,
+            result="miss" if value is None else "hit")
+        return value
 
     def set(self, key: str, value: Any) -> None:
         """
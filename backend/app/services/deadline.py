@@ -0,0 +1,132 @@
+"""
+Request deadline service
+A per-request deadline is set once by the router and propagates (through a
+context variable) to every awaited OpenAI call, so no call can outlive the
+request that started it
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request runs out of time before a call completes"""
+
+
+class Deadline:
+    """Absolute point in time by which a request must finish"""
+
+    def __init__(self, seconds: float):
+        """
+        Args:
+            seconds: Time budget from now
+        """
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar(
+    "request_deadline", default=None)
+
+
+def start_deadline(seconds: float) -> Deadline:
+    """
+    Set the deadline for the current request
+    Tasks spawned afterwards inherit it
+
+    Args:
+        seconds: Time budget for the whole request
+
+    Returns:
+        The request's deadline
+    """
+    deadline = Deadline(seconds)
+    _deadline.set(deadline)
+    return deadline
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Get the deadline of the current request, if any"""
+    return _deadline.get()
+
+
+def remaining_time(default: float) -> float:
+    """
+    Timeout to use for the next call
+
+    Args:
+        default: Timeout when no request deadline is set
+
+    Returns:
+        The smaller of the default and the time left on the deadline
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return min(default, deadline.remaining())
+
+
+async def with_deadline(awaitable: Awaitable[T], default_timeout: float) -> T:
+    """
+    Await a call bounded by the request deadline
+
+    Args:
+        awaitable: Coroutine to run
+        default_timeout: Timeout when no request deadline is set
+
+    Returns:
+        Result of the awaitable
+
+    Raises:
+        DeadlineExceeded: If the time runs out first
+    """
+    timeout = remaining_time(default_timeout)
+    if timeout <= 0:
+        # Don't leave a never-awaited coroutine behind
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("Request deadline exceeded")
+
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(
+            f"Call did not complete within {timeout:.2f}s") from None
+
+
+async def iterate_with_deadline(iterator: AsyncIterator[T], default_timeout: float) -> AsyncIterator[T]:
+    """
+    Iterate a stream bounded as a whole by the request deadline
+    (with_deadline only covers one await - a stream that stalls halfway
+    would otherwise outlive the request)
+
+    Args:
+        iterator: Async iterator to drain
+        default_timeout: Time for the whole stream when no request deadline is set
+
+    Yields:
+        Items of the iterator
+
+    Raises:
+        DeadlineExceeded: If the time runs out before the stream ends
+    """
+    expires_at = time.monotonic() + remaining_time(default_timeout)
+    items = iterator.__aiter__()
+    while True:
+        try:
+            item = await asyncio.wait_for(items.__anext__(), max(0.0, expires_at - time.monotonic()))
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Stream did not finish before the deadline") from None
+        yield item
@@ -0,0 +1,584 @@
+"""
+Document analysis pipeline
+validate -> extract -> normalize -> classify + explain -> publish -> log,
+declared as a stage graph: each stage names the stages it runs after and
+starts as soon as they are done, so independent stages (classification
+and explanation) overlap without any caller arranging it. /upload,
+/upload-stream, background jobs and batch uploads all run this one graph
+and differ only in their output adapter (JSON response, SSE events, job
+store). Failures are raised as PipelineError carrying the HTTP status and
+tier1 request_status to report them with
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import BackgroundTasks
+from app.services.file_validation import validate_file
+from app.services.extractor import extract_text
+from app.services.sandbox import SandboxError
+from app.services.insurance_check import classify_document_with_ai, generate_rejection_message
+from app.services.openai_client import get_insurance_explanation, get_insurance_explanation_stream
+from app.services.cache_service import cache_service, cache_key_from_text
+from app.services.result_store import result_store
+from app.services.translation_service import prefetch_translation, cancel_prefetch
+from app.services.sse import coalesce
+from app.services.stream_hub import stream_hub
+from app.services.deadline import DeadlineExceeded
+from app.services.usage_tracker import current_request_usage, start_request_usage
+from app.services.logger_service import log_request
+from app.services.logger_tier1 import update_tier1_status
+from app.services.logger_tier2 import update_tier2_event
+from app.services.logger_tier3 import log_tier3
+from app.services.metrics import file_type_label, pipeline_seconds, stage_seconds
+from app.services.tracing import span, traced
+from app.services.profiler import profiler
+
+
+class PipelineError(Exception):
+    """A document that can't be analyzed, with how to report it"""
+
+    def __init__(self, message: str, status_code: int, request_status: str, stage: str):
+        """
+        Args:
+            message: User-facing error message
+            status_code: HTTP status the upload endpoints return for this failure
+            request_status: tier1 request_status to log
+            stage: Pipeline step it failed at (tier2 abandoned_at_step)
+        """
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.request_status = request_status
+        self.stage = stage
+
+
+# ---------------------------------------------------------------------------
+# Output adapters
+# ---------------------------------------------------------------------------
+
+class PipelineOutput:
+    """
+    Where a run's progress, explanation chunks and logging go
+    The base adapter discards progress and logs inline (batch uploads)
+    """
+
+    # Stream the explanation as it is generated (chunk() is called per piece)
+    streams_explanation = False
+
+    def progress(self, stage: str, percent: int, **details) -> None:
+        """A user-visible stage started"""
+
+    def chunk(self, text: str) -> None:
+        """The next piece of a streamed explanation"""
+
+    def stage_timed(self, stage: str, duration_ms: int) -> None:
+        """A stage finished (or failed) after duration_ms"""
+
+    async def defer(self, fn: Callable[..., Awaitable[Any]], **kwargs) -> None:
+        """Run a logging call (inline here; adapters with a response defer it)"""
+        await fn(**kwargs)
+
+
+class ResponseOutput(PipelineOutput):
+    """
+    For an HTTP response: logging runs in the response's background tasks
+    """
+
+    def __init__(self, background_tasks: BackgroundTasks):
+        self.background_tasks = background_tasks
+
+    async def defer(self, fn: Callable[..., Awaitable[Any]], **kwargs) -> None:
+        self.background_tasks.add_task(traced("background_log", fn, task=fn.__name__), **kwargs)
+
+
+class EventOutput(ResponseOutput):
+    """
+    For Server-Sent Events: progress and explanation chunks become events
+
+    Usage:
+        events = EventOutput(background_tasks)
+        async for event in events.follow(analyze_document(..., output=events)):
+            yield sse_event(event)
+        events.result  # analyze_document's return value
+    """
+
+    streams_explanation = True
+
+    def __init__(self, background_tasks: BackgroundTasks):
+        super().__init__(background_tasks)
+        self.result: Optional[dict] = None
+        self._events: asyncio.Queue = asyncio.Queue()
+
+    def progress(self, stage: str, percent: int, **details) -> None:
+        self._events.put_nowait({'status': stage, 'progress': percent, **details})
+
+    def chunk(self, text: str) -> None:
+        self._events.put_nowait({'chunk': text})
+
+    async def follow(self, pipeline: Awaitable[dict]) -> AsyncIterator[dict]:
+        """
+        Run the pipeline and yield its events as they happen
+
+        Raises:
+            PipelineError: After the events before the failure were yielded
+        """
+        async def run() -> dict:
+            try:
+                return await pipeline
+            finally:
+                self._events.put_nowait(None)
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await self._events.get()
+                if event is None:
+                    break
+                yield event
+            self.result = await task
+        finally:
+            # Consumer went away - stop the pipeline
+            if not task.done():
+                task.cancel()
+                await asyncio.wait({task})
+
+
+# ---------------------------------------------------------------------------
+# Stage graph engine
+# ---------------------------------------------------------------------------
+
+class Analytics:
+    """Who a tracked upload belongs to (runs without one are not tier-logged)"""
+
+    def __init__(self, session_id: str, user_id: str,
+                 device_type: Optional[str] = None, browser: Optional[str] = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.device_type = device_type
+        self.browser = browser
+
+
+class DocumentRun:
+    """
+    One document going through the pipeline and everything its stages produce
+    """
+
+    def __init__(self, file_content: bytes, file_extension: str, filename: str,
+                 language: Optional[str], output: PipelineOutput,
+                 analytics: Optional[Analytics]):
+        self.file_content = file_content
+        self.file_extension = file_extension
+        self.filename = filename
+        self.language = language
+        self.output = output
+        self.analytics = analytics
+        self.request_usage = current_request_usage() or start_request_usage()
+        self.start_time = time.time()
+        self.timings: Dict[str, int] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+        # Filled in by the stages
+        self.validation: dict = {}
+        self.text = ""
+        self.cache_key_classification = ""
+        self.cache_key_explanation = ""
+        self.cached_classification: Optional[dict] = None
+        self.cached_explanation: Optional[str] = None
+        self.classification: Optional[dict] = None
+        self.explanation: Optional[str] = None
+        self.content_id: Optional[str] = None
+        self.prefetch_key: Optional[str] = None
+
+    @property
+    def cache_hit(self) -> bool:
+        return self.cached_classification is not None and self.cached_explanation is not None
+
+    @property
+    def elapsed_ms(self) -> int:
+        return int((time.time() - self.start_time) * 1000)
+
+    async def wait(self, stage: str) -> None:
+        """
+        Wait for a stage this one overlaps with but must not get ahead of
+        (e.g. explanation chunks are only sent once the document is accepted)
+
+        Raises:
+            The stage's exception if it failed
+        """
+        task = self.tasks[stage]
+        await asyncio.wait({task})
+        task.result()
+
+
+StageFunction = Callable[[DocumentRun], Awaitable[None]]
+
+
+class Stage:
+    """One step of the pipeline and the steps it has to run after"""
+
+    def __init__(self, name: str, run: StageFunction, after: Tuple[str, ...] = (),
+                 progress: Optional[Tuple[str, int]] = None):
+        """
+        Args:
+            name: Stage name (timings are recorded under it)
+            run: Does the work, reading and writing DocumentRun fields
+            after: Stages that must have finished first
+            progress: (status, percent) reported to the output when the stage starts
+        """
+        self.name = name
+        self.run = run
+        self.after = after
+        self.progress = progress
+
+
+class StageGraph:
+    """
+    Runs stages concurrently, each as soon as the stages it depends on are done
+    The first failure cancels every stage still running
+    """
+
+    def __init__(self, stages: List[Stage]):
+        """
+        Args:
+            stages: In an order where every stage comes after its dependencies
+        """
+        known = set()
+        for stage in stages:
+            unknown = [name for name in stage.after if name not in known]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' runs after unknown stage(s): {unknown}")
+            known.add(stage.name)
+        self.stages = stages
+
+    async def run(self, document: DocumentRun) -> None:
+        """
+        Run every stage for one document
+
+        Raises:
+            The first exception raised by a stage
+        """
+        for stage in self.stages:
+            dependencies = [document.tasks[name] for name in stage.after]
+            document.tasks[stage.name] = asyncio.create_task(
+                self._run_stage(stage, document, dependencies))
+
+        try:
+            await asyncio.gather(*document.tasks.values())
+        finally:
+            pending = [task for task in document.tasks.values() if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+    @staticmethod
+    async def _run_stage(stage: Stage, document: DocumentRun,
+                         dependencies: List[asyncio.Task]) -> None:
+        """Wait for dependencies, then run and time the stage"""
+        if dependencies:
+            # wait() rather than gather(): cancelling this stage must not cancel them
+            await asyncio.wait(dependencies)
+            for dependency in dependencies:
+                dependency.result()  # A failed dependency fails this stage too
+
+        if stage.progress is not None:
+            document.output.progress(*stage.progress)
+        stage_start = time.perf_counter()
+        outcome = "error"
+        try:
+            with span(stage.name):
+                await stage.run(document)
+            outcome = "ok"
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            duration = time.perf_counter() - stage_start
+            document.timings[stage.name] = int(duration * 1000)
+            document.output.stage_timed(stage.name, int(duration * 1000))
+            stage_seconds.observe(duration, stage=stage.name,
+                                  file_type=file_type_label(document.file_extension), outcome=outcome)
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+async def _validate(document: DocumentRun) -> None:
+    """Check file type, size and page count"""
+    try:
+        document.validation = await validate_file(
+            document.file_content, document.file_extension, document.filename)
+    except Exception as e:
+        raise PipelineError(f"File validation error: {str(e)}", 500, "system_error", "validation")
+
+    if not document.validation["valid"]:
+        raise PipelineError(document.validation["error"], 400, "invalid_file", "validation")
+
+
+async def _extract(document: DocumentRun) -> None:
+    """Extract the document's text (PyMuPDF, python-docx or OCR)"""
+    try:
+        document.text = await extract_text(document.file_content, document.file_extension)
+    except SandboxError as e:
+        # Hostile or pathological document - the sandbox stopped it
+        raise PipelineError(e.message, 400, "unreadable_document", "extraction")
+    except Exception as e:
+        raise PipelineError(f"Text extraction error: {str(e)}", 500, "unreadable_document", "extraction")
+
+
+async def _normalize(document: DocumentRun) -> None:
+    """Reject unreadable documents and look up cached results for the text"""
+    if not document.text or len(document.text.strip()) < 50:
+        raise PipelineError(
+            "Could not extract enough text from the document. Please ensure the file is readable.",
+            400, "unreadable_document", "extraction")
+
+    document.cache_key_classification = cache_key_from_text(document.text, "classification")
+    document.cache_key_explanation = cache_key_from_text(document.text, "explanation")
+    document.cached_classification = cache_service.get(document.cache_key_classification)
+    document.cached_explanation = cache_service.get(document.cache_key_explanation)
+
+
+async def _classify(document: DocumentRun) -> None:
+    """Classify the document and reject anything that isn't a financial document"""
+    classification = document.cached_classification
+    if classification is None:
+        try:
+            classification = await classify_document_with_ai(document.text)
+        except Exception as e:
+            raise PipelineError(
+                f"Document classification error: {str(e)}", 500, "system_error", "classification")
+        cache_service.set(document.cache_key_classification, classification)
+    document.classification = classification
+
+    if not classification["is_insurance"] or classification["confidence"] < 0.4:
+        rejection_message = await generate_rejection_message(
+            classification["document_type"], classification["reason"])
+        raise PipelineError(rejection_message, 400, "rejected_by_sachadvisor", "classification")
+
+    document.output.progress("generating", 60, is_insurance=True)
+
+
+async def _stream_explanation(document: DocumentRun) -> str:
+    """
+    Stream the explanation to the output (token deltas coalesced into larger pieces)
+    Generation starts right away, alongside classification; pieces are held
+    back until the document has been accepted. Concurrent uploads of the
+    same document share one upstream stream, which also caches the result
+    """
+    pieces: asyncio.Queue = asyncio.Queue()
+
+    async def pump() -> None:
+        try:
+            live_stream = stream_hub.subscribe(
+                document.cache_key_explanation,
+                lambda: get_insurance_explanation_stream(document.text))
+            async for piece in coalesce(live_stream):
+                pieces.put_nowait(piece)
+            pieces.put_nowait(None)
+        except Exception as e:
+            pieces.put_nowait(e)
+
+    pump_task = asyncio.create_task(pump())
+    try:
+        await document.wait("classify")
+        parts = []
+        while True:
+            piece = await pieces.get()
+            if piece is None:
+                return "".join(parts)
+            if isinstance(piece, Exception):
+                raise piece
+            parts.append(piece)
+            document.output.chunk(piece)
+    finally:
+        if not pump_task.done():
+            pump_task.cancel()
+            await asyncio.wait({pump_task})
+
+
+async def _explain(document: DocumentRun) -> None:
+    """Generate the plain-language explanation (cached explanations are reused)"""
+    if document.cached_explanation is not None:
+        if document.output.streams_explanation:
+            # Complete already - send it as one piece, no delay
+            await document.wait("classify")
+            document.output.chunk(document.cached_explanation)
+        document.explanation = document.cached_explanation
+        return
+
+    try:
+        if document.output.streams_explanation:
+            document.explanation = await _stream_explanation(document)
+        else:
+            document.explanation = await get_insurance_explanation(document.text)
+            cache_service.set(document.cache_key_explanation, document.explanation)
+    except PipelineError:
+        raise
+    except DeadlineExceeded:
+        raise PipelineError("AI explanation timed out. Please try again.", 504, "system_error", "processing")
+    except Exception as e:
+        raise PipelineError(f"AI explanation error: {str(e)}", 500, "system_error", "processing")
+
+
+async def _publish(document: DocumentRun) -> None:
+    """Store the explanation for follow-up calls and start any translation"""
+    # Follow-up calls reference the explanation by ID instead of re-sending it
+    document.content_id = result_store.put(document.explanation)
+    # Non-English users: translate speculatively so /translate is a cache hit
+    document.prefetch_key = prefetch_translation(
+        document.explanation, document.language, document.content_id)
+
+
+async def _log(document: DocumentRun) -> None:
+    """Record the completed request (completed_not_viewed until the user acknowledges)"""
+    analytics = document.analytics
+    if analytics is None:
+        return
+
+    await document.output.defer(
+        update_tier1_status,
+        session_id=analytics.session_id,
+        request_status="completed_not_viewed",
+        processing_time_total=document.elapsed_ms,
+        explanation=document.explanation,
+        processing_time_extraction=document.timings.get("extract", 0),
+        processing_time_classification=document.timings.get("classify", 0),
+        processing_time_explanation=document.timings.get("explain", 0),
+        cache_hit=document.cache_hit,
+        api_cost_estimate=document.request_usage.cost_usd
+    )
+    await document.output.defer(
+        log_tier3,
+        session_id=analytics.session_id,
+        user_id=analytics.user_id,
+        summary_word_count=len(document.explanation.split()) if document.explanation else 0,
+        language_detected="en",
+        device_type=analytics.device_type,
+        browser=analytics.browser
+    )
+    # Legacy SQLite logging
+    await document.output.defer(
+        log_request,
+        file_type=document.file_extension,
+        page_count=document.validation.get("page_count", 1),
+        text_length=len(document.text),
+        explanation=document.explanation or ""
+    )
+
+
+DOCUMENT_PIPELINE = StageGraph([
+    Stage("validate", _validate, progress=("validating", 10)),
+    Stage("extract", _extract, after=("validate",), progress=("extracting", 30)),
+    Stage("normalize", _normalize, after=("extract",)),
+    Stage("classify", _classify, after=("normalize",), progress=("classifying", 50)),
+    Stage("explain", _explain, after=("normalize",)),
+    Stage("publish", _publish, after=("classify", "explain")),
+    Stage("log", _log, after=("publish",)),
+])
+
+
+async def _log_failure(document: DocumentRun, request_status: str, step: str,
+                       deferred: bool = False) -> None:
+    """
+    Record why a tracked request didn't complete
+    Awaited inline unless deferred - background tasks don't run when the
+    failure becomes an error response
+    """
+    analytics = document.analytics
+    if analytics is None:
+        return
+
+    async def inline(fn: Callable[..., Awaitable[Any]], **kwargs) -> None:
+        await fn(**kwargs)
+
+    log = document.output.defer if deferred else inline
+    await log(
+        update_tier1_status,
+        session_id=analytics.session_id,
+        request_status=request_status,
+        processing_time_total=document.elapsed_ms,
+        processing_time_extraction=document.timings.get("extract"),
+        processing_time_classification=document.timings.get("classify"),
+        api_cost_estimate=document.request_usage.cost_usd
+    )
+    await log(
+        update_tier2_event,
+        session_id=analytics.session_id,
+        event_type="abandoned_at_step",
+        value=step
+    )
+
+
+async def analyze_document(
+    file_content: bytes,
+    file_extension: str,
+    filename: str,
+    language: Optional[str] = None,
+    output: Optional[PipelineOutput] = None,
+    analytics: Optional[Analytics] = None
+) -> dict:
+    """
+    Run the full analysis pipeline on one document
+
+    Args:
+        file_content: Uploaded file bytes
+        file_extension: Lowercase extension including the dot
+        filename: Original filename
+        language: X-Language value (non-English starts a translation prefetch)
+        output: Output adapter for progress, streamed chunks and logging
+        analytics: Session/user to tier-log the outcome under (None: not logged)
+
+    Returns:
+        dict: summary, content_id, filename, cache_hit, page_count,
+        text_length, per-stage timings (ms) and prefetch_key (pass it to
+        cancel_prefetch if the client leaves before the result reaches it)
+
+    Raises:
+        PipelineError: Invalid, unreadable or non-financial documents and AI failures
+        asyncio.CancelledError: The caller was cancelled (logged as abandoned_by_user)
+    """
+    document = DocumentRun(file_content, file_extension, filename, language,
+                           output or PipelineOutput(), analytics)
+    # Saved with the profile when this request (or a profiling window) is profiled
+    kept = profiler.keep_document(file_content, file_extension, filename)
+    outcome = "completed"
+    try:
+        await DOCUMENT_PIPELINE.run(document)
+
+    except PipelineError as e:
+        outcome = e.request_status
+        await _log_failure(document, e.request_status, e.stage)
+        raise
+
+    except asyncio.CancelledError:
+        # User closed the window/tab - the cancellation already stopped
+        # extraction and the OpenAI calls (and, if it came after publishing,
+        # the translation prefetch nobody will ask for)
+        outcome = "abandoned_by_user"
+        cancel_prefetch(document.prefetch_key)
+        await _log_failure(document, "abandoned_by_user", "client_disconnect", deferred=True)
+        raise
+
+    except Exception as e:
+        outcome = "system_error"
+        await _log_failure(document, "system_error", "processing")
+        raise PipelineError(f"Processing error: {str(e)}", 500, "system_error", "processing") from e
+
+    finally:
+        pipeline_seconds.observe(time.time() - document.start_time,
+                                 file_type=file_type_label(file_extension), outcome=outcome)
+        if kept is not None:
+            kept.update(outcome=outcome, elapsed_ms=document.elapsed_ms, timings=document.timings)
+
+    return {
+        "summary": document.explanation,
+        "content_id": document.content_id,
+        "filename": filename,
+        "cache_hit": document.cache_hit,
+        "page_count": document.validation.get("page_count", 1),
+        "text_length": len(document.text),
+        "timings": document.timings,
+        "prefetch_key": document.prefetch_key
+    }
@@ -5,36 +5,67 @@ Extracts text from PDF, Word documents, and images (OCR)
 """
 import io
 import asyncio
+import contextvars
+import threading
 from concurrent.futures import ThreadPoolExecutor
-import pymupdf  # PyMuPDF (fitz)
-from docx import Document
+from typing import Optional
+from app.config import settings
+from app.services.admission import admission
+from app.services.metrics import ocr_seconds
+from app.services.tracing import span
+from app.services.sandbox import sandbox, SandboxError
 
 
-def _extract_pdf_parallel(file_content: bytes) -> str:
+def _extract_pdf_parallel(file_content: bytes, cancelled: Optional[threading.Event] = None) -> str:
     """
     Extract PDF pages in parallel threads for 3-5x speed boost
 
     Args:
         file_content: PDF file content as bytes
+        cancelled: Set when the caller gave up - remaining pages are skipped
 
     Returns:
         Extracted text as string
     """
+    import pymupdf  # PyMuPDF (fitz) - imported by the sandbox workers, not the API process
+
     doc = pymupdf.open(stream=file_content, filetype="pdf")
+    # Page threads run in copies of this context so their spans join the request's trace
+    context = contextvars.copy_context()
+
+    def page_text(page_num: int) -> str:
+        if cancelled is not None and cancelled.is_set():
+            return ""
+        with span("extract_page", page=page_num + 1):
+            return doc[page_num].get_text("text", sort=True)
 
     try:
         # Extract pages in parallel using ThreadPoolExecutor
         with ThreadPoolExecutor(max_workers=4) as executor:
             pages = list(executor.map(
-                lambda page_num: doc[page_num].get_text("text", sort=True),
-                range(len(doc))
-            ))
+                lambda page_num: context.copy().run(page_text, page_num), range(len(doc))))
 
         return "\n".join(pages)
     finally:
         doc.close()
 
 
+def _extract_docx(file_content: bytes) -> str:
+    """
+    Extract paragraph text from a Word document
+
+    Args:
+        file_content: Word file content as bytes
+
+    Returns:
+        Extracted text as string
+    """
+    from docx import Document
+
+    doc = Document(io.BytesIO(file_content))
+    return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+
+
 def _extract_image_optimized(file_content: bytes) -> str:
     """
     Optimized OCR extraction with image preprocessing
@@ -76,6 +107,33 @@ def _extract_image_optimized(file_content: bytes) -> str:
             f"Could not extract text from image: {str(ocr_error)}")
 
 
+def _warm_parsers() -> None:
+    """Load the parsers (and Tesseract's language data) in this worker"""
+    import pymupdf
+    from docx import Document  # noqa: F401
+
+    doc = pymupdf.open()
+    doc.new_page().insert_text((50, 50), "warm-up")
+    pymupdf.open(stream=doc.tobytes(), filetype="pdf")[0].get_text("text")
+    doc.close()
+    try:
+        from PIL import Image
+        import pytesseract
+    except ImportError:
+        return  # No OCR on this host
+    pytesseract.image_to_string(Image.new("L", (64, 32), 255))
+
+
+async def warm_up_extraction() -> None:
+    """
+    Start WARMUP_SANDBOX_WORKERS sandbox workers and load the parsers in them
+    Only a few: every worker costs its own interpreter and parsers in memory,
+    so the rest of the pool starts as uploads need it
+    """
+    workers = min(settings.WARMUP_SANDBOX_WORKERS, sandbox.size) if sandbox.enabled else 1
+    await asyncio.gather(*(sandbox.run(_warm_parsers) for _ in range(max(1, workers))))
+
+
 async def extract_text(file_content: bytes, file_extension: str) -> str:
     """
     Extract text from various file formats with optimized performance
@@ -89,25 +147,44 @@ async def extract_text(file_content: bytes, file_extension: str) -> str:
 
     Returns:
         Extracted text as string
+
+    Raises:
+        SandboxError: The document hit the sandbox's time or memory limits
     """
     try:
-        if file_extension == ".pdf":
-            # Use PyMuPDF with parallel processing (3-5x faster than PyPDF2)
-            text = await asyncio.to_thread(_extract_pdf_parallel, file_content)
-
-        elif file_extension in [".doc", ".docx"]:
-            # Extract text from Word document
-            doc = Document(io.BytesIO(file_content))
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-
-        elif file_extension in [".jpg", ".jpeg", ".png"]:
-            # Use optimized OCR extraction
-            text = await asyncio.to_thread(_extract_image_optimized, file_content)
-
-        else:
-            raise ValueError(f"Unsupported file type: {file_extension}")
+        # Hold a slot in the stage's capacity limit (OCR is limited separately)
+        async with admission.extraction_stage(file_extension).slot():
+            # Parsers run in sandbox worker processes (time, CPU and memory
+            # limited); a cancelled request kills its worker
+            if file_extension == ".pdf":
+                # Use PyMuPDF with parallel processing (3-5x faster than PyPDF2)
+                if sandbox.enabled:
+                    text = await sandbox.run(_extract_pdf_parallel, file_content)
+                else:
+                    # Threads can't be killed, so a cancelled request tells the worker
+                    # to skip its remaining pages and give the thread back
+                    cancelled = threading.Event()
+                    try:
+                        text = await asyncio.to_thread(_extract_pdf_parallel, file_content, cancelled)
+                    except asyncio.CancelledError:
+                        cancelled.set()
+                        raise
+
+            elif file_extension in [".doc", ".docx"]:
+                # Extract text from Word document (off the event loop)
+                text = await sandbox.run(_extract_docx, file_content)
+
+            elif file_extension in [".jpg", ".jpeg", ".png"]:
+                # Use optimized OCR extraction
+                with ocr_seconds.time(), span("ocr"):
+                    text = await sandbox.run(_extract_image_optimized, file_content)
+
+            else:
+                raise ValueError(f"Unsupported file type: {file_extension}")
 
         return text.strip()
 
+    except SandboxError:
+        raise
     except Exception as e:
         raise Exception(f"Error extracting text: {str(e)}")
@@ -3,8 +3,14 @@ File validation service
 Validates file type, size, and page count
 """
 import io
-from PyPDF2 import PdfReader
 from app.config import settings
+from app.services.sandbox import sandbox
+
+
+def _pdf_page_count(file_content: bytes) -> int:
+    from PyPDF2 import PdfReader  # Imported by the sandbox workers, not the API process
+
+    return len(PdfReader(io.BytesIO(file_content)).pages)
 
 
 async def validate_file(file_content: bytes, file_extension: str, filename: str) -> dict:
@@ -33,8 +39,8 @@ async def validate_file(file_content: bytes, file_extension: str, filename: str)
     page_count = 1
     if file_extension == ".pdf":
         try:
-            pdf_reader = PdfReader(io.BytesIO(file_content))
-            page_count = len(pdf_reader.pages)
+            # Parse untrusted PDFs in the sandbox (off the event loop, time/memory limited)
+            page_count = await sandbox.run(_pdf_page_count, file_content)
 
             if page_count > settings.MAX_PAGES:
                 return {
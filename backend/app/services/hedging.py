@@ -0,0 +1,201 @@
+"""
+Hedged request service
+Cuts LLM tail latency: when the first attempt of a call is slower than the
+observed p95 (or a configured delay), a duplicate attempt is started and
+whichever finishes first wins. The loser is not cancelled: the provider
+bills it either way, so it finishes in the background and its token usage
+is recorded like any other call (only a caller that goes away cancels both)
+
+Attempt and request latencies are both tracked so the duplicate-call rate
+(what hedging costs) can be compared with the tail latency it saves
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Set, TypeVar
+from app.config import settings
+
+T = TypeVar("T")
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of a sequence of samples (None if empty)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+class Hedger:
+    """
+    Runs calls with a hedged duplicate attempt once they pass the threshold
+    """
+
+    def __init__(self, name: str, window: int = 500):
+        """
+        Args:
+            name: Name of the hedged call (for stats)
+            window: Number of recent latencies kept for the percentile
+        """
+        self.name = name
+        self.attempt_latencies = deque(maxlen=window)
+        self.request_latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.primary_wins_after_hedge = 0
+        self._losers: Set[asyncio.Task] = set()
+
+    def threshold_seconds(self) -> float:
+        """
+        Delay after which a hedge is sent
+
+        Uses HEDGE_DELAY_MS when set, otherwise the HEDGE_PERCENTILE of recent
+        single-attempt latencies (HEDGE_INITIAL_DELAY_MS until enough samples)
+        """
+        if settings.HEDGE_DELAY_MS > 0:
+            return settings.HEDGE_DELAY_MS / 1000
+
+        if len(self.attempt_latencies) < settings.HEDGE_MIN_SAMPLES:
+            return settings.HEDGE_INITIAL_DELAY_MS / 1000
+
+        threshold_ms = _percentile(
+            self.attempt_latencies, settings.HEDGE_PERCENTILE)
+        return max(threshold_ms, settings.HEDGE_MIN_DELAY_MS) / 1000
+
+    async def run(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run a call, hedging it if the first attempt is slow
+
+        Args:
+            attempt: Factory creating a fresh attempt of the call
+
+        Returns:
+            Result of the first attempt to succeed
+        """
+        self.requests += 1
+        request_start = time.perf_counter()
+
+        if not settings.HEDGE_ENABLED:
+            result = await attempt()
+            self._record_request(request_start)
+            return result
+
+        primary = asyncio.create_task(attempt())
+        starts = {primary: request_start}
+        caller_cancelled = False
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.threshold_seconds())
+            if done:
+                result = primary.result()
+                self._record_attempt(primary, starts)
+                self._record_request(request_start)
+                return result
+
+            # First attempt passed the threshold - send a duplicate
+            self.hedges_fired += 1
+            hedge = asyncio.create_task(attempt())
+            starts[hedge] = time.perf_counter()
+
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if task is hedge:
+                        self.hedge_wins += 1
+                    else:
+                        self.primary_wins_after_hedge += 1
+                    self._record_attempt(task, starts)
+                    self._record_request(request_start)
+                    return task.result()
+
+            raise error
+
+        except asyncio.CancelledError:
+            caller_cancelled = True
+            raise
+
+        finally:
+            for task in starts:
+                if task.done():
+                    continue
+                if caller_cancelled:
+                    task.cancel()  # Nobody is waiting for either attempt any more
+                else:
+                    self._let_finish(task, task is primary, starts)
+
+    def _let_finish(self, task: asyncio.Task, is_primary: bool, starts: dict) -> None:
+        """Keep a losing attempt running so the call it made records its usage"""
+        self._losers.add(task)
+
+        def finished(task: asyncio.Task) -> None:
+            self._losers.discard(task)
+            if task.cancelled() or task.exception() is not None:
+                return
+            if is_primary:
+                # The slow primary's full latency belongs in the percentile
+                self._record_attempt(task, starts)
+
+        task.add_done_callback(finished)
+
+    def _record_attempt(self, task: asyncio.Task, starts: dict) -> None:
+        """Record how long one attempt ran"""
+        self.attempt_latencies.append(
+            (time.perf_counter() - starts[task]) * 1000)
+
+    def _record_request(self, request_start: float) -> None:
+        """Record the latency the caller actually saw"""
+        self.request_latencies.append(
+            (time.perf_counter() - request_start) * 1000)
+
+    def get_stats(self) -> dict:
+        """
+        Get hedging statistics
+
+        Returns:
+            Dictionary with hedge counts and attempt vs request latency percentiles
+        """
+        def rounded(value):
+            return round(value) if value is not None else None
+
+        return {
+            'requests': self.requests,
+            'hedges_fired': self.hedges_fired,
+            'hedge_rate': round(self.hedges_fired / self.requests, 3) if self.requests else 0.0,
+            'hedge_wins': self.hedge_wins,
+            'primary_wins_after_hedge': self.primary_wins_after_hedge,
+            'threshold_ms': rounded(self.threshold_seconds() * 1000),
+            'attempt_latency_ms': {
+                'p50': rounded(_percentile(self.attempt_latencies, 0.50)),
+                'p95': rounded(_percentile(self.attempt_latencies, 0.95)),
+                'p99': rounded(_percentile(self.attempt_latencies, 0.99))
+            },
+            'request_latency_ms': {
+                'p50': rounded(_percentile(self.request_latencies, 0.50)),
+                'p95': rounded(_percentile(self.request_latencies, 0.95)),
+                'p99': rounded(_percentile(self.request_latencies, 0.99))
+            }
+        }
+
+
+# Global hedgers, one per hedged call
+_hedgers: Dict[str, Hedger] = {}
+
+
+def get_hedger(name: str) -> Hedger:
+    """Get or create the hedger for a call name"""
+    if name not in _hedgers:
+        _hedgers[name] = Hedger(name)
+    return _hedgers[name]
+
+
+def get_hedging_stats() -> dict:
+    """Get statistics of all hedged calls"""
+    return {name: hedger.get_stats() for name, hedger in _hedgers.items()}
@@ -3,14 +3,143 @@ Financial document detection service
 Uses OpenAI for semantic document classification
 Accepts insurance and all financial services documents
 """
-from openai import AsyncOpenAI
 from app.config import settings
+from app.services.hedging import get_hedger
+from app.services.micro_batcher import MicroBatcher
+from app.services.openai_client import create_chat_completion
+from app.services.prompts import (
+    build_classification_messages,
+    build_batch_classification_messages
+)
+from app.services.rejection_messages import rejection_messages
+from app.services.token_budget import trim_to_token_budget
+from app.services.usage_tracker import usage_tracker, elapsed_ms, LLMCall
+from typing import List, Optional, Tuple
+import asyncio
 import json
+import time
+
+
+FINANCIAL_KEYWORDS = ["insurance", "policy", "loan", "emi", "mutual fund", "investment",
+                      "bank", "credit", "debit", "premium", "interest", "principal",
+                      "nav", "portfolio", "pension", "provident", "deposit", "fd", "rd"]
+
+# Lazily created so it binds to the running event loop
+_batcher: Optional[MicroBatcher] = None
+
+
+def _keyword_classification(text: str) -> dict:
+    """
+    Fallback classification using basic keyword matching for financial terms
+
+    Args:
+        text: Extracted text from document
+
+    Returns:
+        dict: Classification in the same shape as the AI result
+    """
+    is_financial = any(keyword in text.lower()
+                       for keyword in FINANCIAL_KEYWORDS)
+
+    return {
+        "is_insurance": is_financial,
+        "confidence": 0.5,
+        "document_type": "financial_document",
+        "reason": "AI classification unavailable, using basic keyword matching"
+    }
+
+
+async def _classify_single(text_sample: str, attribute_to_request: bool = True) -> Tuple[dict, Optional[LLMCall]]:
+    """
+    Classify one document sample with a dedicated OpenAI call
+
+    Args:
+        text_sample: Truncated document text
+        attribute_to_request: Add the call's usage to the current request
+
+    Returns:
+        tuple: Parsed classification result and the recorded call usage
+    """
+    call_start = time.perf_counter()
+    response = await create_chat_completion(
+        model="gpt-4o-mini",
+        messages=build_classification_messages(text_sample),
+        temperature=0.3,
+        max_tokens=200
+    )
+    call = usage_tracker.record(
+        "classification", response.usage, model=response.model,
+        wall_time_ms=elapsed_ms(call_start), attribute_to_request=attribute_to_request)
+
+    return json.loads(response.choices[0].message.content), call
+
+
+async def _classify_batch(text_samples: List[str]) -> List[Tuple[dict, Optional[LLMCall]]]:
+    """
+    Classify several document samples with one multi-document OpenAI call
+    The system prompt is sent once for the whole batch instead of per document
+
+    The batch runs outside any single request, so usage is returned with each
+    result (split evenly) for the waiting request to attribute to itself
+
+    Args:
+        text_samples: Truncated document texts
+
+    Returns:
+        list: One (classification, usage share) tuple (or exception) per sample, in order
+    """
+    if len(text_samples) == 1:
+        return [await _classify_single(text_samples[0], attribute_to_request=False)]
+
+    try:
+        call_start = time.perf_counter()
+        response = await create_chat_completion(
+            model="gpt-4o-mini",
+            messages=build_batch_classification_messages(text_samples),
+            temperature=0.3,
+            max_tokens=200 * len(text_samples)
+        )
+        call = usage_tracker.record(
+            "classification_batch", response.usage, model=response.model,
+            wall_time_ms=elapsed_ms(call_start), attribute_to_request=False)
+
+        results = json.loads(response.choices[0].message.content)
+        if not isinstance(results, list) or len(results) != len(text_samples):
+            raise ValueError("batch response did not match the number of documents")
+
+        call_shares = call.split(len(text_samples)) if call else [None] * len(text_samples)
+        return list(zip(results, call_shares))
+
+    except Exception as e:
+        # A malformed batch answer shouldn't fail every upload in it - retry individually
+        print(f"Batch classification error, retrying individually: {str(e)}")
+        return await asyncio.gather(
+            *(_classify_single(sample, attribute_to_request=False) for sample in text_samples),
+            return_exceptions=True
+        )
+
+
+def _get_batcher() -> MicroBatcher:
+    """Get or create the global classification micro-batcher"""
+    global _batcher
+
+    if _batcher is None:
+        _batcher = MicroBatcher(
+            _classify_batch,
+            window_ms=settings.CLASSIFICATION_BATCH_WINDOW_MS,
+            max_size=settings.CLASSIFICATION_BATCH_MAX_SIZE,
+            timeout=settings.LLM_TIMEOUT_SECONDS
+        )
+
+    return _batcher
 
 
 async def classify_document_with_ai(text: str) -> dict:
     """
     Use OpenAI to semantically classify if document is insurance-related
+    When CLASSIFICATION_BATCH_ENABLED is set, concurrent requests are
+    micro-batched into a single multi-document prompt; otherwise slow
+    calls are hedged with a duplicate request
 
     Args:
         text: Extracted text from document
@@ -23,150 +152,37 @@ async def classify_document_with_ai(text: str) -> dict:
             "reason": str
         }
     """
-    # Truncate text to first 3000 characters for classification
-    text_sample = text[:3000]
+    # Truncate text to the classification input token budget
+    text_sample = await trim_to_token_budget(
+        text, settings.CLASSIFICATION_INPUT_TOKENS, "gpt-4o-mini")
 
     try:
-        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are a document classification expert specializing in ALL financial documents including insurance, banking, investments, loans, and wealth management.
-
-Your task: Determine if this document is ANY type of financial document.
-
-✅ ACCEPT ALL OF THESE FINANCIAL DOCUMENTS:
-
-Insurance Documents:
-- All insurance policies (life, health, motor, property, travel, cyber, liability, etc.)
-- Insurance claims, settlements, coverage documents
-- Premium notices, policy schedules, endorsements, proposals
-
-Banking Documents:
-- Loan agreements (personal, home, auto, business, education)
-- Credit card statements, agreements, terms
-- Fixed deposit receipts, certificates
-- Bank statements, passbooks, account opening forms
-- Overdraft facilities, credit lines
-
-Investment Documents:
-- Mutual fund statements, SIPs, NAV reports
-- Demat account statements, trading accounts
-- Stock certificates, share allotment letters
-- Bond documents, debentures, securities
-- Investment advisory reports, portfolio statements
-
-Retirement & Pension:
-- Provident fund statements (EPF, PPF, VPF)
-- National Pension System (NPS) documents
-- Pension plans, annuity documents
-- Gratuity, superannuation documents
-
-Wealth Management:
-- Portfolio management services (PMS) documents
-- Financial planning reports, wealth advisory
-- Estate planning, trust documents
-- Tax planning documents, capital gains reports
-
-Alternative Investments:
-- ULIP documents
-- REIT, InvIT documents
-- Gold bonds, sovereign bonds
-- Commodities trading documents
-
-EMI & Payment Documents:
-- EMI schedules, payment plans
-- Buy now pay later (BNPL) agreements
-- Payment gateway documents
-
-❌ REJECT ONLY THESE (Non-Financial):
-- Pure personal identity documents (passport, Aadhaar, driver's license) WITHOUT financial context
-- Employment documents (CVs, offer letters) WITHOUT salary/benefits info
-- Pure medical records WITHOUT insurance/claims
-- Educational certificates
-- General business contracts WITHOUT financial terms
-- Travel tickets, hotel bookings WITHOUT financial protection
-- Utility bills (unless related to loan/payment plan)
-
-⚠️ CRITICAL RULES:
-- If document has ANY financial terms (amount, interest, premium, NAV, returns, EMI, principal) → ACCEPT
-- If from ANY financial institution (bank, NBFC, insurer, broker, advisor, fintech) → ACCEPT
-- If mentions money, investments, loans, coverage, benefits → ACCEPT
-- When in doubt → ACCEPT (very low rejection threshold)
-- Confidence: 0.8+ for clear financial docs, 0.6+ for borderline financial docs
-
-Respond in JSON format:
-{
-    "is_insurance": true/false,
-    "confidence": 0.0-1.0,
-    "document_type": "loan agreement" or "mutual fund" or "insurance policy" or "FD certificate" etc,
-    "reason": "brief explanation"
-}"""
-                },
-                {
-                    "role": "user",
-                    "content": f"Classify this document:\n\n{text_sample}"
-                }
-            ],
-            temperature=0.3,
-            max_tokens=200
-        )
-
-        result = json.loads(response.choices[0].message.content)
+        if settings.CLASSIFICATION_BATCH_ENABLED:
+            result, call_share = await _get_batcher().submit(text_sample)
+            usage_tracker.attribute(call_share)
+            return result
+
+        # Hedge slow attempts with a duplicate call - first answer wins
+        result, _ = await get_hedger("classification").run(
+            lambda: _classify_single(text_sample))
         return result
 
     except Exception as e:
         print(f"AI classification error: {str(e)}")
-        # Fallback to basic keyword check for financial terms
-        financial_keywords = ["insurance", "policy", "loan", "emi", "mutual fund", "investment",
-                              "bank", "credit", "debit", "premium", "interest", "principal",
-                              "nav", "portfolio", "pension", "provident", "deposit", "fd", "rd"]
-        is_financial = any(keyword in text.lower()
-                           for keyword in financial_keywords)
-
-        return {
-            "is_insurance": is_financial,
-            "confidence": 0.5,
-            "document_type": "financial_document",
-            "reason": "AI classification unavailable, using basic keyword matching"
-        }
+        return _keyword_classification(text)
 
 
 async def generate_rejection_message(document_type: str, reason: str) -> str:
     """
-    Generate a friendly explanation for why the document can't be analyzed
+    Get a friendly explanation for why the document can't be analyzed
+    Served from the rejection message table/cache; only unseen document
+    types trigger an OpenAI call
 
     Args:
         document_type: Type of document detected
-        document_reason: Reason for rejection
+        reason: Reason for rejection (the message depends on the type alone)
 
     Returns:
         str: Human-friendly explanation
     """
-    try:
-        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant explaining why Sacha Advisor can only analyze financial documents. Be friendly and concise."
-                },
-                {
-                    "role": "user",
-                    "content": f"The user uploaded a '{document_type}'. Explain in 2-3 friendly sentences why Sacha Advisor can't analyze this document (we only handle ALL financial documents including insurance policies, loan agreements, investment documents, mutual funds, fixed deposits, EMI schedules, pension plans, bank statements, credit cards, and any banking/finance/investment related documents). Suggest what type of financial document they should upload instead."
-                }
-            ],
-            temperature=0.7,
-            max_tokens=150
-        )
-
-        return response.choices[0].message.content.strip()
-
-    except Exception as e:
-        print(f"Rejection message generation error: {str(e)}")
-        return f"This appears to be a {document_type}, not a financial document. Sacha Advisor can analyze ALL financial documents including insurance, loans, investments, mutual funds, fixed deposits, EMI schedules, pension plans, bank statements, and more. Please upload any financial document to get started!"
+    return await rejection_messages.get_message(document_type)
@@ -0,0 +1,242 @@
+"""
+Background document jobs
+Uploads submitted as jobs return a job ID immediately; a fixed pool of
+in-process workers runs the analysis pipeline and clients poll or
+subscribe for progress. The queue is bounded - when it is full, submit
+refuses new work (QueueFull) instead of letting it pile up
+"""
+import asyncio
+import contextvars
+import math
+import time
+import traceback
+import uuid
+from typing import Dict, List, Optional
+from cachetools import TTLCache
+from app.config import settings
+from app.services.deadline import start_deadline
+from app.services.document_pipeline import Analytics, PipelineError, PipelineOutput, analyze_document
+from app.services.rate_limiter import rate_limiter
+from app.services.usage_tracker import start_request_usage
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class QueueFull(Exception):
+    """The job queue is at capacity"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class Job:
+    """
+    One submitted document and its progress
+    """
+
+    def __init__(self, file_content: bytes, file_extension: str, filename: str,
+                 analytics: Optional[Analytics], language: Optional[str],
+                 rate_key: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.file_content = file_content
+        self.file_extension = file_extension
+        self.filename = filename
+        self.analytics = analytics
+        self.language = language
+        self.rate_key = rate_key  # Charged extra if the job needs OpenAI calls
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0
+        self.result: Optional[dict] = None
+        self.error: Optional[dict] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Event()
+
+    def update(self, **fields) -> None:
+        """Change job fields and wake anyone waiting on the job"""
+        for name, value in fields.items():
+            setattr(self, name, value)
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_for_change(self, timeout: Optional[float] = None) -> None:
+        """Wait until the job changes (or the timeout passes)"""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> dict:
+        """Public view of the job"""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "filename": self.filename,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class JobOutput(PipelineOutput):
+    """Pipeline output adapter that records progress on the job"""
+
+    def __init__(self, job: Job):
+        self.job = job
+
+    def progress(self, stage: str, percent: int, **details) -> None:
+        self.job.update(stage=stage, progress=percent)
+
+
+class JobQueue:
+    """
+    Bounded queue of jobs served by a fixed number of worker tasks
+    """
+
+    def __init__(self, workers: int, max_queued: int):
+        """
+        Args:
+            workers: Jobs processed concurrently
+            max_queued: Jobs allowed to wait before submit is refused
+        """
+        self.worker_count = workers
+        self.max_queued = max_queued
+        # Queued and running jobs (bounded by the queue and the workers) never
+        # expire; finished ones move to a TTL store when they finish
+        self.active: Dict[str, Job] = {}
+        self.finished = TTLCache(maxsize=settings.JOB_MAX_SIZE, ttl=settings.JOB_TTL_SECONDS)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.running = 0
+        self.avg_job_seconds: Optional[float] = None  # EWMA of job durations
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected_full': 0}
+
+    def _ensure_workers(self) -> None:
+        """Start the worker tasks on first use (inside the running loop)"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._workers = [task for task in self._workers if not task.done()]
+        while len(self._workers) < self.worker_count:
+            # Fresh context: workers must not inherit the submitting request's state
+            self._workers.append(asyncio.create_task(self._worker(), context=contextvars.Context()))
+
+    def retry_after_seconds(self) -> int:
+        """Estimated seconds until a queued job would start, from observed job times"""
+        queued = self._queue.qsize() if self._queue is not None else 0
+        per_job = self.avg_job_seconds or settings.REQUEST_DEADLINE_SECONDS / 4
+        return max(1, math.ceil((queued + 1) * per_job / self.worker_count))
+
+    def submit(self, file_content: bytes, file_extension: str, filename: str,
+               analytics: Optional[Analytics] = None, language: Optional[str] = None,
+               rate_key: Optional[str] = None) -> Job:
+        """
+        Queue a document for analysis
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            QueueFull: If max_queued jobs are already waiting
+        """
+        self._ensure_workers()
+        job = Job(file_content, file_extension, filename, analytics, language, rate_key)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.stats['rejected_full'] += 1
+            raise QueueFull(self.retry_after_seconds())
+
+        self.active[job.id] = job
+        self.stats['submitted'] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job (None once it has expired)"""
+        return self.active.get(job_id) or self.finished.get(job_id)
+
+    async def _worker(self) -> None:
+        """Process jobs forever"""
+        while True:
+            job = await self._queue.get()
+            self.running += 1
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Never let one job take a worker down
+                print(f"❌ Job worker error: {str(e)}")
+                traceback.print_exc()
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        """Run the pipeline for one job (the pipeline logs the outcome)"""
+        # Each job gets its own usage accounting and deadline, like a request
+        request_usage = start_request_usage()
+        start_deadline(settings.REQUEST_DEADLINE_SECONDS)
+        job.started_at = time.time()
+        job.update(status="running")
+
+        try:
+            result = await analyze_document(
+                job.file_content, job.file_extension, job.filename, job.language,
+                output=JobOutput(job), analytics=job.analytics
+            )
+            job.update(status="completed", stage="complete", progress=100, result={
+                "summary": result["summary"],
+                "content_id": result["content_id"],
+                "filename": result["filename"],
+                "is_insurance": True
+            })
+            self.stats['completed'] += 1
+
+        except PipelineError as e:
+            job.update(status="failed", error={"status_code": e.status_code, "message": e.message})
+            self.stats['failed'] += 1
+
+        finally:
+            job.finished_at = time.time()
+            job.file_content = b""  # Don't hold uploads in memory for the job TTL
+            duration = job.finished_at - job.started_at
+            self.avg_job_seconds = duration if self.avg_job_seconds is None \
+                else 0.8 * self.avg_job_seconds + 0.2 * duration
+            if not job.done:
+                job.update(status="failed", error={"status_code": 500, "message": "Job was interrupted"})
+            # Fetchable for JOB_TTL_SECONDS from now
+            self.active.pop(job.id, None)
+            self.finished[job.id] = job
+            if job.rate_key is not None and request_usage.calls:
+                await rate_limiter.charge(
+                    job.rate_key, settings.RATE_LIMIT_MISS_COST - settings.RATE_LIMIT_HIT_COST)
+
+    def get_stats(self) -> dict:
+        """
+        Get queue statistics
+
+        Returns:
+            Dictionary with queue depth, running jobs and outcome counts
+        """
+        return {
+            **self.stats,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'running': self.running,
+            'finished_kept': len(self.finished),
+            'workers': self.worker_count,
+            'max_queued': self.max_queued,
+            'avg_job_ms': round(self.avg_job_seconds * 1000) if self.avg_job_seconds else None
+        }
+
+
+# Global job queue
+job_queue = JobQueue(
+    workers=settings.JOB_WORKERS,
+    max_queued=settings.JOB_QUEUE_MAX_SIZE
+)
@@ -0,0 +1,102 @@
+"""
+LLM governor
+Bounds how many OpenAI calls run at once across the whole process.
+Speculative/background work (e.g. translation prefetch) runs in its own
+smaller lane so it can never starve interactive requests of slots
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from app.config import settings
+
+# True inside background work - its calls take the background lane
+_background: ContextVar[bool] = ContextVar("llm_background", default=False)
+
+
+def mark_background() -> None:
+    """Route every OpenAI call made from the current task through the background lane"""
+    _background.set(True)
+
+
+class LLMGovernor:
+    """
+    Concurrency limiter for OpenAI calls with a reserved-size background lane
+    """
+
+    def __init__(self, max_concurrent: int, max_background: int):
+        """
+        Args:
+            max_concurrent: Total OpenAI calls allowed in flight
+            max_background: Of those, how many may be background work
+        """
+        self.max_concurrent = max_concurrent
+        self.max_background = max_background
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._background_slots = asyncio.Semaphore(max_background)
+        self.in_flight = 0
+        self.waiting = 0
+        self.background_in_flight = 0
+        # EWMA of how long a call holds its slot (seeds the wait estimate)
+        self.avg_service_seconds = settings.ADMISSION_LLM_SERVICE_SECONDS
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one OpenAI call slot (background lane if marked) for the block"""
+        background = _background.get()
+        self.waiting += 1
+        try:
+            if background:
+                await self._background_slots.acquire()
+            try:
+                await self._slots.acquire()
+            except BaseException:
+                if background:
+                    self._background_slots.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.background_in_flight += background
+        held_since = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - held_since
+            self.avg_service_seconds = 0.9 * self.avg_service_seconds + 0.1 * held
+            self.in_flight -= 1
+            self.background_in_flight -= background
+            self._slots.release()
+            if background:
+                self._background_slots.release()
+
+    def estimated_wait_seconds(self) -> float:
+        """Expected wait for a slot right now, from the observed call times"""
+        if self.in_flight < self.max_concurrent:
+            return 0.0
+        return (self.waiting + 1) * self.avg_service_seconds / self.max_concurrent
+
+    def get_stats(self) -> dict:
+        """
+        Get governor statistics
+
+        Returns:
+            Dictionary with slot usage and queue length
+        """
+        return {
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'background_in_flight': self.background_in_flight,
+            'max_concurrent': self.max_concurrent,
+            'max_background': self.max_background,
+            'avg_service_ms': round(self.avg_service_seconds * 1000),
+            'estimated_wait_ms': round(self.estimated_wait_seconds() * 1000)
+        }
+
+
+# Global governor shared by every OpenAI call site
+llm_governor = LLMGovernor(
+    max_concurrent=settings.LLM_MAX_CONCURRENT,
+    max_background=settings.LLM_MAX_BACKGROUND
+)
@@ -2,10 +2,27 @@
 Logging service
 Logs request information to SQLite database
 """
+import asyncio
 from app.db.database import get_db_connection, close_db
+from app.services.metrics import db_write_seconds
+from app.services.tracing import span
 from datetime import datetime
 
 
+def _insert_request_log(file_type: str, page_count: int, text_length: int, explanation: str):
+    """Blocking SQLite insert (run in a worker thread)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        INSERT INTO request_logs (file_type, page_count, text_length, explanation)
+        VALUES (?, ?, ?, ?)
+    """, (file_type, page_count, text_length, explanation))
+
+    conn.commit()
+    close_db(conn)
+
+
 async def log_request(file_type: str, page_count: int, text_length: int, explanation: str):
     """
     Log request information to database
@@ -17,16 +34,11 @@ async def log_request(file_type: str, page_count: int, text_length: int, explana
         explanation: AI-generated explanation
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            INSERT INTO request_logs (file_type, page_count, text_length, explanation)
-            VALUES (?, ?, ?, ?)
-        """, (file_type, page_count, text_length, explanation))
-
-        conn.commit()
-        close_db(conn)
+        with db_write_seconds.time(db="sqlite", table="request_logs"), \
+                span("db_write", db="sqlite", table="request_logs"):
+            # sqlite3 blocks (fsync on commit) - keep it off the event loop
+            await asyncio.to_thread(
+                _insert_request_log, file_type, page_count, text_length, explanation)
 
     except Exception as e:
         print(f"Error logging request: {str(e)}")
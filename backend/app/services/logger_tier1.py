@@ -76,7 +76,12 @@ async def update_tier1_status(
     session_id: str,
     request_status: str,
     processing_time_total: Optional[int] = None,
-    explanation: Optional[str] = None
+    explanation: Optional[str] = None,
+    processing_time_extraction: Optional[int] = None,
+    processing_time_classification: Optional[int] = None,
+    processing_time_explanation: Optional[int] = None,
+    cache_hit: Optional[bool] = None,
+    api_cost_estimate: Optional[float] = None
 ):
     """
     Update the status of an existing tier1 log entry
@@ -86,6 +91,11 @@ async def update_tier1_status(
         request_status: New status ('completed', 'failed', 'rejected', 'abandoned')
         processing_time_total: Updated total processing time
         explanation: Final explanation text (if completed)
+        processing_time_extraction: Text extraction time (ms)
+        processing_time_classification: Classification call time (ms)
+        processing_time_explanation: Explanation call time (ms)
+        cache_hit: Whether classification and explanation came from cache
+        api_cost_estimate: OpenAI cost of the request from real token usage (USD)
     """
     try:
         # Build params list correctly
@@ -93,15 +103,21 @@ async def update_tier1_status(
         updates = ["request_status = $1"]
         param_index = 2
 
-        if processing_time_total is not None:
-            updates.append(f"processing_time_total = ${param_index}")
-            params.append(processing_time_total)
-            param_index += 1
-
-        if explanation is not None:
-            updates.append(f"explanation = ${param_index}")
-            params.append(explanation)
-            param_index += 1
+        optional_columns = {
+            "processing_time_total": processing_time_total,
+            "explanation": explanation,
+            "processing_time_extraction": processing_time_extraction,
+            "processing_time_classification": processing_time_classification,
+            "processing_time_explanation": processing_time_explanation,
+            "cache_hit": cache_hit,
+            "api_cost_estimate": api_cost_estimate
+        }
+
+        for column, value in optional_columns.items():
+            if value is not None:
+                updates.append(f"{column} = ${param_index}")
+                params.append(value)
+                param_index += 1
 
         # Add session_id as last parameter for WHERE clause
         params.append(session_id)
@@ -0,0 +1,173 @@
+"""
+Event-loop lag monitor and blocking-call detector
+A task on the event loop sleeps LOOP_MONITOR_INTERVAL_MS at a time, and
+every wake-up reports how late it woke as event-loop lag, which is the delay
+every other request saw at that moment. A watchdog thread watches those
+wake-ups. When the loop has been stuck for LOOP_BLOCK_THRESHOLD_MS, it
+captures the loop thread's stack at that moment, which is the synchronous
+code blocking everyone. The stack is logged, counted as a metric and kept
+for the admin route (/admin/event-loop); /health only shows lag
+percentiles and counts
+"""
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+from typing import Deque, List, Optional
+from app.config import settings
+from app.services.metrics import LATENCY_BUCKETS, metrics
+
+loop_lag_seconds = metrics.histogram(
+    "sacha_event_loop_lag_seconds", "How late the event loop ran a scheduled wake-up",
+    buckets=LATENCY_BUCKETS)
+loop_blocked = metrics.counter(
+    "sacha_event_loop_blocked_total", "Times the event loop was blocked past LOOP_BLOCK_THRESHOLD_MS")
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of a sequence of samples (None if empty)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+def _short_path(filename: str) -> str:
+    """Path within site-packages or the working directory"""
+    _, marker, inside = filename.partition("site-packages" + os.sep)
+    if marker:
+        return inside
+    cwd = os.getcwd() + os.sep
+    return filename[len(cwd):] if filename.startswith(cwd) else filename
+
+
+def _stack_lines(frame) -> List[str]:
+    """Frames from outermost to innermost as 'file:line in function'"""
+    lines = []
+    while frame is not None:
+        code = frame.f_code
+        lines.append(f"{_short_path(code.co_filename)}:{frame.f_lineno} in {code.co_name}")
+        frame = frame.f_back
+    return list(reversed(lines))
+
+
+class LoopMonitor:
+    """
+    Measures the lag of one event loop and catches what blocks it
+    """
+
+    def __init__(self, interval_ms: float, block_threshold_ms: float, history: int):
+        """
+        Args:
+            interval_ms: Wake-up period of the lag probe
+            block_threshold_ms: Lag at which the blocking stack is captured
+            history: Blocking events kept for /admin/event-loop
+        """
+        self.interval = interval_ms / 1000
+        self.block_threshold = block_threshold_ms / 1000
+        self.lag = 0.0
+        self.max_lag = 0.0
+        # The last minute of wake-ups, for lag percentiles
+        self.recent_lags: Deque[float] = collections.deque(maxlen=max(1, round(60 / self.interval)))
+        self.blocked = 0
+        self.blocks: Deque[dict] = collections.deque(maxlen=history)
+        self._last_tick = 0.0
+        self._current_block: Optional[dict] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running loop (call from it, once)"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop.set()
+
+    async def _probe(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_tick = now
+            self.lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.recent_lags.append(lag)
+            loop_lag_seconds.observe(lag)
+
+            block = self._current_block
+            if block is not None:
+                # The watchdog caught this one mid-block - now we know how long it lasted
+                self._current_block = None
+                block['duration_ms'] = round(lag * 1000)
+                print(f"Event loop was blocked for {block['duration_ms']}ms in {block['stack'][-1]}")
+
+    def _watch(self) -> None:
+        check_every = self.block_threshold / 2
+        while not self._stop.wait(check_every):
+            stuck_for = time.monotonic() - self._last_tick - self.interval
+            if stuck_for < self.block_threshold or self._current_block is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            block = {
+                'at': time.time(),
+                'duration_ms': None,  # Filled in once the loop runs again
+                'stack': _stack_lines(frame)
+            }
+            self.blocked += 1
+            loop_blocked.inc()
+            self.blocks.append(block)
+            self._current_block = block
+            stack = "\n    ".join(block['stack'][-15:])
+            print(f"⚠️  Event loop blocked for over {round(stuck_for * 1000)}ms, at:\n    {stack}")
+
+    def get_stats(self) -> dict:
+        """
+        Get event loop statistics (safe to publish - no stacks)
+
+        Returns:
+            Dictionary with current/max lag, last-minute lag percentiles and blocked count
+        """
+        def rounded(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            'lag_ms': rounded(self.lag),
+            'max_lag_ms': rounded(self.max_lag),
+            'lag_percentiles_ms': {
+                'p50': rounded(_percentile(self.recent_lags, 0.50)),
+                'p95': rounded(_percentile(self.recent_lags, 0.95)),
+                'p99': rounded(_percentile(self.recent_lags, 0.99))
+            },
+            'blocked': self.blocked,
+            'block_threshold_ms': round(self.block_threshold * 1000)
+        }
+
+    def get_blocks(self) -> List[dict]:
+        """Recent blocking events with the stacks that caused them (admin only)"""
+        return list(self.blocks)
+
+
+# Global loop monitor
+loop_monitor = LoopMonitor(
+    interval_ms=settings.LOOP_MONITOR_INTERVAL_MS,
+    block_threshold_ms=settings.LOOP_BLOCK_THRESHOLD_MS,
+    history=settings.LOOP_BLOCK_HISTORY
+)
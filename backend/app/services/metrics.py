@@ -0,0 +1,279 @@
+"""
+Metrics registry
+Counters and fixed-bucket histograms kept in process memory (an observe
+is a bisect and a few additions under a lock) and rendered in the
+Prometheus text format on /metrics. With several uvicorn workers, each
+worker writes its snapshot to METRICS_DIR and /metrics sums the
+snapshots of every live worker, so a scrape sees the whole server no
+matter which worker answers it
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from app.config import settings
+
+# Latency buckets (seconds) - sub-millisecond cache lookups up to full OpenAI calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+# In-memory lookups (seconds)
+FAST_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+
+KNOWN_FILE_TYPES = (".pdf", ".doc", ".docx", ".jpg", ".jpeg", ".png")
+
+LabelValues = Tuple[str, ...]
+
+
+def file_type_label(file_extension: Optional[str]) -> str:
+    """File type label value (anything unexpected is 'other', to keep label sets small)"""
+    return file_extension if file_extension in KNOWN_FILE_TYPES else "other"
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            series = [[list(key), value] for key, value in self._values.items()]
+        return {'type': self.type, 'help': self.help,
+                'labelnames': list(self.labelnames), 'series': series}
+
+
+class Histogram:
+    """Observation counts per bucket, plus sum and count, per label set"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf)..., sum, count]
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of a block, with outcome=ok/error/cancelled"""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(time.perf_counter() - start, outcome=outcome, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            series = [[list(key), list(values)] for key, values in self._series.items()]
+        return {'type': self.type, 'help': self.help, 'labelnames': list(self.labelnames),
+                'buckets': list(self.buckets), 'series': series}
+
+
+class Collected:
+    """Values read from elsewhere at scrape time (queue depths, stats counters)"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str],
+                 collect: Callable[[], List[Tuple[LabelValues, float]]], type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.type = type
+
+    def snapshot(self) -> dict:
+        series = [[list(key), float(value)] for key, value in self.collect()]
+        return {'type': self.type, 'help': self.help,
+                'labelnames': list(self.labelnames), 'series': series}
+
+
+class MetricsRegistry:
+    """
+    All metrics of this process, and their rendering across workers
+    """
+
+    def __init__(self, directory: str = ""):
+        """
+        Args:
+            directory: Where workers share snapshots ("" = this process only)
+        """
+        self.directory = directory
+        self._metrics: Dict[str, object] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def collected(self, name: str, help: str, labelnames: Sequence[str],
+                  collect: Callable[[], List[Tuple[LabelValues, float]]],
+                  type: str = "gauge") -> Collected:
+        return self._register(Collected(name, help, labelnames, collect, type))
+
+    def snapshot(self) -> dict:
+        """This process's metrics as JSON-serializable data"""
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    # -- multi-worker ---------------------------------------------------------
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.directory, f"{os.getpid()}.json")
+
+    def write_snapshot(self) -> None:
+        """Publish this worker's snapshot for the other workers (atomic replace)"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path()
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def _worker_snapshots(self) -> List[dict]:
+        """Snapshots of every live worker (this one taken fresh); stale files are removed"""
+        self.write_snapshot()
+        snapshots = []
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                if now - entry.stat().st_mtime > settings.METRICS_STALE_SECONDS:
+                    os.remove(entry.path)  # Worker exited
+                    continue
+                with open(entry.path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Being replaced or removed by its worker
+        return snapshots
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.METRICS_FLUSH_SECONDS)
+            try:
+                await asyncio.to_thread(self.write_snapshot)
+            except OSError as e:
+                print(f"Metrics snapshot error: {str(e)}")
+
+    def start(self) -> None:
+        """Start publishing snapshots (call once the event loop is running)"""
+        if self.directory and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    # -- rendering ------------------------------------------------------------
+
+    @staticmethod
+    def _merge(snapshots: List[dict]) -> dict:
+        """Sum snapshots of several workers series by series"""
+        merged: Dict[str, dict] = {}
+        for snapshot in snapshots:
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, {**metric, 'series': {}})
+                for labels, value in metric['series']:
+                    key = tuple(labels)
+                    if metric['type'] == "histogram":
+                        current = target['series'].get(key)
+                        target['series'][key] = value if current is None else \
+                            [a + b for a, b in zip(current, value)]
+                    else:
+                        target['series'][key] = target['series'].get(key, 0.0) + value
+        return merged
+
+    def render(self) -> str:
+        """All metrics (summed across workers) in Prometheus text format"""
+        snapshots = self._worker_snapshots() if self.directory else [self.snapshot()]
+        lines = []
+        for name, metric in self._merge(snapshots).items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric['labelnames']
+            for key, value in metric['series'].items():
+                if metric['type'] != "histogram":
+                    lines.append(f"{name}{_labels(labelnames, key)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric['buckets'] + ["+Inf"], value[:-2]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labelnames, key, le=le)} {_number(cumulative)}")
+                lines.append(f"{name}_sum{_labels(labelnames, key)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labelnames, key)} {_number(value[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], le: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Global registry
+metrics = MetricsRegistry(directory=settings.METRICS_DIR)
+
+# Instruments used across the services
+pipeline_seconds = metrics.histogram(
+    "sacha_pipeline_seconds", "Whole document analysis", ("file_type", "outcome"))
+stage_seconds = metrics.histogram(
+    "sacha_pipeline_stage_seconds", "Document pipeline stages", ("stage", "file_type", "outcome"))
+openai_call_seconds = metrics.histogram(
+    "sacha_openai_call_seconds", "OpenAI calls until the response (or stream) starts",
+    ("model", "stream", "outcome"))
+llm_completion_seconds = metrics.histogram(
+    "sacha_llm_completion_seconds", "Completed OpenAI calls including streaming, by prompt", ("prompt",))
+ocr_seconds = metrics.histogram(
+    "sacha_ocr_seconds", "Image OCR", ("outcome",))
+db_write_seconds = metrics.histogram(
+    "sacha_db_write_seconds", "Analytics database writes", ("db", "table", "outcome"))
+cache_lookup_seconds = metrics.histogram(
+    "sacha_cache_lookup_seconds", "Response cache lookups", ("operation", "result"), FAST_BUCKETS)
@@ -0,0 +1,126 @@
+"""
+Micro-batching service
+Collects concurrent requests for a short window and runs them as one batch
+Used to share a single LLM call (and its system prompt) across many uploads
+"""
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+from app.services.deadline import with_deadline
+
+
+class MicroBatcher:
+    """
+    Groups items submitted within a short time window into a single batch call
+
+    The batch function receives the list of items and must return a list of
+    results in the same order. Each caller gets back its own result; an
+    Exception instance in the results (or raised by the batch function) is
+    raised to the matching caller instead.
+
+    A batch belongs to no single caller: it runs in a fresh context (no
+    request deadline, usage or trace) bounded by its own timeout, and each
+    caller bounds only its own wait by its request deadline.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+        window_ms: int,
+        max_size: int,
+        timeout: float
+    ):
+        """
+        Args:
+            run_batch: Coroutine function executing one batch of items
+            window_ms: How long to wait for more items before flushing
+            max_size: Flush immediately once this many items are pending
+            timeout: Longest a batch may run
+        """
+        self.run_batch = run_batch
+        self.timeout = timeout
+        self.window_seconds = window_ms / 1000
+        self.max_size = max(1, max_size)
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queue an item for the next batch and wait for its result
+
+        Args:
+            item: Input passed to the batch function
+
+        Returns:
+            Result for this item
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                self.window_seconds, self._flush)
+
+        try:
+            return await with_deadline(future, self.window_seconds + self.timeout)
+        finally:
+            # Out of time or cancelled - the batch drops this caller's result
+            future.cancel()
+
+    def _flush(self) -> None:
+        """Hand the pending items to a background task and reset the window"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        # Keep a reference so the task isn't garbage collected mid-flight.
+        # Fresh context: not the deadline, usage or trace of whoever triggered the flush
+        task = asyncio.create_task(self._execute(batch), context=contextvars.Context())
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _execute(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        """Run one batch and fan the results back out to the waiting callers"""
+        items = [item for item, _ in batch]
+
+        try:
+            results = await asyncio.wait_for(self.run_batch(items), self.timeout)
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"Batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # Callers that were cancelled while waiting simply drop their result
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def get_stats(self) -> dict:
+        """
+        Get batcher statistics
+
+        Returns:
+            Dictionary with batcher stats
+        """
+        return {
+            'pending': len(self._pending),
+            'in_flight_batches': len(self._running),
+            'window_ms': int(self.window_seconds * 1000),
+            'max_size': self.max_size
+        }
@@ -4,99 +4,135 @@ Handles communication with OpenAI API for financial document explanation
 Supports insurance, loans, investments, and all financial documents
 Includes streaming support for faster perceived response time
 """
-from openai import AsyncOpenAI
+import asyncio
+import time
+from typing import TYPE_CHECKING, Optional
 from app.config import settings
+from app.services.deadline import DeadlineExceeded, iterate_with_deadline, remaining_time, with_deadline
+from app.services.llm_governor import llm_governor
+from app.services.metrics import openai_call_seconds
+from app.services.tracing import span
+from app.services.prompts import build_explanation_messages
+from app.services.token_budget import trim_to_token_budget
+from app.services.usage_tracker import usage_tracker, elapsed_ms
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
-async def get_insurance_explanation(text: str) -> str:
-    """
-    Get simplified explanation of financial document using OpenAI
-    Handles insurance, loans, investments, mutual funds, FDs, EMIs, etc.
+# Shared client so HTTP connections (and TLS sessions) are reused across calls
+_client: Optional["AsyncOpenAI"] = None
 
-    Args:
-        text: Extracted text from financial document
+
+def get_openai_client() -> "AsyncOpenAI":
+    """
+    Get or create the shared async OpenAI client
 
     Returns:
-        Formatted explanation with sections
+        AsyncOpenAI: Client instance
     """
-    # Initialize async OpenAI client
-    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    global _client
+
+    if _client is None:
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient  # Deferred - heavy import (see services/preload.py)
+
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            # httpx drops idle connections after 5s by default - keep the warm ones longer
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                max_connections=1000, max_keepalive_connections=100,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_SECONDS))
+        )
+
+    return _client
+
 
-    # Craft the prompt
-    prompt = f"""You are Sacha Advisor, an AI assistant that simplifies ALL financial documents for everyday people.
+async def warm_up_connection() -> None:
+    """
+    Connect to the API (DNS, TCP and TLS) before the first request needs to;
+    the connection stays in the shared client's keep-alive pool
+    """
+    client = await asyncio.to_thread(get_openai_client)  # Imports the SDK - keep it off the loop
+    from openai import APIStatusError
 
-Your task is to analyze the following financial document and provide a clear, friendly explanation.
+    try:
+        await client.models.retrieve(
+            settings.OPENAI_MODEL, timeout=settings.LLM_TIMEOUT_SECONDS)
+    except APIStatusError:
+        pass  # Any HTTP answer means the connection is up
 
-This could be ANY financial document including:
-- Insurance policies, claims, coverage documents
-- Loan agreements (home, personal, auto, education, business)
-- Investment documents (mutual funds, stocks, bonds, SIPs)
-- Fixed deposits, recurring deposits, savings schemes
-- EMI schedules, payment plans, credit agreements
-- Pension plans, provident funds, retirement documents
-- Portfolio management, wealth advisory documents
-- Bank statements, credit card terms, demat accounts
 
-IMPORTANT RULES:
-- Use simple, conversational language (like explaining to a friend)
-- Break down complex financial jargon into easy-to-understand terms
-- Use analogies where helpful
-- DO NOT provide financial advice or recommend what to buy/invest
-- DO NOT calculate returns, interest, or premiums yourself
-- DO NOT provide legal advice or tax planning
-- Only explain what's written in the document
+async def _governed_create(**kwargs):
+    """Issue the call while holding an LLM governor slot"""
+    async with llm_governor.slot():
+        timeout = remaining_time(settings.LLM_TIMEOUT_SECONDS)
+        return await get_openai_client().chat.completions.create(timeout=timeout, **kwargs)
 
-Please structure your response in the following format:
 
-**📋 Summary**
-[2-3 sentence overview of what this document is - identify the type: insurance/loan/investment/etc.]
+async def create_chat_completion(**kwargs):
+    """
+    Create a chat completion on the shared client, bounded by the request deadline
+    Non-streaming calls wait for an LLM governor slot (the wait counts against
+    the deadline); streams hold their slot while iterating, so callers
+    acquire it around the stream instead
 
-**✅ Key Benefits/Features**
-[List the main benefits, features, or terms in bullet points]
+    Args:
+        **kwargs: Arguments for chat.completions.create
 
-**❌ Exclusions/Restrictions**
-[List what's NOT covered, restrictions, or limitations in bullet points - if applicable]
+    Returns:
+        ChatCompletion (or AsyncStream when stream=True)
 
-**⚠️ Important Things to Know**
-[List key terms, conditions, interest rates, maturity periods, charges, penalties, etc.]
+    Raises:
+        DeadlineExceeded: If the request deadline passes before the call returns
+    """
+    stream = bool(kwargs.get("stream"))
+    if stream:
+        timeout = remaining_time(settings.LLM_TIMEOUT_SECONDS)
+        call = get_openai_client().chat.completions.create(timeout=timeout, **kwargs)
+    else:
+        call = _governed_create(**kwargs)
+    model = kwargs.get("model", "unknown")
+    with openai_call_seconds.time(model=model, stream=str(stream).lower()), \
+            span("openai", model=model, stream=stream):
+        return await with_deadline(call, settings.LLM_TIMEOUT_SECONDS)
 
-**💡 Simple Analogy**
-[Explain the document using a simple real-world analogy]
 
-**🎯 5-Point Breakdown**
-1. [Most important point]
-2. [Second important point]
-3. [Third important point]
-4. [Fourth important point]
-5. [Fifth important point]
+async def _document_excerpt(text: str) -> str:
+    """Trim document text to the explanation input token budget"""
+    return await trim_to_token_budget(
+        text, settings.EXPLANATION_INPUT_TOKENS, settings.OPENAI_MODEL)
 
-Here's the financial document text:
 
-{text[:4000]}
+async def get_insurance_explanation(text: str) -> str:
+    """
+    Get simplified explanation of financial document using OpenAI
+    Handles insurance, loans, investments, mutual funds, FDs, EMIs, etc.
 
-Provide a friendly, helpful explanation:"""
+    Args:
+        text: Extracted text from financial document
 
+    Returns:
+        Formatted explanation with sections
+    """
     try:
         # Call OpenAI API asynchronously
-        response = await client.chat.completions.create(
+        call_start = time.perf_counter()
+        response = await create_chat_completion(
             model=settings.OPENAI_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are Sacha Advisor, a friendly AI that simplifies ALL financial documents including insurance, loans, investments, mutual funds, fixed deposits, EMI schedules, pension plans, and more. You explain complex financial terms in simple language without providing financial or legal advice."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            messages=build_explanation_messages(await _document_excerpt(text)),
             temperature=0.7,
             max_tokens=1500
         )
+        usage_tracker.record(
+            "explanation", response.usage,
+            model=response.model, wall_time_ms=elapsed_ms(call_start))
 
         explanation = response.choices[0].message.content
         return explanation
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise Exception(f"Error getting AI explanation: {str(e)}")
 
@@ -112,86 +148,37 @@ async def get_insurance_explanation_stream(text: str):
     Yields:
         str: Chunks of explanation as they're generated
     """
-    # Initialize async OpenAI client
-    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-
-    # Use the same prompt as non-streaming version
-    prompt = f"""You are Sacha Advisor, an AI assistant that simplifies ALL financial documents for everyday people.
-
-Your task is to analyze the following financial document and provide a clear, friendly explanation.
-
-This could be ANY financial document including:
-- Insurance policies, claims, coverage documents
-- Loan agreements (home, personal, auto, education, business)
-- Investment documents (mutual funds, stocks, bonds, SIPs)
-- Fixed deposits, recurring deposits, savings schemes
-- EMI schedules, payment plans, credit agreements
-- Pension plans, provident funds, retirement documents
-- Portfolio management, wealth advisory documents
-- Bank statements, credit card terms, demat accounts
-
-IMPORTANT RULES:
-- Use simple, conversational language (like explaining to a friend)
-- Break down complex financial jargon into easy-to-understand terms
-- Use analogies where helpful
-- DO NOT provide financial advice or recommend what to buy/invest
-- DO NOT calculate returns, interest, or premiums yourself
-- DO NOT provide legal advice or tax planning
-- Only explain what's written in the document
-
-Please structure your response in the following format:
-
-**📋 Summary**
-[2-3 sentence overview of what this document is - identify the type: insurance/loan/investment/etc.]
-
-**✅ Key Benefits/Features**
-[List the main benefits, features, or terms in bullet points]
-
-**❌ Exclusions/Restrictions**
-[List what's NOT covered, restrictions, or limitations in bullet points - if applicable]
-
-**⚠️ Important Things to Know**
-[List key terms, conditions, interest rates, maturity periods, charges, penalties, etc.]
-
-**💡 Simple Analogy**
-[Explain the document using a simple real-world analogy]
-
-**🎯 5-Point Breakdown**
-1. [Most important point]
-2. [Second important point]
-3. [Third important point]
-4. [Fourth important point]
-5. [Fifth important point]
-
-Here's the financial document text:
-
-{text[:4000]}
-
-Provide a friendly, helpful explanation:"""
-
     try:
-        # Call OpenAI API with streaming enabled
-        stream = await client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are Sacha Advisor, a friendly AI that simplifies ALL financial documents including insurance, loans, investments, mutual funds, fixed deposits, EMI schedules, pension plans, and more. You explain complex financial terms in simple language without providing financial or legal advice."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7,
-            max_tokens=1500,
-            stream=True  # Enable streaming
-        )
-
-        # Yield chunks as they arrive
-        async for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
-
+        # Call OpenAI API with streaming enabled (same prompt as non-streaming version)
+        # The governor slot is held for the whole stream, not just its first byte
+        async with llm_governor.slot():
+            call_start = time.perf_counter()
+            ttft_ms = None
+            stream = await create_chat_completion(
+                model=settings.OPENAI_MODEL,
+                messages=build_explanation_messages(await _document_excerpt(text)),
+                temperature=0.7,
+                max_tokens=1500,
+                stream=True,  # Enable streaming
+                stream_options={"include_usage": True}  # Final chunk carries usage
+            )
+
+            # Yield chunks as they arrive - the whole stream, not just its
+            # creation, is bounded by the deadline (it holds a governor slot)
+            try:
+                async for chunk in iterate_with_deadline(stream, settings.LLM_TIMEOUT_SECONDS):
+                    if chunk.usage is not None:
+                        usage_tracker.record(
+                            "explanation", chunk.usage, model=chunk.model,
+                            wall_time_ms=elapsed_ms(call_start), ttft_ms=ttft_ms)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if ttft_ms is None:
+                            ttft_ms = elapsed_ms(call_start)
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()  # Give the connection back, even mid-stream
+
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise Exception(f"Error streaming AI explanation: {str(e)}")
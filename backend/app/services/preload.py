@@ -0,0 +1,142 @@
+"""
+Deferred imports and the import-time report
+Heavy dependencies (the OpenAI SDK, user-agent regexes, asyncpg, tiktoken)
+are imported where they are first used instead of when app.main loads, so
+a worker answers /health sooner. Shortly after startup a background thread
+imports them anyway, so the first real request normally finds them loaded.
+Document parsers (PyMuPDF, python-docx, PyPDF2) are only needed by the
+sandbox workers and are not imported by the API process at all.
+
+Import-time report (what app.main costs to import, and what is deferred):
+    python -m app.services.preload [--top 25]
+"""
+import argparse
+import importlib
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+
+
+def deferred_modules() -> List[str]:
+    """Modules imported on first use that the API process will need"""
+    modules = ["openai", "user_agents", "tiktoken"]
+    if settings.DATABASE_URL:
+        modules.append("asyncpg")
+    if not settings.SANDBOX_ENABLED:
+        # Parsing happens in this process
+        modules += ["pymupdf", "docx", "PyPDF2"]
+    return modules
+
+
+class Preloader:
+    """
+    Imports the deferred modules in a background thread after startup
+    """
+
+    def __init__(self):
+        self.app_import_ms: Optional[int] = None  # Set by app.main
+        self.modules: Dict[str, Optional[int]] = {}  # module -> import ms (None = failed)
+        self.done = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, delay: float = 0.0) -> None:
+        """Start pre-importing (after delay seconds, to let the server bind first)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(delay,), name="preload", daemon=True)
+        self._thread.start()
+
+    def _run(self, delay: float) -> None:
+        time.sleep(delay)
+        self.run()
+
+    def run(self) -> None:
+        """Import the deferred modules now (blocking; startup warm-up calls this from a thread)"""
+        for module in deferred_modules():
+            started = time.perf_counter()
+            try:
+                importlib.import_module(module)
+                self.modules[module] = round((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                self.modules[module] = None
+                print(f"Preload of {module} failed: {str(e)}")
+        self.done = True
+
+    def get_stats(self) -> dict:
+        """
+        Get startup import statistics
+
+        Returns:
+            Dictionary with app import time and per-module pre-import times (ms)
+        """
+        return {
+            'app_import_ms': self.app_import_ms,
+            'preload_done': self.done,
+            'preloaded_ms': dict(self.modules)
+        }
+
+
+# Global preloader
+preloader = Preloader()
+
+
+# ---------------------------------------------------------------------------
+# Import-time report
+# ---------------------------------------------------------------------------
+
+def _parse_importtime(stderr: str) -> Dict[str, Tuple[int, List[Tuple[str, int]]]]:
+    """
+    Top-level imports from python -X importtime output, as
+    {module: (cumulative us, [(nested module, cumulative us), ...])}
+    """
+    roots: Dict[str, Tuple[int, List[Tuple[str, int]]]] = {}
+    nested: List[Tuple[str, int]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Nested imports finish (and are printed) before the import that caused them
+        if name.startswith("  ", 1):
+            nested.append((name.strip(), int(cumulative)))
+        else:
+            roots[name.strip()] = (int(cumulative), nested)
+            nested = []
+    return roots
+
+
+def import_time_report(top: int = 25) -> str:
+    """
+    Import app.main in a fresh interpreter, then each deferred module, and
+    summarize where the time goes
+    """
+    statements = ["import app.main"] + [f"import {module}" for module in deferred_modules()]
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(statements)],
+        capture_output=True, text=True)
+    roots = _parse_importtime(result.stderr)
+
+    app_us, app_nested = roots.get("app.main", (0, []))
+    lines = [f"app.main imports in {app_us / 1000:.0f} ms"]
+    heaviest = sorted(((cumulative, name) for name, cumulative in app_nested if "." not in name),
+                      reverse=True)[:top]
+    lines.append("\nHeaviest packages loaded by app.main (cumulative):")
+    for cumulative, name in heaviest:
+        lines.append(f"  {cumulative / 1000:8.1f} ms  {name}")
+    lines.append("\nDeferred until first use (pre-imported in the background after startup):")
+    for module in deferred_modules():
+        if module in roots:
+            lines.append(f"  {roots[module][0] / 1000:8.1f} ms  {module}")
+        else:
+            lines.append(f"  {'-':>8}     {module} (already loaded by app.main, or not installed)")
+    if result.returncode != 0:
+        lines.append(f"\nImport failed:\n{result.stderr.strip().splitlines()[-1]}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time report for the API process")
+    parser.add_argument("--top", type=int, default=25, help="Packages to list")
+    print(import_time_report(parser.parse_args().top))
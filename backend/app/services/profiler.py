@@ -0,0 +1,323 @@
+"""
+On-demand sampling profiler
+Profiles one request (sent with a signed X-Profile header) or a time
+window (started from /admin/profile). A sampler thread reads every
+thread's stack each PROFILE_INTERVAL_MS and counts identical stacks, so
+the cost is proportional to the sampling rate and not to the code being
+profiled, and nothing runs at all while no profile is active. Each
+profile is written to PROFILE_DIR as a collapsed-stack file
+(flamegraph.pl, speedscope) with the documents analyzed while it ran,
+so slow inputs can be replayed offline. Sandbox workers are other
+processes, so while a profile is active they sample their own stacks
+(run_profiled) and send them back with the result (adopt_stacks)
+
+Profile tokens are "<expiry unix time>.<HMAC-SHA256 of 'profile:<expiry>'>"
+keyed by PROFILER_SECRET; generate one with:
+    python -m app.services.profiler [ttl seconds]
+"""
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+
+# Stacks whose innermost frame is in these modules are threads waiting for work
+_IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", os.path.join("concurrent", "futures", "thread.py"))
+_MAX_DEPTH = 128
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running (stacks are sampled process-wide)"""
+
+
+def sign_profile_token(ttl_seconds: int = 600, secret: Optional[str] = None) -> str:
+    """A profile token valid for ttl_seconds"""
+    expires = int(time.time()) + ttl_seconds
+    key = (secret or settings.PROFILER_SECRET).encode()
+    signature = hmac.new(key, f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_token(token: Optional[str]) -> bool:
+    """Whether a token is correctly signed, unexpired and not valid for too long"""
+    if not settings.PROFILER_SECRET or not token:
+        return False
+    expires, _, signature = token.strip().partition(".")
+    if not expires.isdigit():
+        return False
+    remaining = int(expires) - time.time()
+    if remaining <= 0 or remaining > settings.PROFILER_TOKEN_MAX_TTL_SECONDS:
+        return False
+    key = settings.PROFILER_SECRET.encode()
+    expected = hmac.new(key, f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+class Profile:
+    """
+    One profiling run: sampled stack counts plus the documents it saw
+    """
+
+    def __init__(self, label: str, max_seconds: float):
+        """
+        Args:
+            label: What is profiled (request path or "window")
+            max_seconds: Sampling stops after this even if stop() isn't called
+        """
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.label = label
+        self.max_seconds = max_seconds
+        self.interval = settings.PROFILE_INTERVAL_MS / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.documents: List[dict] = []
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._sample, name=f"profiler-{self.profile_id}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.finished_at = time.time()
+
+    def _sample(self) -> None:
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident or frame.f_code.co_filename.endswith(_IDLE_MODULES):
+                    continue
+                labels = []
+                while frame is not None and len(labels) < _MAX_DEPTH:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def keep_document(self, file_content: bytes, file_extension: str, filename: str) -> Optional[dict]:
+        """
+        Record a document analyzed during the profile (up to PROFILE_MAX_DOCUMENTS)
+
+        Returns:
+            The document's entry (the pipeline adds its timings), or None when full
+        """
+        if len(self.documents) >= settings.PROFILE_MAX_DOCUMENTS:
+            return None
+        entry = {
+            'file': f"{self.profile_id}-{len(self.documents) + 1}{file_extension}",
+            'filename': filename,
+            'size_bytes': len(file_content),
+            'sha256': hashlib.sha256(file_content).hexdigest(),
+            'content': file_content
+        }
+        self.documents.append(entry)
+        return entry
+
+    def write(self, directory: str) -> str:
+        """
+        Write <id>.collapsed, <id>.json (summary) and the kept documents (blocking)
+
+        Returns:
+            str: Path of the collapsed-stack file
+        """
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.profile_id)
+        with open(f"{base}.collapsed", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        for document in self.documents:
+            with open(os.path.join(directory, document['file']), "wb") as f:
+                f.write(document['content'])
+        with open(f"{base}.json", "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        return f"{base}.collapsed"
+
+    def summary(self) -> dict:
+        return {
+            'profile_id': self.profile_id,
+            'label': self.label,
+            'status': "running" if self.finished_at is None else "finished",
+            'started_at': self.started_at,
+            'duration_s': round((self.finished_at or time.time()) - self.started_at, 3),
+            'interval_ms': settings.PROFILE_INTERVAL_MS,
+            'samples': self.samples,
+            'documents': [{key: value for key, value in document.items() if key != 'content'}
+                          for document in self.documents]
+        }
+
+
+def run_profiled(fn: Callable[..., Any], *args) -> Tuple[Any, Dict[str, int]]:
+    """
+    Call fn while sampling this process's stacks and return (result, stack counts)
+    For work in another process: the counts are picklable and are added to
+    the caller's active profile with adopt_stacks()
+    """
+    profile = Profile("remote", settings.PROFILE_MAX_SECONDS)
+    profile.start()
+    try:
+        result = fn(*args)
+    finally:
+        profile.stop()
+    return result, dict(profile.stacks)
+
+
+def adopt_stacks(stacks: Dict[str, int], root: str) -> None:
+    """Add stack counts from run_profiled() to the active profile, under a root frame"""
+    profile = profiler.active
+    if profile is None:
+        return
+    for stack, count in stacks.items():
+        profile.stacks[f"{root};{stack}"] += count
+
+
+_current_profile: contextvars.ContextVar[Optional[Profile]] = contextvars.ContextVar(
+    "current_profile", default=None)
+
+
+class Profiler:
+    """
+    Runs at most one profile at a time and writes finished ones to PROFILE_DIR
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.active: Optional[Profile] = None
+        self.window: Optional[Profile] = None  # Active profile covering every request
+        self.finished: Dict[str, dict] = {}  # profile_id -> summary (recent ones)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.PROFILER_SECRET)
+
+    def start(self, label: str, seconds: float) -> Profile:
+        """
+        Start sampling
+
+        Raises:
+            ProfilerBusy: A profile is already running
+        """
+        if self.active is not None:
+            raise ProfilerBusy(f"Profile {self.active.profile_id} is already running")
+        profile = Profile(label, min(seconds, settings.PROFILE_MAX_SECONDS))
+        self.active = profile
+        profile.start()
+        return profile
+
+    def start_window(self, seconds: float) -> Profile:
+        """Profile everything for the next seconds (stopped and written by a background task)"""
+        profile = self.start("window", seconds)
+        self.window = profile
+
+        async def finish() -> None:
+            await asyncio.sleep(profile.max_seconds)
+            await self.finish(profile)
+
+        asyncio.create_task(finish(), context=contextvars.Context())
+        return profile
+
+    async def finish(self, profile: Profile) -> None:
+        """Stop a profile and write it (file I/O off the event loop)"""
+        if self.window is profile:
+            self.window = None
+        if self.active is profile:
+            self.active = None
+        try:
+            path = await asyncio.to_thread(self._stop_and_write, profile)
+            print(f"Profile {profile.profile_id} written to {path} ({profile.samples} samples)")
+        except OSError as e:
+            print(f"Profile write error: {str(e)}")
+        self.finished[profile.profile_id] = profile.summary()
+        while len(self.finished) > 50:
+            self.finished.pop(next(iter(self.finished)))
+
+    def _stop_and_write(self, profile: Profile) -> str:
+        profile.stop()
+        return profile.write(self.directory)
+
+    def keep_document(self, file_content: bytes, file_extension: str, filename: str) -> Optional[dict]:
+        """Keep a document being analyzed if its request (or the window) is profiled"""
+        profile = _current_profile.get() or self.window
+        if profile is None:
+            return None
+        return profile.keep_document(file_content, file_extension, filename)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        """Summary of a running or recently finished profile"""
+        if self.active is not None and self.active.profile_id == profile_id:
+            return self.active.summary()
+        return self.finished.get(profile_id)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that carry a valid signed X-Profile header
+    The response gets X-Profile-Id; the profile is written once the request
+    (including its background tasks) is done
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.enabled or scope["path"].startswith("/admin/"):
+            await self.app(scope, receive, send)
+            return
+        token = next((value.decode("latin-1") for header, value in scope.get("headers", ())
+                      if header == b"x-profile"), None)
+        if token is None:
+            await self.app(scope, receive, send)
+            return
+        if not verify_profile_token(token):
+            print(f"Ignoring invalid X-Profile token on {scope['path']}")
+            await self.app(scope, receive, send)
+            return
+        try:
+            profile = profiler.start(f"{scope['method']} {scope['path']}", settings.PROFILE_MAX_SECONDS)
+        except ProfilerBusy as e:
+            print(f"Request not profiled: {str(e)}")
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-profile-id", profile.profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        context_token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current_profile.reset(context_token)
+            await profiler.finish(profile)
+
+
+# Global profiler
+profiler = Profiler(directory=settings.PROFILE_DIR)
+
+
+if __name__ == "__main__":
+    if not settings.PROFILER_SECRET:
+        sys.exit("PROFILER_SECRET is not set")
+    print(sign_profile_token(int(sys.argv[1]) if len(sys.argv) > 1 else 600))
@@ -0,0 +1,226 @@
+"""
+Per-user rate limiting
+GCRA (generic cell rate algorithm) keyed on the anonymous user ID: each
+user is one stored timestamp - the "theoretical arrival time" - so memory
+is O(1) per active user and an idle user's entry expires once it has
+fully replenished. Requests have a cost: a cache hit is cheap, a request
+that had to call OpenAI is charged extra afterwards. Workers share limits
+through Redis when RATE_LIMIT_REDIS_URL is set, in-process memory otherwise
+"""
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+from cachetools import TLRUCache
+from app.config import settings
+
+
+class RateLimited(Exception):
+    """The user has used up their allowance"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for GCRA state; update() must apply atomically per key
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def update(self, key: str, now: float, increment: float,
+                     tolerance: float, force: bool) -> float:
+        """
+        Spend increment seconds of a key's allowance
+
+        Args:
+            key: Rate limit key
+            now: Current time (seconds)
+            increment: Emission interval x request cost
+            tolerance: Burst allowance (seconds of emission interval)
+            force: Spend even if over the limit (charging work already done)
+
+        Returns:
+            float: 0 if allowed (and spent), else seconds until it would be
+        """
+
+    def get_stats(self) -> dict:
+        return {'backend': self.name}
+
+
+def _until_replenished(_key: str, entry: Tuple[float, float], timer_now: float) -> float:
+    """Expiry of a stored (tat, stored at) entry: when its allowance is full again"""
+    tat, stored_at = entry
+    return timer_now + max(0.0, tat - stored_at)
+
+
+class MemoryBackend(RateLimitBackend):
+    """
+    Per-process state in a time-aware cache (each worker enforces its own limit)
+    Each key expires when its own TAT is reached, so a key that was charged
+    deep into debt is kept until the debt is paid off (as in Redis)
+    """
+
+    name = "memory"
+
+    def __init__(self, max_keys: int):
+        """
+        Args:
+            max_keys: Most users tracked at once
+        """
+        self._tat = TLRUCache(maxsize=max_keys, ttu=_until_replenished)
+
+    async def update(self, key: str, now: float, increment: float,
+                     tolerance: float, force: bool) -> float:
+        stored = self._tat.get(key)
+        tat = max(stored[0], now) if stored is not None else now
+        new_tat = tat + increment
+        allow_at = new_tat - tolerance
+        if allow_at > now and not force:
+            return allow_at - now
+        self._tat[key] = (new_tat, now)
+        return 0.0
+
+    def get_stats(self) -> dict:
+        return {'backend': self.name, 'active_keys': len(self._tat)}
+
+
+# GCRA as one atomic Redis call; the key expires when its allowance is full again
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local increment = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local force = ARGV[4] == '1'
+local tat = now
+local stored = redis.call('GET', KEYS[1])
+if stored then
+    tat = math.max(tonumber(stored), now)
+end
+local new_tat = tat + increment
+local allow_at = new_tat - tolerance
+if allow_at > now and not force then
+    return tostring(allow_at - now)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1)
+return '0'
+"""
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    State shared by every worker in Redis
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis_asyncio  # Optional dependency
+
+        self._redis = redis_asyncio.from_url(url)
+        self._script = self._redis.register_script(_GCRA_SCRIPT)
+        self.errors = 0
+
+    async def update(self, key: str, now: float, increment: float,
+                     tolerance: float, force: bool) -> float:
+        try:
+            result = await self._script(
+                keys=[f"ratelimit:{key}"],
+                args=[repr(now), repr(increment), repr(tolerance), "1" if force else "0"])
+            return float(result)
+        except Exception as e:
+            # Fail open - Redis trouble must not take uploads down with it
+            self.errors += 1
+            print(f"Rate limit backend error: {str(e)}")
+            return 0.0
+
+    def get_stats(self) -> dict:
+        return {'backend': self.name, 'errors': self.errors}
+
+
+def _make_backend() -> RateLimitBackend:
+    """Redis when configured (and installed), otherwise in-process memory"""
+    if settings.RATE_LIMIT_REDIS_URL:
+        try:
+            return RedisBackend(settings.RATE_LIMIT_REDIS_URL)
+        except ImportError:
+            print("⚠️  RATE_LIMIT_REDIS_URL is set but redis is not installed - using per-worker limits")
+    return MemoryBackend(max_keys=settings.RATE_LIMIT_MAX_KEYS)
+
+
+def rate_limit_key(user_id: str, session_id: Optional[str] = None) -> str:
+    """Key requests are counted under (per session too when RATE_LIMIT_PER_SESSION)"""
+    if settings.RATE_LIMIT_PER_SESSION and session_id:
+        return f"{user_id}:{session_id}"
+    return user_id
+
+
+class RateLimiter:
+    """
+    GCRA limiter: per_minute cost units replenish per minute, up to burst saved up
+    """
+
+    def __init__(self, per_minute: float, burst: int,
+                 backend: Optional[RateLimitBackend] = None):
+        """
+        Args:
+            per_minute: Sustained cost units per minute
+            burst: Cost units a fresh user can spend at once
+            backend: State storage (default from config)
+        """
+        self.enabled = settings.RATE_LIMIT_ENABLED
+        self.interval = 60.0 / per_minute
+        self.tolerance = self.interval * burst
+        self.backend = backend or _make_backend()
+        self.stats = {'allowed': 0, 'limited': 0, 'charged': 0}
+
+    async def acquire(self, key: str, cost: int = 1) -> None:
+        """
+        Spend cost units for a new request
+
+        Raises:
+            RateLimited: Not enough allowance left; retry_after says when there will be
+        """
+        if not self.enabled:
+            return
+        wait = await self.backend.update(
+            key, time.time(), self.interval * cost, self.tolerance, force=False)
+        if wait > 0:
+            self.stats['limited'] += 1
+            raise RateLimited(max(1, math.ceil(wait)))
+        self.stats['allowed'] += 1
+
+    async def charge(self, key: str, cost: int) -> None:
+        """
+        Spend extra units for work already done (never refuses; delays the next request)
+        Shielded: callers charge in finally blocks, where a client disconnect
+        may cancel them - the update still completes
+        """
+        if not self.enabled or cost <= 0:
+            return
+        self.stats['charged'] += 1
+        await asyncio.shield(self.backend.update(
+            key, time.time(), self.interval * cost, self.tolerance, force=True))
+
+    def get_stats(self) -> dict:
+        """
+        Get rate limiter statistics
+
+        Returns:
+            Dictionary with allowed/limited/charged counts and backend info
+        """
+        return {
+            'enabled': self.enabled,
+            **self.stats,
+            **self.backend.get_stats()
+        }
+
+
+# Global rate limiter
+rate_limiter = RateLimiter(
+    per_minute=settings.RATE_LIMIT_PER_MINUTE,
+    burst=settings.RATE_LIMIT_BURST
+)
@@ -0,0 +1,196 @@
+"""
+Rejection message engine
+Serves the friendly "we can't analyze this" message from a precomputed
+table keyed on the normalized document type. Only document types never
+seen before are generated with OpenAI, and the result is stored so every
+later rejection of that type is instant and free
+"""
+import asyncio
+import contextvars
+import re
+import time
+from typing import Dict
+from cachetools import LRUCache
+from app.config import settings
+from app.services.deadline import DeadlineExceeded, with_deadline
+from app.services.openai_client import create_chat_completion
+from app.services.prompts import build_rejection_messages
+from app.services.usage_tracker import usage_tracker, elapsed_ms
+
+SUGGESTION = "Please upload a financial document instead - for example an insurance policy, loan agreement, bank statement, mutual fund statement or fixed deposit receipt."
+
+# Common spellings the classifier returns, mapped to one canonical type
+ALIASES = {
+    "cv": "resume",
+    "curriculum vitae": "resume",
+    "biodata": "resume",
+    "aadhaar": "identity document",
+    "aadhaar card": "identity document",
+    "aadhar card": "identity document",
+    "pan card": "identity document",
+    "voter id": "identity document",
+    "id card": "identity document",
+    "identity card": "identity document",
+    "drivers license": "identity document",
+    "driving license": "identity document",
+    "driving licence": "identity document",
+    "medical report": "medical record",
+    "prescription": "medical record",
+    "lab report": "medical record",
+    "discharge summary": "medical record",
+    "marksheet": "educational certificate",
+    "degree certificate": "educational certificate",
+    "transcript": "educational certificate",
+    "job offer": "offer letter",
+    "appointment letter": "offer letter",
+    "flight ticket": "travel ticket",
+    "train ticket": "travel ticket",
+    "boarding pass": "travel ticket",
+    "electricity bill": "utility bill",
+    "water bill": "utility bill",
+    "phone bill": "utility bill",
+    "contract": "business contract",
+    "agreement": "business contract"
+}
+
+PRECOMPUTED_MESSAGES = {
+    "passport": "This looks like a passport. Identity documents like this don't contain the financial terms Sacha Advisor explains, so there's nothing for us to break down here. " + SUGGESTION,
+    "identity document": "This looks like an identity document. ID cards are important, but they don't have policy terms, interest rates or coverage details for Sacha Advisor to explain. " + SUGGESTION,
+    "resume": "This looks like a resume. Sacha Advisor only explains financial documents, so a CV isn't something we can analyze. " + SUGGESTION,
+    "offer letter": "This looks like an offer letter. Unless it's a benefits or insurance document, Sacha Advisor can't analyze employment letters. " + SUGGESTION,
+    "medical record": "This looks like a medical record. Sacha Advisor can explain health insurance policies and claim documents, but not medical reports themselves. " + SUGGESTION,
+    "educational certificate": "This looks like an educational certificate. Sacha Advisor focuses on financial documents, so certificates and mark sheets are outside what we can explain. " + SUGGESTION,
+    "business contract": "This looks like a general contract without financial terms. Sacha Advisor explains documents about money, coverage, loans and investments. " + SUGGESTION,
+    "travel ticket": "This looks like a travel ticket or booking. Sacha Advisor can explain travel insurance policies, but not tickets or itineraries. " + SUGGESTION,
+    "hotel booking": "This looks like a hotel booking. Sacha Advisor can explain travel insurance, but bookings don't contain the financial terms we analyze. " + SUGGESTION,
+    "utility bill": "This looks like a utility bill. Sacha Advisor explains financial documents like policies, loans and investments rather than everyday bills. " + SUGGESTION,
+    "recipe": "This looks like a recipe! Sacha Advisor can only explain financial documents, so there's nothing for us to analyze here. " + SUGGESTION
+}
+
+
+def normalize_document_type(document_type: str) -> str:
+    """
+    Normalize a classifier document type so spelling variants share one entry
+
+    Args:
+        document_type: Document type as returned by classification
+
+    Returns:
+        Canonical lowercase document type
+    """
+    normalized = (document_type or "").lower()
+    normalized = re.sub(r"[_\-/]+", " ", normalized)
+    normalized = re.sub(r"[^a-z0-9 ]", "", normalized)
+    normalized = re.sub(r"\b(a|an|the|of|document|copy|scan|scanned)\b", " ", normalized)
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+
+    if not normalized:
+        return "unknown"
+    if normalized in ALIASES:
+        return ALIASES[normalized]
+    # Plural forms ("passports", "utility bills")
+    if normalized.endswith("s") and normalized[:-1] in PRECOMPUTED_MESSAGES:
+        return normalized[:-1]
+    return normalized
+
+
+def fallback_message(document_type: str) -> str:
+    """Generic message used when generation is unavailable"""
+    return f"This appears to be a {document_type}, not a financial document. Sacha Advisor can analyze ALL financial documents including insurance, loans, investments, mutual funds, fixed deposits, EMI schedules, pension plans, bank statements, and more. Please upload any financial document to get started!"
+
+
+class RejectionMessageEngine:
+    """
+    Precomputed table + LRU cache of rejection messages per document type
+    """
+
+    def __init__(self):
+        """Initialize the table, generated-message cache and counters"""
+        self.table: Dict[str, str] = dict(PRECOMPUTED_MESSAGES)
+        self.generated = LRUCache(maxsize=settings.REJECTION_CACHE_MAX_SIZE)
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.stats = {'table_hits': 0, 'cache_hits': 0, 'joined': 0, 'generated': 0, 'fallbacks': 0}
+
+    async def get_message(self, document_type: str) -> str:
+        """
+        Get the rejection message for a document type
+
+        Args:
+            document_type: Type of document detected
+
+        Returns:
+            str: Human-friendly explanation
+        """
+        # The normalized key only addresses the table and cache; the prompt and
+        # fallback name the type as the classifier reported it
+        key = normalize_document_type(document_type)
+        named_type = (document_type or "").strip() or key
+
+        if key in self.table:
+            self.stats['table_hits'] += 1
+            return self.table[key]
+
+        cached = self.generated.get(key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+
+        # Concurrent rejections of the same new type share one generation, run
+        # as its own task so a disconnecting caller doesn't cancel it for the rest.
+        # Fresh context: it belongs to no single request's deadline, usage or trace
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._generate(key, named_type), context=contextvars.Context())
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            self.stats['joined'] += 1
+
+        try:
+            # Each caller waits only as long as its own deadline allows
+            return await with_deadline(asyncio.shield(task), settings.LLM_TIMEOUT_SECONDS)
+        except DeadlineExceeded:
+            self.stats['fallbacks'] += 1
+            return fallback_message(named_type)
+
+    async def _generate(self, key: str, document_type: str) -> str:
+        """Generate a message for an unseen document type and store it under its key"""
+        try:
+            call_start = time.perf_counter()
+            response = await create_chat_completion(
+                model="gpt-4o-mini",
+                messages=build_rejection_messages(document_type),
+                temperature=0.7,
+                max_tokens=150
+            )
+            usage_tracker.record(
+                "rejection", response.usage,
+                model=response.model, wall_time_ms=elapsed_ms(call_start))
+
+            message = response.choices[0].message.content.strip()
+            self.generated[key] = message
+            self.stats['generated'] += 1
+            return message
+
+        except Exception as e:
+            # Not stored, so the next rejection of this type retries generation
+            print(f"Rejection message generation error: {str(e)}")
+            self.stats['fallbacks'] += 1
+            return fallback_message(document_type)
+
+    def get_stats(self) -> dict:
+        """
+        Get engine statistics
+
+        Returns:
+            Dictionary with hit/join counts and number of stored generated messages
+        """
+        return {
+            **self.stats,
+            'table_size': len(self.table),
+            'generated_size': len(self.generated)
+        }
+
+
+# Global rejection message engine
+rejection_messages = RejectionMessageEngine()
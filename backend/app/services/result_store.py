@@ -0,0 +1,89 @@
+"""
+Result store
+Keeps recent explanations addressable by content ID so follow-up calls
+(translation) can reference a result instead of posting its text back.
+The content ID is the explanation's SHA256, which is also the hash used
+in its cache keys, so lookups never rehash the text
+"""
+import hashlib
+from typing import Optional
+from cachetools import TTLCache
+from app.config import settings
+
+
+def content_id_for(text: str) -> str:
+    """
+    Compute the content ID of an explanation
+
+    Args:
+        text: Explanation text
+
+    Returns:
+        SHA256 hex digest of the text
+    """
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResultStore:
+    """
+    TTL store of explanations keyed by content ID
+    """
+
+    def __init__(self):
+        """Initialize the store with TTL and max size from config"""
+        self.results = TTLCache(
+            maxsize=settings.RESULT_STORE_MAX_SIZE,
+            ttl=settings.RESULT_STORE_TTL_SECONDS
+        )
+        self.stats = {'stored': 0, 'hits': 0, 'misses': 0}
+
+    def put(self, explanation: str) -> str:
+        """
+        Store an explanation
+
+        Args:
+            explanation: Explanation text
+
+        Returns:
+            Content ID to hand to the client
+        """
+        content_id = content_id_for(explanation)
+        if content_id not in self.results:
+            self.stats['stored'] += 1
+        self.results[content_id] = explanation
+        return content_id
+
+    def get(self, content_id: str) -> Optional[str]:
+        """
+        Resolve a content ID
+
+        Args:
+            content_id: ID returned by put
+
+        Returns:
+            Explanation text, or None if unknown or expired
+        """
+        explanation = self.results.get(content_id)
+        if explanation is None:
+            self.stats['misses'] += 1
+        else:
+            self.stats['hits'] += 1
+        return explanation
+
+    def get_stats(self) -> dict:
+        """
+        Get store statistics
+
+        Returns:
+            Dictionary with hit counts and current size
+        """
+        return {
+            **self.stats,
+            'size': len(self.results),
+            'max_size': self.results.maxsize,
+            'ttl': self.results.ttl
+        }
+
+
+# Global result store
+result_store = ResultStore()
@@ -0,0 +1,347 @@
+"""
+Sandboxed extraction workers
+PDF parsing, Word parsing and OCR of untrusted uploads run in a pool of
+separate worker processes instead of the API process. Each task has a
+wall-clock timeout. Each worker has an address-space cap (RLIMIT_AS) and
+a CPU-time cap per task (RLIMIT_CPU). A worker that hangs, exceeds a
+limit or crashes is killed and replaced, so a hostile document costs one
+worker slot instead of the API worker. Workers are also recycled after
+SANDBOX_MAX_TASKS_PER_WORKER tasks or once their peak RSS passes
+SANDBOX_MAX_RSS_MB. With SANDBOX_ENABLED=false the same calls run in
+threads of the API process
+
+Workers are invisible to the API process's tracer and profiler, so their
+spans and (while a profile is active) sampled stacks are sent back with
+each result. The event-loop watchdog has nothing to see there: work in a
+worker never blocks the loop
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.profiler import adopt_stacks, profiler, run_profiled
+from app.services.tracing import adopt_spans, current_trace, run_traced, span
+
+sandbox_failures = metrics.counter(
+    "sacha_sandbox_failures_total", "Extraction tasks that hit a sandbox limit or crashed its worker",
+    ("reason",))
+sandbox_recycled = metrics.counter(
+    "sacha_sandbox_recycled_total", "Sandbox workers retired after their task or memory budget", ("reason",))
+
+
+class SandboxError(Exception):
+    """A task was stopped by the sandbox (the document, not the server, is at fault)"""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.message = message
+        self.reason = reason
+
+
+# ---------------------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------------------
+
+def _apply_memory_limit(memory_limit_mb: int) -> None:
+    try:
+        import resource
+    except ImportError:
+        return  # Not POSIX - timeouts and recycling still apply
+    if memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _limit_cpu_for_next_task(cpu_seconds: int) -> None:
+    """RLIMIT_CPU counts the process's whole life, so move it to 'used so far + budget'"""
+    try:
+        import resource
+    except ImportError:
+        return
+    if cpu_seconds > 0:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _worker_main(conn, memory_limit_mb: int, cpu_seconds: int) -> None:
+    """Serve tasks from the pipe until told to stop (None) or the pipe closes"""
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()  # Own process group, so helpers like tesseract die with the worker
+    _apply_memory_limit(memory_limit_mb)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        fn, args, traced, profiled = message
+        _limit_cpu_for_next_task(cpu_seconds)
+        records: List[tuple] = []
+        stacks: Dict[str, int] = {}
+
+        def run_task() -> Tuple[Any, List[tuple]]:
+            return run_traced(fn, *args) if traced else (fn(*args), [])
+
+        try:
+            if profiled:
+                (result, records), stacks = run_profiled(run_task)
+            else:
+                result, records = run_task()
+            reply = ("ok", result)
+        except MemoryError:
+            reply = ("memory", None)
+        except Exception as e:
+            reply = ("error", e if _picklable(e) else Exception(f"{type(e).__name__}: {str(e)}"))
+        conn.send((*reply, records, stacks, _peak_rss_mb()))
+
+
+def _picklable(value: Any) -> bool:
+    import pickle
+    try:
+        pickle.dumps(value)
+        return True
+    except Exception:
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Supervisor
+# ---------------------------------------------------------------------------
+
+class _Worker:
+    """One worker process and the API's end of its pipe"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, settings.SANDBOX_MEMORY_LIMIT_MB,
+                                       settings.SANDBOX_TASK_CPU_SECONDS),
+            name="sandbox-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.peak_rss_mb = 0.0
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        """Kill the worker and anything it started"""
+        if self.process.pid is not None and self.process.is_alive():
+            try:
+                if hasattr(os, "killpg"):
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                else:
+                    self.process.kill()
+            except (ProcessLookupError, PermissionError):
+                self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def _death_reason(self) -> SandboxError:
+        self.process.join(timeout=1)
+        self.conn.close()
+        exitcode = self.process.exitcode
+        if hasattr(signal, "SIGXCPU") and exitcode == -signal.SIGXCPU:
+            return SandboxError("This document needs too much processing time to read.", "cpu_limit")
+        if hasattr(signal, "SIGKILL") and exitcode == -signal.SIGKILL:
+            # Not us - most likely the kernel OOM killer
+            return SandboxError("This document needs too much memory to read.", "killed")
+        return SandboxError("This document could not be read (the reader crashed).", "crashed")
+
+    def call(self, fn: Callable, args: tuple, traced: bool, profiled: bool, timeout: float,
+             cancelled: threading.Event):
+        """
+        Run one task (blocking; called from a thread)
+
+        Returns:
+            (result, span records, sampled stack counts)
+
+        Raises:
+            SandboxError: Timeout, resource limit or crash (the worker is dead)
+            Exception: Whatever fn raised (the worker is fine)
+        """
+        try:
+            self.conn.send((fn, args, traced, profiled))
+        except (BrokenPipeError, EOFError, OSError):
+            raise self._death_reason()
+
+        deadline = time.monotonic() + timeout
+        while not self.conn.poll(0.05):
+            if cancelled.is_set():
+                self.kill()
+                raise SandboxError("Extraction cancelled.", "cancelled")
+            if not self.process.is_alive():
+                raise self._death_reason()
+            if time.monotonic() > deadline:
+                self.kill()
+                raise SandboxError("This document took too long to read.", "timeout")
+        try:
+            status, value, records, stacks, self.peak_rss_mb = self.conn.recv()
+        except (EOFError, OSError):
+            raise self._death_reason()
+
+        self.tasks += 1
+        if status == "memory":
+            self.kill()  # Its heap is not to be trusted any more
+            raise SandboxError("This document needs too much memory to read.", "memory_limit")
+        if status == "error":
+            raise value
+        return value, records, stacks
+
+
+class SandboxPool:
+    """
+    Runs functions in supervised worker processes, one task per worker at a time
+    Workers start on first use and are replaced as they die or are retired
+    """
+
+    def __init__(self, size: int, enabled: bool = True):
+        """
+        Args:
+            size: Most worker processes (and concurrent tasks); 0 = one per
+                extraction and OCR admission slot
+            enabled: False runs tasks in threads of this process instead
+        """
+        self.size = size or settings.EXTRACTION_MAX_CONCURRENT + settings.OCR_MAX_CONCURRENT
+        self.enabled = enabled
+        self._context = multiprocessing.get_context("spawn")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: List[_Worker] = []
+        self._reaping: Set[asyncio.Task] = set()
+        self.busy = 0
+        self.stats = {'tasks': 0, 'started': 0, 'failed': 0, 'recycled': 0}
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Run fn(*args) in a worker process
+
+        fn and its arguments must be picklable (module-level functions, bytes...)
+
+        Raises:
+            SandboxError: The task hit the timeout or a resource limit, or crashed its worker
+            Exception: Whatever fn raised
+        """
+        if not self.enabled:
+            return await asyncio.to_thread(fn, *args)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+
+        async with self._slots:
+            worker = await self._take_worker()
+            cancelled = threading.Event()
+            self.busy += 1
+            healthy = False
+            try:
+                with span("sandbox", function=fn.__name__):
+                    result, records, stacks = await asyncio.to_thread(
+                        worker.call, fn, args, current_trace() is not None,
+                        profiler.active is not None,
+                        timeout or settings.SANDBOX_TASK_TIMEOUT_SECONDS, cancelled)
+                    adopt_spans(records)
+                    adopt_stacks(stacks, "sandbox-worker")
+                healthy = True
+                return result
+            except asyncio.CancelledError:
+                cancelled.set()  # The calling thread kills the worker
+                raise
+            except SandboxError as e:
+                self.stats['failed'] += 1
+                sandbox_failures.inc(reason=e.reason)
+                raise
+            except Exception:
+                healthy = True  # fn raised normally - the worker is fine
+                raise
+            finally:
+                self.busy -= 1
+                self.stats['tasks'] += 1
+                if healthy:
+                    self._release_worker(worker)
+
+    async def _take_worker(self) -> _Worker:
+        """An idle worker, or a new one (spawned off the event loop - it takes a while)"""
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.alive:
+                return worker
+            self._reap(worker)
+        self.stats['started'] += 1
+        spawn = asyncio.ensure_future(asyncio.to_thread(_Worker, self._context))
+        try:
+            return await asyncio.shield(spawn)
+        except asyncio.CancelledError:
+            spawn.add_done_callback(self._keep_spawned)  # Still starting - keep it for the next task
+            raise
+
+    def _keep_spawned(self, spawn: asyncio.Future) -> None:
+        if not spawn.cancelled() and spawn.exception() is None:
+            self._idle.append(spawn.result())
+
+    def _reap(self, worker: _Worker) -> None:
+        """Kill and join a worker in a thread, in the background"""
+        task = asyncio.ensure_future(asyncio.to_thread(worker.kill))
+        self._reaping.add(task)
+        task.add_done_callback(self._reaping.discard)
+
+    def _release_worker(self, worker: _Worker) -> None:
+        """Back to the pool, or retired if it used up its task or memory budget"""
+        reason = None
+        if worker.tasks >= settings.SANDBOX_MAX_TASKS_PER_WORKER:
+            reason = "tasks"
+        elif settings.SANDBOX_MAX_RSS_MB and worker.peak_rss_mb > settings.SANDBOX_MAX_RSS_MB:
+            reason = "memory"
+        if reason is None:
+            self._idle.append(worker)
+            return
+        self.stats['recycled'] += 1
+        sandbox_recycled.inc(reason=reason)
+        self._reap(worker)
+
+    def shutdown(self) -> None:
+        """
+        Stop the idle workers (busy ones die with the process - they are daemons)
+        Blocks while they are joined; call it from a thread on a running loop
+        """
+        while self._idle:
+            self._idle.pop().kill()
+
+    def get_stats(self) -> dict:
+        """
+        Get sandbox statistics
+
+        Returns:
+            Dictionary with pool size, idle/busy workers and task/failure counts
+        """
+        return {
+            'enabled': self.enabled,
+            'size': self.size,
+            'idle': len(self._idle),
+            'busy': self.busy,
+            **self.stats
+        }
+
+
+# Global sandbox pool (by default one worker per extraction/OCR admission slot)
+sandbox = SandboxPool(size=settings.SANDBOX_WORKERS, enabled=settings.SANDBOX_ENABLED)
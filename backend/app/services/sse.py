@@ -0,0 +1,137 @@
+"""
+Server-Sent Events helpers
+Encodes SSE frames and NDJSON lines (orjson when installed, stdlib json
+otherwise) and coalesces streamed text deltas so a response is a few
+dozen frames instead of one frame per OpenAI token
+"""
+import asyncio
+from typing import AsyncIterator, Optional
+from app.config import settings
+
+try:
+    import orjson
+
+    def _dumps(data: dict) -> str:
+        return orjson.dumps(data).decode()
+except ImportError:  # pragma: no cover - orjson is optional
+    import json
+
+    def _dumps(data: dict) -> str:
+        return json.dumps(data)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Disable nginx buffering
+    "Connection": "keep-alive"
+}
+
+
+def sse_event(data: dict) -> str:
+    """
+    Format one SSE data frame
+
+    Args:
+        data: JSON-serializable payload
+
+    Returns:
+        "data: <json>\\n\\n"
+    """
+    return f"data: {_dumps(data)}\n\n"
+
+
+def ndjson_line(data: dict) -> str:
+    """
+    Format one newline-delimited JSON record
+
+    Args:
+        data: JSON-serializable payload
+
+    Returns:
+        "<json>\n"
+    """
+    return f"{_dumps(data)}\n"
+
+
+async def coalesce(chunks: AsyncIterator[str],
+                   interval_ms: Optional[int] = None,
+                   max_bytes: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Merge small text deltas into larger pieces
+    A piece is emitted once it reaches max_bytes, or interval_ms after its
+    first delta arrived - even if the upstream stalls in between
+
+    Args:
+        chunks: Source of text deltas
+        interval_ms: Longest a delta waits in the buffer (default from config)
+        max_bytes: Flush as soon as the buffer reaches this size (default from config)
+
+    Yields:
+        str: Coalesced text
+    """
+    interval = (interval_ms if interval_ms is not None else settings.SSE_COALESCE_INTERVAL_MS) / 1000
+    max_bytes = max_bytes if max_bytes is not None else settings.SSE_COALESCE_MAX_BYTES
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+    buffer = []
+    size = 0
+    flush_at = 0.0
+    pending = None
+
+    try:
+        while True:
+            if not buffer:
+                # Nothing waiting to be sent - just wait for the next delta
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                flush_at = loop.time() + interval
+            else:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                done, _ = await asyncio.wait({pending}, timeout=max(0.0, flush_at - loop.time()))
+                if not done:
+                    # Upstream is slow - send what we have, keep waiting on the same delta
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+                    try:
+                        chunk = await pending
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        pending = None
+                    flush_at = loop.time() + interval
+                else:
+                    try:
+                        chunk = pending.result()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        pending = None
+
+            buffer.append(chunk)
+            size += len(chunk.encode())
+            if size >= max_bytes or loop.time() >= flush_at:
+                yield "".join(buffer)
+                buffer, size = [], 0
+
+        if buffer:
+            yield "".join(buffer)
+
+    finally:
+        # Consumer went away - stop the upstream (e.g. close the OpenAI stream)
+        try:
+            if pending is not None:
+                pending.cancel()
+                try:
+                    await pending
+                except StopAsyncIteration:
+                    pass
+                except asyncio.CancelledError:
+                    # Expected from the delta we cancelled - but not if this task
+                    # is being cancelled too, which must not be swallowed
+                    if asyncio.current_task().cancelling():
+                        raise
+        finally:
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
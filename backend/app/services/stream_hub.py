@@ -0,0 +1,157 @@
+"""
+Stream hub
+Fans one live explanation stream out to every request streaming the same
+document. The first request starts the upstream OpenAI stream; later
+subscribers replay what has been buffered so far and then follow along
+live. The finished text is cached once, and the upstream is cancelled
+only when every subscriber has gone away
+
+The upstream runs in its own context under its own timeout, so it carries
+no subscriber's deadline; each subscriber bounds only its own wait
+"""
+import asyncio
+import contextvars
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from app.config import settings
+from app.services.cache_service import cache_service
+from app.services.deadline import iterate_with_deadline
+from app.services.usage_tracker import start_request_usage, usage_tracker
+
+
+class _Broadcast:
+    """
+    One upstream stream and the chunks it has produced so far
+    """
+
+    def __init__(self, key: str, source: Callable[[], AsyncIterator[str]], timeout: float):
+        self.key = key
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._wakeup = asyncio.Event()
+        # Fresh context: not the deadline, usage or trace of the first subscriber.
+        # The upstream's usage is collected here and billed to one subscriber
+        context = contextvars.Context()
+        self.usage = context.run(start_request_usage)
+        self.billed = False
+        self.task = asyncio.create_task(self._pump(source, timeout), context=context)
+
+    def _notify(self) -> None:
+        """Wake every subscriber waiting for more"""
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    async def _pump(self, source: Callable[[], AsyncIterator[str]], timeout: float) -> None:
+        """Read the upstream into the buffer and cache the completed text"""
+        try:
+            async for chunk in iterate_with_deadline(source(), timeout):
+                self.chunks.append(chunk)
+                self._notify()
+            cache_service.set(self.key, "".join(self.chunks))
+        except BaseException as e:
+            self.error = e
+            raise
+        finally:
+            self.done = True
+            self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        """Replay the buffer, then yield live chunks until the upstream ends"""
+        index = 0
+        while True:
+            wakeup = self._wakeup
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    if isinstance(self.error, asyncio.CancelledError):
+                        raise Exception("Explanation stream was cancelled")
+                    raise self.error
+                return
+            await wakeup.wait()
+
+
+class StreamHub:
+    """
+    Live streams keyed by the explanation cache key
+    """
+
+    def __init__(self, timeout: float):
+        """
+        Args:
+            timeout: Time limit for a whole upstream stream
+        """
+        self.timeout = timeout
+        self._streams: Dict[str, _Broadcast] = {}
+        self.stats = {'started': 0, 'joined': 0, 'completed': 0, 'cancelled': 0, 'failed': 0}
+
+    def _finished(self, broadcast: _Broadcast, task: asyncio.Task) -> None:
+        """Forget a finished stream (later requests hit the cache instead)"""
+        if self._streams.get(broadcast.key) is broadcast:
+            del self._streams[broadcast.key]
+        if task.cancelled():
+            self.stats['cancelled'] += 1
+        elif task.exception() is not None:
+            self.stats['failed'] += 1
+        else:
+            self.stats['completed'] += 1
+
+    async def subscribe(self, key: str, source: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Stream the explanation for a cache key, sharing a live upstream if one exists
+
+        Args:
+            key: Explanation cache key (the completed text is cached under it)
+            source: Starts the upstream stream (only called if none is live)
+
+        Yields:
+            str: Explanation chunks from the beginning
+
+        Raises:
+            DeadlineExceeded: The caller's deadline ran out first (the
+                upstream carries on for the other subscribers)
+        """
+        broadcast = self._streams.get(key)
+        started = broadcast is None
+        if started:
+            broadcast = _Broadcast(key, source, self.timeout)
+            broadcast.task.add_done_callback(lambda task: self._finished(broadcast, task))
+            self._streams[key] = broadcast
+            self.stats['started'] += 1
+        else:
+            self.stats['joined'] += 1
+
+        broadcast.subscribers += 1
+        try:
+            async for chunk in iterate_with_deadline(broadcast.follow(), self.timeout):
+                yield chunk
+            if not broadcast.billed:
+                # Billed once, to the first subscriber that reads the stream to
+                # the end - the starter unless it left early
+                broadcast.billed = True
+                for call in broadcast.usage.calls:
+                    usage_tracker.attribute(call)
+        finally:
+            broadcast.subscribers -= 1
+            # Last one out stops paying for the upstream
+            if broadcast.subscribers == 0 and not broadcast.task.done():
+                broadcast.task.cancel()
+
+    def get_stats(self) -> dict:
+        """
+        Get hub statistics
+
+        Returns:
+            Dictionary with stream counts and live subscribers
+        """
+        return {
+            **self.stats,
+            'live_streams': len(self._streams),
+            'subscribers': sum(b.subscribers for b in self._streams.values())
+        }
+
+
+# Global stream hub
+stream_hub = StreamHub(timeout=settings.LLM_TIMEOUT_SECONDS)
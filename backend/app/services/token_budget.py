@@ -0,0 +1,104 @@
+"""
+Token budget service
+Pre-flight token counting so prompt inputs are trimmed to an exact token
+budget instead of a character slice. Encodings are loaded in a thread
+(tiktoken may download them); if loading fails, lengths are estimated
+"""
+import asyncio
+from typing import Any, Dict
+
+# Rough characters-per-token ratio used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+# Loaded encodings by model (None: unavailable, estimate from length)
+_encodings: Dict[str, Any] = {}
+
+
+def _load_encoding(model: str):
+    """
+    Load the tiktoken encoding for a model (blocking - may download its BPE file)
+
+    Args:
+        model: OpenAI model name
+
+    Returns:
+        tiktoken Encoding or None
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Unknown model name - gpt-4o family encoding
+        pass
+    except Exception as e:
+        print(f"tiktoken unavailable, estimating tokens from length: {str(e)}")
+        return None
+
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Encoding files can't be fetched (e.g., offline) - fall back to estimate
+        print(f"tiktoken unavailable, estimating tokens from length: {str(e)}")
+        return None
+
+
+async def _get_encoding(model: str):
+    """
+    Get the tiktoken encoding for a model, loading it in a thread the first time
+
+    Args:
+        model: OpenAI model name
+
+    Returns:
+        tiktoken Encoding or None (cached either way)
+    """
+    if model not in _encodings:
+        _encodings[model] = await asyncio.to_thread(_load_encoding, model)
+    return _encodings[model]
+
+
+async def count_tokens(text: str, model: str) -> int:
+    """
+    Count tokens in text for the given model
+
+    Args:
+        text: Text to measure
+        model: OpenAI model name
+
+    Returns:
+        Exact token count, or an estimate if tiktoken is unavailable
+    """
+    encoding = await _get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+async def trim_to_token_budget(text: str, max_tokens: int, model: str) -> str:
+    """
+    Trim text so it fits within a token budget
+
+    Args:
+        text: Text to trim
+        max_tokens: Maximum number of tokens to keep
+        model: OpenAI model name
+
+    Returns:
+        Text cut at the token boundary (unchanged if already within budget)
+    """
+    encoding = await _get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+
+    # Every token covers at least one UTF-8 byte, so short text always fits
+    if len(text.encode()) <= max_tokens:
+        return text
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
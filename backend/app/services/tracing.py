@@ -0,0 +1,359 @@
+"""
+Per-request tracing
+A sampled request carries a Trace in a context variable, and span() blocks
+anywhere below it (pipeline stages, PDF pages, cache lookups, OpenAI
+calls, DB writes, background logging) record their start and end into
+it. Unsampled requests have no Trace, so span() costs one context
+variable read. When TRACE_EXPORT_PATH is set, a trace is appended to that
+file as OTLP/JSON, one line per request. Stage timings are only shown to
+the caller (Server-Timing header, trailer event on streams) when it sent a
+sampled traceparent or the operator turned on TRACE_SERVER_TIMING
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, span_id: str, parent_id: Optional[str],
+                 start_ns: int, attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.attributes = attributes
+        self.error = False
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Trace:
+    """
+    The spans of one request
+    Spans are appended from the request's tasks and from worker threads
+    (list.append is atomic), up to TRACE_MAX_SPANS
+    """
+
+    def __init__(self, name: str, trace_id: Optional[str] = None,
+                 parent_id: Optional[str] = None, report_timing: bool = False, **attributes):
+        """
+        Args:
+            name: Root span name (e.g. "POST /api/upload")
+            trace_id: Continue this trace (from a traceparent header), else a new one
+            parent_id: Remote parent of the root span
+            report_timing: Send the timings back to the caller (Server-Timing)
+        """
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.report_timing = report_timing
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.root = Span(name, _new_span_id(), parent_id, time.time_ns(), attributes)
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) < settings.TRACE_MAX_SPANS:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def finish(self) -> None:
+        self.root.end_ns = time.time_ns()
+
+    def summary(self) -> List[dict]:
+        """Finished spans aggregated by name, in order of first start"""
+        totals: Dict[str, dict] = {}
+        for span in sorted(self.spans, key=lambda span: span.start_ns):
+            total = totals.setdefault(span.name, {'name': span.name, 'duration_ms': 0.0, 'count': 0})
+            total['duration_ms'] += span.duration_ms
+            total['count'] += 1
+        for total in totals.values():
+            total['duration_ms'] = round(total['duration_ms'], 1)
+        return list(totals.values())
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value: one metric per span name (durations of
+        repeated spans such as pages or cache lookups are summed) and total
+        """
+        metrics = []
+        for total in self.summary():
+            metric = f"{total['name']};dur={total['duration_ms']}"
+            if total['count'] > 1:
+                metric += f';desc="{total["count"]}x"'
+            metrics.append(metric)
+        elapsed_ms = (time.time_ns() - self.root.start_ns) / 1e6
+        metrics.append(f"total;dur={round(elapsed_ms, 1)}")
+        return ", ".join(metrics)
+
+    def to_otlp(self) -> dict:
+        """The trace as an OTLP/JSON ExportTraceServiceRequest"""
+        spans = [_otlp_span(self.trace_id, self.root, SPAN_KIND_SERVER)]
+        spans.extend(_otlp_span(self.trace_id, span, SPAN_KIND_INTERNAL) for span in self.spans)
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': _otlp_attributes({'service.name': settings.TRACE_SERVICE_NAME})},
+                'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}]
+            }]
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "current_trace", default=None)
+_current_span_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_span_id", default=None)
+
+
+def _new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def current_trace() -> Optional[Trace]:
+    """The trace of the request being handled (None when it isn't sampled)"""
+    return _current_trace.get()
+
+
+class _SpanScope:
+    """Context manager recording one span (sync or async code, any thread)"""
+
+    __slots__ = ("trace", "span", "token")
+
+    def __init__(self, trace: Trace, name: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        parent_id = _current_span_id.get() or trace.root.span_id
+        self.span = Span(name, _new_span_id(), parent_id, 0, attributes)
+
+    def __enter__(self) -> Span:
+        self.token = _current_span_id.set(self.span.span_id)
+        self.span.start_ns = time.time_ns()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.span.end_ns = time.time_ns()
+        _current_span_id.reset(self.token)
+        if exc_type is not None:
+            self.span.error = True
+            self.span.attributes['exception.type'] = exc_type.__name__
+        self.trace.add(self.span)
+
+
+class _NoSpan:
+    """span() of an unsampled request"""
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes):
+    """
+    Record a block as a span of the current request's trace
+
+    Usage:
+        with span("classify", file_type=".pdf"):
+            ...
+
+    Nested spans (and spans in tasks or threads started inside the block
+    with the current context) become its children
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _SpanScope(trace, name, attributes)
+
+
+def traced(name: str, fn: Callable[..., Awaitable[Any]], **attributes) -> Callable[..., Awaitable[Any]]:
+    """Wrap a coroutine function so each call is a span (e.g. for background tasks)"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with span(name, **attributes):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+
+def run_traced(fn: Callable[..., Any], *args) -> Tuple[Any, List[tuple]]:
+    """
+    Call fn under a trace of its own and return (result, span records)
+    For work in another process: the records are picklable and are added
+    to the caller's trace with adopt_spans()
+    """
+    trace = Trace("remote")
+    token = _current_trace.set(trace)
+    try:
+        result = fn(*args)
+    finally:
+        _current_trace.reset(token)
+    root_id = trace.root.span_id
+    records = [(span.name, span.span_id, None if span.parent_id == root_id else span.parent_id,
+                span.start_ns, span.end_ns, span.attributes, span.error) for span in trace.spans]
+    return result, records
+
+
+def adopt_spans(records: List[tuple]) -> None:
+    """Add span records from run_traced() under the current span"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    parent_id = _current_span_id.get() or trace.root.span_id
+    for name, span_id, span_parent_id, start_ns, end_ns, attributes, error in records:
+        span = Span(name, span_id, span_parent_id or parent_id, start_ns, attributes)
+        span.end_ns = end_ns
+        span.error = error
+        trace.add(span)
+
+
+def timing_event() -> Optional[dict]:
+    """Trailer event for a stream: the Server-Timing of everything sent so far"""
+    trace = _current_trace.get()
+    if trace is None or not trace.report_timing:
+        return None
+    return {'status': 'timing', 'server_timing': trace.server_timing(), 'spans': trace.summary()}
+
+
+# ---------------------------------------------------------------------------
+# Sampling, export and the ASGI middleware
+# ---------------------------------------------------------------------------
+
+def _parse_traceparent(value: str):
+    """(trace_id, parent span_id, sampled) from a W3C traceparent header, or None"""
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def start_trace(scope: dict) -> Optional[Trace]:
+    """
+    Sampling decision for a new HTTP request
+    A sampled traceparent from the caller always traces (and continues its
+    trace, and gets the timings back); otherwise TRACE_SAMPLE_RATE of
+    requests are traced, for the export only unless TRACE_SERVER_TIMING is on
+    """
+    trace_id = parent_id = None
+    for header, value in scope.get("headers", ()):
+        if header == b"traceparent":
+            parsed = _parse_traceparent(value.decode("latin-1"))
+            if parsed is not None:
+                trace_id, parent_id, sampled = parsed
+                if not sampled:
+                    return None
+            break
+    if trace_id is None and (settings.TRACE_SAMPLE_RATE <= 0 or random.random() >= settings.TRACE_SAMPLE_RATE):
+        return None
+    return Trace(f"{scope['method']} {scope['path']}", trace_id, parent_id,
+                 report_timing=trace_id is not None or settings.TRACE_SERVER_TIMING,
+                 **{'http.method': scope['method'], 'http.target': scope['path']})
+
+
+_export_lock = threading.Lock()
+
+
+def export_trace(trace: Trace) -> None:
+    """Append a finished trace to TRACE_EXPORT_PATH as one OTLP/JSON line (blocking)"""
+    line = json.dumps(trace.to_otlp(), separators=(",", ":"))
+    try:
+        with _export_lock, open(settings.TRACE_EXPORT_PATH, "a") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"Trace export error: {str(e)}")
+
+
+class TracingMiddleware:
+    """
+    Traces sampled requests: adds Server-Timing to the response headers (when
+    the trace reports timing) and exports the trace once the request
+    (including its background tasks) is done
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = start_trace(scope)
+        if trace is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                trace.root.attributes['http.status_code'] = message["status"]
+                if trace.report_timing:
+                    headers = list(message.get("headers", ()))
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException:
+            trace.root.error = True
+            raise
+        finally:
+            _current_trace.reset(token)
+            trace.finish()
+            if settings.TRACE_EXPORT_PATH:
+                # Written off the event loop; nothing waits for it
+                asyncio.get_running_loop().run_in_executor(None, export_trace, trace)
+
+
+def _otlp_span(trace_id: str, span: Span, kind: int) -> dict:
+    otlp = {
+        'traceId': trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': kind,
+        'startTimeUnixNano': str(span.start_ns),
+        'endTimeUnixNano': str(span.end_ns),
+        'attributes': _otlp_attributes(span.attributes),
+        'status': {'code': STATUS_ERROR if span.error else STATUS_OK}
+    }
+    if span.parent_id:
+        otlp['parentSpanId'] = span.parent_id
+    return otlp
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[dict]:
+    converted = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {'boolValue': value}
+        elif isinstance(value, int):
+            typed = {'intValue': str(value)}
+        elif isinstance(value, float):
+            typed = {'doubleValue': value}
+        else:
+            typed = {'stringValue': str(value)}
+        converted.append({'key': key, 'value': typed})
+    return converted
@@ -1,63 +1,365 @@
 """
 Translation service for multilingual support - Optimized with caching
 Uses OpenAI to translate insurance explanations
+
+Explanations are split along their emoji section headers and the sections
+are translated concurrently. Each section is cached on its own hash, so
+sections repeated across documents (disclaimers, analogies) are reused
+
+Every target language has its own cache namespaces (translation_<code>
+and translation_<code>_section). Identical pending requests - same
+explanation, same language - share one in-flight translation, whether
+they come from /translate, a stream, a batch or an upload prefetch
+
+Uploads from non-English users prefetch the translation in the background
+(see prefetch_translation) so the later /translate call is a cache hit
 """
-from openai import AsyncOpenAI
+import asyncio
+import contextvars
+import re
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from app.config import settings
 from app.services.cache_service import cache_service, cache_key_from_text
+from app.services.deadline import iterate_with_deadline, with_deadline
+from app.services.llm_governor import mark_background
+from app.services.result_store import content_id_for
+from app.services.openai_client import create_chat_completion
+from app.services.prompts import EXPLANATION_SECTION_EMOJIS, build_translation_messages
+from app.services.usage_tracker import usage_tracker, elapsed_ms
+
+# Supported target languages (code -> name used in the prompt)
+SUPPORTED_LANGUAGES = {
+    "hi": "Hindi",
+    "ta": "Tamil",
+    "te": "Telugu",
+    "mr": "Marathi",
+    "bn": "Bengali"
+}
 
+# X-Language values (frontend sends full names) mapped to translation targets
+LANGUAGE_CODES = {
+    **{code: code for code in SUPPORTED_LANGUAGES},
+    **{name.lower(): code for code, name in SUPPORTED_LANGUAGES.items()}
+}
 
-async def translate_to_hindi(english_text: str) -> str:
+# Section headers are the explanation prompt's "**📋 Summary**" etc. - only those
+# emoji, so bold amounts ("**₹5,00,000**") stay inside their section.
+# The variation selector (as in "⚠️") is optional; models often drop it
+_SECTION_HEADER = re.compile(
+    r"^(?=\*\*\s*(?:"
+    + "|".join(re.escape(emoji.rstrip("\ufe0f")) + "\ufe0f?" for emoji in EXPLANATION_SECTION_EMOJIS)
+    + "))",
+    re.MULTILINE)
+
+
+def split_sections(text: str) -> List[str]:
     """
-    Translate insurance explanation from English to Hindi
+    Split an explanation into sections at its emoji headers
 
     Args:
-        english_text: English explanation text
+        text: Explanation text
+
+    Returns:
+        Non-empty sections in document order (any text before the first
+        header is its own section)
+    """
+    return [section.strip() for section in _SECTION_HEADER.split(text) if section.strip()]
+
+
+def language_code(language: Optional[str]) -> Optional[str]:
+    """
+    Map an X-Language header value or language code to a supported target
+
+    Args:
+        language: Header value or code, e.g. "hindi", "ta" or "english"
 
     Returns:
-        Translated Hindi text
+        Language code, or None for English/unsupported languages
     """
-    # Check cache first - translations are expensive
-    cache_key = cache_key_from_text(english_text, "translation_hi")
+    return LANGUAGE_CODES.get((language or "").strip().lower())
+
+
+async def translate_section(section: str, code: str) -> str:
+    """
+    Translate one explanation section from English
+
+    Args:
+        section: Section text (header and body)
+        code: Target language code
+
+    Returns:
+        Translated section
+    """
+    cache_key = cache_key_from_text(section, f"translation_{code}_section")
     cached_translation = cache_service.get(cache_key)
 
     if cached_translation is not None:
         return cached_translation
 
-    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    call_start = time.perf_counter()
+    response = await create_chat_completion(
+        model="gpt-4o-mini",
+        messages=build_translation_messages(section, SUPPORTED_LANGUAGES[code]),
+        temperature=0.3,
+        max_tokens=1000
+    )
+    usage_tracker.record(
+        f"translation_{code}", response.usage,
+        model=response.model, wall_time_ms=elapsed_ms(call_start))
+
+    translated_section = response.choices[0].message.content.strip()
+    cache_service.set(cache_key, translated_section)
+
+    return translated_section
+
+
+def _translation_cache_key(english_text: str, code: str, content_id: Optional[str] = None) -> str:
+    """Full-translation cache key (same as cache_key_from_text, without rehashing a known ID)"""
+    return f"translation_{code}:{content_id or content_id_for(english_text)}"
+
+
+class _Translation:
+    """
+    One in-flight translation of an explanation into one language
+    Shared by every request for it; cancelled once nobody holds it
+    """
+
+    def __init__(self, english_text: str, code: str, cache_key: str, background: bool):
+        self.cache_key = cache_key
+        self.holders = 0
+        self.prefetches = 0  # Holders that are upload prefetches (see cancel_prefetch)
+
+        # Any number of requests can join, so the work runs in a fresh
+        # context: no deadline, cost or trace of whichever request started
+        # it (each holder bounds its own wait instead). Prefetches also go
+        # to the governor's background lane
+        context = contextvars.Context()
+        if background:
+            context.run(mark_background)
+
+        self.section_tasks = [
+            asyncio.create_task(translate_section(section, code), context=context)
+            for section in split_sections(english_text)
+        ]
+        self.task = asyncio.create_task(self._join(), context=context)
+
+    async def _join(self) -> str:
+        """Wait for every section and cache the whole translation"""
+        try:
+            translated_sections = await asyncio.gather(*self.section_tasks)
+        finally:
+            # A section failed (or we were cancelled) - stop paying for the rest
+            for task in self.section_tasks:
+                if not task.done():
+                    task.cancel()
+
+        translation = "\n\n".join(translated_sections)
+        # Store the whole translation so later requests hit the cache
+        cache_service.set(self.cache_key, translation)
+        return translation
+
+    def hold(self) -> None:
+        """Register interest in the result"""
+        self.holders += 1
+
+    def release(self) -> None:
+        """Drop interest; cancels the translation when nobody is left"""
+        self.holders -= 1
+        if self.holders <= 0 and not self.task.done():
+            self.task.cancel()
+
+
+# In-flight translations keyed by their full-translation cache key
+_inflight: Dict[str, _Translation] = {}
+translation_stats = {
+    'started': 0, 'joined': 0, 'completed': 0, 'cancelled': 0, 'failed': 0,
+    'cache_hits': 0, 'prefetches': 0
+}
+
+
+def _translation_done(cache_key: str, task: asyncio.Task) -> None:
+    """Drop a finished translation and count how it ended"""
+    _inflight.pop(cache_key, None)
+    if task.cancelled():
+        translation_stats['cancelled'] += 1
+    elif task.exception() is not None:
+        translation_stats['failed'] += 1
+    else:
+        translation_stats['completed'] += 1
+
+
+def _get_translation(english_text: str, code: str, cache_key: str,
+                     background: bool = False) -> _Translation:
+    """Join the in-flight translation for this text and language, or start one"""
+    translation = _inflight.get(cache_key)
+    if translation is not None:
+        translation_stats['joined'] += 1
+    else:
+        translation = _Translation(english_text, code, cache_key, background)
+        translation.task.add_done_callback(lambda done: _translation_done(cache_key, done))
+        _inflight[cache_key] = translation
+        translation_stats['started'] += 1
+
+    translation.hold()
+    return translation
+
+
+def translation_available(english_text: str, code: str, content_id: Optional[str] = None) -> bool:
+    """Whether a translation is cached or already in flight (no new OpenAI calls to serve it)"""
+    cache_key = _translation_cache_key(english_text, code, content_id)
+    return cache_key in _inflight or cache_service.get(cache_key) is not None
+
+
+async def stream_translation(english_text: str, code: str,
+                             content_id: Optional[str] = None) -> AsyncIterator[Tuple[int, int, str]]:
+    """
+    Translate all sections concurrently and yield them in document order
+    Each section is yielded as soon as it and every section before it are done
+
+    Args:
+        english_text: English explanation text
+        code: Target language code
+        content_id: Result store ID of the text, if known (skips rehashing)
+
+    Yields:
+        tuple: (section index, total sections, translated section)
+    """
+    cache_key = _translation_cache_key(english_text, code, content_id)
+    cached_translation = cache_service.get(cache_key)
+
+    if cached_translation is not None:
+        translation_stats['cache_hits'] += 1
+        yield 0, 1, cached_translation
+        return
+
+    translation = _get_translation(english_text, code, cache_key)
+
+    async def sections() -> AsyncIterator[Tuple[int, int, str]]:
+        total = len(translation.section_tasks)
+        for index, task in enumerate(translation.section_tasks):
+            # Shielded: a client going away only releases its hold below
+            yield index, total, await asyncio.shield(task)
+        await asyncio.shield(translation.task)
+
+    try:
+        # This caller's deadline bounds its own wait, not the shared work
+        async for section in iterate_with_deadline(sections(), settings.REQUEST_DEADLINE_SECONDS):
+            yield section
+    finally:
+        translation.release()
+
+
+async def translate(english_text: str, code: str, content_id: Optional[str] = None) -> str:
+    """
+    Translate an insurance explanation from English
+
+    Args:
+        english_text: English explanation text
+        code: Target language code
+        content_id: Result store ID of the text, if known (skips rehashing)
 
+    Returns:
+        Translated text
+    """
     try:
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are a professional translator specializing in insurance and financial documents. 
-Translate the following insurance document explanation from English to Hindi.
-
-IMPORTANT RULES:
-- Maintain the exact same markdown formatting (**, ✅, ❌, 💡, 🎯, etc.)
-- Keep section headers in the same structure
-- Translate naturally and accurately
-- Use appropriate Hindi financial/insurance terminology
-- Keep emojis and bullet points as-is
-- Maintain professional tone"""
-                },
-                {
-                    "role": "user",
-                    "content": f"Translate this insurance explanation to Hindi:\n\n{english_text}"
-                }
-            ],
-            temperature=0.3,
-            max_tokens=2000
-        )
-
-        translated_text = response.choices[0].message.content
-
-        # Cache the translation
-        cache_service.set(cache_key, translated_text)
-
-        return translated_text
+        cache_key = _translation_cache_key(english_text, code, content_id)
+        cached_translation = cache_service.get(cache_key)
+
+        if cached_translation is not None:
+            translation_stats['cache_hits'] += 1
+            return cached_translation
+
+        translation = _get_translation(english_text, code, cache_key)
+        try:
+            # This caller's deadline bounds its own wait, not the shared work
+            return await with_deadline(asyncio.shield(translation.task), settings.REQUEST_DEADLINE_SECONDS)
+        finally:
+            translation.release()
 
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         raise Exception(f"Translation error: {str(e)}")
+
+
+async def translate_many(english_text: str, codes: List[str],
+                         content_id: Optional[str] = None) -> Dict[str, object]:
+    """
+    Translate one explanation into several languages concurrently
+    All languages and sections run at once (bounded by the LLM governor),
+    so extra languages add cost rather than latency
+
+    Args:
+        english_text: English explanation text
+        codes: Target language codes
+        content_id: Result store ID of the text, if known (skips rehashing)
+
+    Returns:
+        Dict of code -> translated text, or the Exception for failed languages
+    """
+    codes = list(dict.fromkeys(codes))
+    results = await asyncio.gather(
+        *(translate(english_text, code, content_id) for code in codes),
+        return_exceptions=True
+    )
+    return dict(zip(codes, results))
+
+
+def prefetch_translation(english_text: str, language: Optional[str],
+                         content_id: Optional[str] = None) -> Optional[str]:
+    """
+    Start translating an explanation in the background for a non-English user
+    The result lands in the translation cache; later requests for the same
+    text and language join it instead of starting again
+
+    Args:
+        english_text: English explanation text
+        language: X-Language header value
+        content_id: Result store ID of the text, if known (skips rehashing)
+
+    Returns:
+        Prefetch key to pass to cancel_prefetch, or None if nothing was started
+    """
+    if not settings.TRANSLATION_PREFETCH_ENABLED or not english_text:
+        return None
+    code = language_code(language)
+    if code is None:
+        return None
+
+    cache_key = _translation_cache_key(english_text, code, content_id)
+    if cache_service.get(cache_key) is not None:
+        translation_stats['cache_hits'] += 1
+        return None
+
+    translation = _get_translation(english_text, code, cache_key, background=True)
+    # The uploader's hold lasts until its client leaves before getting the
+    # result (cancel_prefetch) or the translation ends
+    translation.prefetches += 1
+    translation_stats['prefetches'] += 1
+    return cache_key
+
+
+def cancel_prefetch(prefetch_key: Optional[str]) -> None:
+    """
+    Give up on a prefetch because its client went away before the result
+    (and with it the page that would ask for the translation) reached it
+    The translation is only cancelled once no other request is waiting on it
+
+    Args:
+        prefetch_key: Key returned by prefetch_translation
+    """
+    translation = _inflight.get(prefetch_key) if prefetch_key else None
+    if translation is not None and translation.prefetches > 0:
+        translation.prefetches -= 1
+        translation.release()
+
+
+def get_translation_stats() -> dict:
+    """
+    Get translation statistics
+
+    Returns:
+        Dictionary with outcome counts and in-flight translations
+    """
+    return {**translation_stats, 'in_flight': len(_inflight)}
@@ -0,0 +1,241 @@
+"""
+OpenAI usage tracking service
+Captures prompt, completion and cached tokens, model, wall time and
+time-to-first-token for every OpenAI call. Calls are aggregated globally
+(per prompt name) and per request, so real API cost can be logged instead
+of a hard-coded estimate
+"""
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.services.metrics import llm_completion_seconds
+
+
+def cached_tokens_from_usage(usage: Any) -> int:
+    """
+    Read the cached prompt token count from an OpenAI usage object
+
+    Args:
+        usage: CompletionUsage from a response (or final stream chunk)
+
+    Returns:
+        Number of prompt tokens served from the provider cache
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+
+def elapsed_ms(start: float) -> int:
+    """Milliseconds elapsed since a time.perf_counter() reading"""
+    return int((time.perf_counter() - start) * 1000)
+
+
+class LLMCall:
+    """Usage and timing of a single OpenAI call"""
+
+    def __init__(
+        self,
+        prompt_name: str,
+        model: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        wall_time_ms: int = 0,
+        ttft_ms: Optional[int] = None
+    ):
+        self.prompt_name = prompt_name
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cached_tokens = cached_tokens
+        self.wall_time_ms = wall_time_ms
+        self.ttft_ms = ttft_ms
+
+    @property
+    def cost_usd(self) -> float:
+        """API cost of this call from configured per-1M-token prices"""
+        uncached_tokens = self.prompt_tokens - self.cached_tokens
+        return (
+            uncached_tokens * settings.OPENAI_INPUT_COST_PER_1M
+            + self.cached_tokens * settings.OPENAI_CACHED_INPUT_COST_PER_1M
+            + self.completion_tokens * settings.OPENAI_OUTPUT_COST_PER_1M
+        ) / 1_000_000
+
+    def split(self, parts: int) -> List["LLMCall"]:
+        """
+        Split this call evenly, e.g. across the documents of a batched prompt
+
+        Args:
+            parts: Number of requests sharing the call
+
+        Returns:
+            One LLMCall per part; leftover tokens go to the first parts so the
+            shares add up to the call (wall time is shared, not split)
+        """
+        def portion(tokens: int, index: int) -> int:
+            return tokens // parts + (1 if index < tokens % parts else 0)
+
+        return [
+            LLMCall(
+                prompt_name=self.prompt_name,
+                model=self.model,
+                prompt_tokens=portion(self.prompt_tokens, index),
+                completion_tokens=portion(self.completion_tokens, index),
+                cached_tokens=portion(self.cached_tokens, index),
+                wall_time_ms=self.wall_time_ms,
+                ttft_ms=self.ttft_ms
+            )
+            for index in range(parts)
+        ]
+
+
+class RequestUsage:
+    """All OpenAI calls made while serving one HTTP request"""
+
+    def __init__(self):
+        self.calls: List[LLMCall] = []
+
+    def add(self, call: LLMCall) -> None:
+        """Attribute a call to this request"""
+        self.calls.append(call)
+
+    @property
+    def cost_usd(self) -> float:
+        """Total API cost of the request"""
+        return round(sum(call.cost_usd for call in self.calls), 6)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(call.prompt_tokens for call in self.calls)
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(call.completion_tokens for call in self.calls)
+
+    @property
+    def cached_tokens(self) -> int:
+        return sum(call.cached_tokens for call in self.calls)
+
+
+# Usage of the request currently being served (set per request by the router)
+_request_usage: ContextVar[Optional[RequestUsage]] = ContextVar(
+    "request_usage", default=None)
+
+
+def start_request_usage() -> RequestUsage:
+    """
+    Begin collecting OpenAI usage for the current request
+    Tasks spawned afterwards (e.g. by asyncio.gather) inherit the collector
+
+    Returns:
+        The request's usage collector
+    """
+    request_usage = RequestUsage()
+    _request_usage.set(request_usage)
+    return request_usage
+
+
+def current_request_usage() -> Optional[RequestUsage]:
+    """Get the usage collector of the current request, if any"""
+    return _request_usage.get()
+
+
+class UsageTracker:
+    """
+    In-process aggregate of OpenAI token usage, keyed by prompt name
+    """
+
+    def __init__(self):
+        """Initialize empty per-prompt counters"""
+        self.prompts: Dict[str, Dict[str, Any]] = {}
+
+    def record(
+        self,
+        prompt_name: str,
+        usage: Any,
+        model: str,
+        wall_time_ms: int,
+        ttft_ms: Optional[int] = None,
+        attribute_to_request: bool = True
+    ) -> Optional[LLMCall]:
+        """
+        Record the usage block of one OpenAI response
+
+        Args:
+            prompt_name: Registry name of the prompt (e.g., 'explanation')
+            usage: CompletionUsage from the response, may be None
+            model: Model that served the call
+            wall_time_ms: Wall time of the call
+            ttft_ms: Time to first content token (streams only)
+            attribute_to_request: Add the call to the current request's usage
+
+        Returns:
+            The recorded call, or None if the response carried no usage
+        """
+        if usage is None:
+            return None
+
+        call = LLMCall(
+            prompt_name=prompt_name,
+            model=model,
+            prompt_tokens=usage.prompt_tokens or 0,
+            completion_tokens=usage.completion_tokens or 0,
+            cached_tokens=cached_tokens_from_usage(usage),
+            wall_time_ms=wall_time_ms,
+            ttft_ms=ttft_ms
+        )
+
+        stats = self.prompts.setdefault(prompt_name, {
+            'calls': 0,
+            'prompt_tokens': 0,
+            'cached_tokens': 0,
+            'completion_tokens': 0,
+            'cost_usd': 0.0,
+            'wall_time_ms': 0
+        })
+        stats['calls'] += 1
+        stats['prompt_tokens'] += call.prompt_tokens
+        stats['cached_tokens'] += call.cached_tokens
+        stats['completion_tokens'] += call.completion_tokens
+        stats['cost_usd'] += call.cost_usd
+        stats['wall_time_ms'] += call.wall_time_ms
+        llm_completion_seconds.observe(call.wall_time_ms / 1000, prompt=prompt_name)
+
+        if attribute_to_request:
+            self.attribute(call)
+
+        return call
+
+    def attribute(self, call: Optional[LLMCall]) -> None:
+        """
+        Add a call (or a share of one) to the current request's usage
+
+        Args:
+            call: Call to attribute, ignored if None
+        """
+        request_usage = _request_usage.get()
+        if call is not None and request_usage is not None:
+            request_usage.add(call)
+
+    def get_stats(self) -> dict:
+        """
+        Get usage statistics
+
+        Returns:
+            Dictionary with per-prompt token counts, cost and cache hit ratio
+        """
+        return {
+            name: {
+                **stats,
+                'cost_usd': round(stats['cost_usd'], 6),
+                'avg_wall_time_ms': stats['wall_time_ms'] // stats['calls'],
+                'cached_ratio': round(stats['cached_tokens'] / stats['prompt_tokens'], 3)
+                if stats['prompt_tokens'] else 0.0
+            }
+            for name, stats in self.prompts.items()
+        }
+
+
+# Global usage tracker instance
+usage_tracker = UsageTracker()
@@ -0,0 +1,113 @@
+"""
+Startup warm-up and readiness
+Right after startup, everything the first requests would otherwise pay for
+is primed in parallel:
+- the deferred imports and the tiktoken encoding
+- a connection (DNS, TCP, TLS) to the OpenAI API
+- the asyncpg pool, grown past min_size
+- the sandbox workers, each with PyMuPDF loaded and Tesseract's language
+  data read once
+Warm-up runs in the background, so /health (liveness) answers at once.
+/ready answers 503 until warm-up has finished or used up
+WARMUP_TIMEOUT_SECONDS, so a rolling deploy only routes traffic to warm
+instances. A failed step is logged and doesn't hold readiness back: the
+request that needs it pays the cold cost instead
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.db.supabase import warm_up_pool
+from app.services.extractor import warm_up_extraction
+from app.services.openai_client import warm_up_connection
+from app.services.preload import preloader
+from app.services.token_budget import count_tokens
+
+
+def _steps() -> List[Tuple[str, Callable[[], Awaitable[None]]]]:
+    """(name, coroutine function) of every warm-up step that applies to this configuration"""
+    steps = [
+        ("tokenizer", lambda: count_tokens("warm-up", settings.OPENAI_MODEL)),
+        ("extraction", warm_up_extraction)
+    ]
+    if settings.PRELOAD_ENABLED:
+        steps.append(("imports", lambda: asyncio.to_thread(preloader.run)))
+    if settings.OPENAI_API_KEY:
+        steps.append(("openai", warm_up_connection))
+    if settings.DATABASE_URL:
+        steps.append(("database", lambda: warm_up_pool(settings.WARMUP_DB_CONNECTIONS)))
+    return steps
+
+
+class Warmup:
+    """
+    Runs the warm-up steps in parallel under one time budget and tracks readiness
+    """
+
+    def __init__(self, enabled: bool, budget_seconds: float):
+        """
+        Args:
+            enabled: False = ready as soon as the app has started
+            budget_seconds: Steps still running after this are cancelled
+        """
+        self.enabled = enabled
+        self.budget = budget_seconds
+        self.ready = not enabled
+        self.steps: Dict[str, dict] = {}
+        self.elapsed_ms: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start warming up in the background (call from the running loop, once)"""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        """Not ready any more (shutting down); cancels an unfinished warm-up"""
+        self.ready = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        started = time.perf_counter()
+        tasks = {asyncio.create_task(self._step(name, fn)): name for name, fn in _steps()}
+        _, pending = await asyncio.wait(tasks, timeout=self.budget)
+        for task in pending:
+            task.cancel()
+            self.steps[tasks[task]] = {'status': 'timeout', 'ms': None}
+        self.elapsed_ms = round((time.perf_counter() - started) * 1000)
+        self.ready = True
+        summary = ", ".join(f"{name} {step['status']}" for name, step in self.steps.items())
+        print(f"✅ Warm-up finished in {self.elapsed_ms}ms ({summary}) - ready for traffic")
+
+    async def _step(self, name: str, fn: Callable[[], Awaitable[None]]) -> None:
+        self.steps[name] = {'status': 'running', 'ms': None}
+        started = time.perf_counter()
+        try:
+            await fn()
+            self.steps[name] = {'status': 'ok', 'ms': round((time.perf_counter() - started) * 1000)}
+        except Exception as e:
+            self.steps[name] = {'status': 'failed', 'ms': round((time.perf_counter() - started) * 1000),
+                                'error': str(e)}
+            print(f"⚠️  Warm-up step {name} failed: {str(e)}")
+
+    def get_stats(self) -> dict:
+        """
+        Get warm-up statistics
+
+        Returns:
+            Dictionary with readiness, total warm-up time and each step's status and time (ms)
+        """
+        return {
+            'enabled': self.enabled,
+            'ready': self.ready,
+            'elapsed_ms': self.elapsed_ms,
+            'budget_seconds': self.budget,
+            'steps': dict(self.steps)
+        }
+
+
+# Global warm-up
+warmup = Warmup(enabled=settings.WARMUP_ENABLED, budget_seconds=settings.WARMUP_TIMEOUT_SECONDS)
@@ -0,0 +1 @@
+# Offline load-testing tools (OpenAI stub server, corpus, load generator)
@@ -0,0 +1,97 @@
+"""
+Synthetic document corpus for load testing
+Generates insurance-like PDFs and DOCX files (plus a few non-financial ones
+to exercise the rejection path) fully in memory - no fixtures needed
+"""
+import io
+import random
+from typing import List, Tuple
+import pymupdf
+from docx import Document
+
+FINANCIAL_SENTENCES = [
+    "The insured person is covered for hospitalisation expenses up to the sum insured.",
+    "The annual premium is payable on or before the policy renewal date.",
+    "A waiting period of 30 days applies to all illnesses except accidents.",
+    "Pre-existing diseases are covered after 24 months of continuous coverage.",
+    "The loan carries a floating interest rate linked to the bank's repo rate.",
+    "EMI will be debited on the 5th of every month from the registered account.",
+    "The policyholder may cancel within the 15 day free-look period for a refund.",
+    "Claims must be intimated to the insurer within 48 hours of admission.",
+    "A no-claim bonus of 10 percent of the sum insured is added each year.",
+    "Room rent is capped at 1 percent of the sum insured per day."
+]
+
+OTHER_SENTENCES = [
+    "Preheat the oven to 180 degrees and grease a baking tray.",
+    "Whisk the eggs with sugar until the mixture turns pale.",
+    "Fold in the flour gently and bake for twenty five minutes.",
+    "Let the cake cool completely before adding the frosting."
+]
+
+
+def _paragraphs(rng: random.Random, sentences: List[str], count: int) -> List[str]:
+    """Random paragraphs built from a sentence pool"""
+    return [
+        " ".join(rng.choice(sentences) for _ in range(rng.randint(4, 8)))
+        for _ in range(count)
+    ]
+
+
+def _make_pdf(paragraphs: List[str], pages: int) -> bytes:
+    """Render paragraphs into a PDF spread over the given number of pages"""
+    doc = pymupdf.open()
+    per_page = max(1, len(paragraphs) // pages)
+    for page_index in range(pages):
+        page = doc.new_page()
+        text = "\n\n".join(
+            paragraphs[page_index * per_page:(page_index + 1) * per_page])
+        page.insert_textbox(pymupdf.Rect(50, 50, 550, 800), text, fontsize=10)
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+def _make_docx(paragraphs: List[str]) -> bytes:
+    """Render paragraphs into a DOCX file"""
+    doc = Document()
+    for paragraph in paragraphs:
+        doc.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def build_corpus(size: int, non_financial_ratio: float = 0.1, seed: int = 42) -> List[Tuple[str, bytes, str]]:
+    """
+    Build a synthetic corpus of distinct documents
+
+    Args:
+        size: Number of distinct documents
+        non_financial_ratio: Fraction of documents that should be rejected
+        seed: Random seed so runs are comparable
+
+    Returns:
+        list: (filename, content, mime type) tuples
+    """
+    rng = random.Random(seed)
+    corpus = []
+
+    for index in range(size):
+        financial = rng.random() >= non_financial_ratio
+        sentences = FINANCIAL_SENTENCES if financial else OTHER_SENTENCES
+        pages = rng.randint(1, 5)
+        paragraphs = _paragraphs(rng, sentences, pages * 3)
+        # A unique header line keeps every document's text (and cache key) distinct
+        paragraphs.insert(0, f"Reference number LT-{seed}-{index:05d}")
+
+        if rng.random() < 0.8:
+            corpus.append((f"doc_{index}.pdf", _make_pdf(paragraphs, pages), "application/pdf"))
+        else:
+            corpus.append((
+                f"doc_{index}.docx",
+                _make_docx(paragraphs),
+                "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            ))
+
+    return corpus
@@ -0,0 +1,360 @@
+"""
+End-to-end load test harness
+Starts the OpenAI stub and the API (both locally, fully offline), drives
+/api/upload and /api/upload-stream with a synthetic corpus and reports
+throughput, latency p50/p95/p99, time-to-first-chunk, server RSS and
+event-loop lag (with the stacks of any calls that blocked the loop)
+
+Usage (from the backend directory):
+    python -m loadtest.run --requests 200 --concurrency 20
+    python -m loadtest.run --endpoint stream --stub-latency-ms 800 --json report.json
+    python -m loadtest.run --app-env CLASSIFICATION_BATCH_ENABLED=true
+    python -m loadtest.run --max-loop-lag-ms 250   # CI: fail if anything blocks the loop
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+import httpx
+from app.config import settings
+from app.services.profiler import sign_profile_token
+from loadtest.corpus import build_corpus
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    """Ask the OS for an unused local port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(samples: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile (None if no samples)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MB (Linux /proc, None elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _start_server(module_app: str, port: int, env: dict, log_path: str) -> subprocess.Popen:
+    """Start a uvicorn server in a child process"""
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module_app,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60) -> float:
+    """Poll a URL until it answers 200; returns seconds waited"""
+    start = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited early while waiting for {url}")
+            try:
+                if (await client.get(url, timeout=1)).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+async def _event_loop_stats(base_url: str, profiler_secret: str) -> Optional[dict]:
+    """The API's event-loop lag and blocking calls, from the admin route"""
+    headers = {"X-Profile": sign_profile_token(60, secret=profiler_secret)}
+    async with httpx.AsyncClient() as client:
+        try:
+            response = await client.get(f"{base_url}/admin/event-loop", headers=headers, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError):
+            return None
+
+
+def _user_headers(user: int) -> dict:
+    """Each virtual user has its own User-Agent, hence its own anonymous user ID (rate limit key)"""
+    return {"User-Agent": f"sacha-loadtest/1.0 (vu-{user})",
+            "X-Session-ID": f"lt-{random.getrandbits(48):x}"}
+
+
+async def _upload(client: httpx.AsyncClient, base_url: str, doc: tuple, user: int) -> dict:
+    """POST one document to /api/upload"""
+    filename, content, mime = doc
+    start = time.perf_counter()
+    try:
+        response = await client.post(
+            f"{base_url}/api/upload",
+            files={"file": (filename, content, mime)},
+            headers=_user_headers(user)
+        )
+        status = response.status_code
+        if status == 400 and "financial" in response.json().get("detail", ""):
+            # Rejections are a valid outcome, not a failure
+            status = "rejected"
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return {
+        "endpoint": "upload",
+        "status": status,
+        "latency": time.perf_counter() - start,
+        "ttfc": None
+    }
+
+
+async def _upload_stream(client: httpx.AsyncClient, base_url: str, doc: tuple, user: int) -> dict:
+    """POST one document to /api/upload-stream and time the first explanation chunk"""
+    filename, content, mime = doc
+    start = time.perf_counter()
+    ttfc = None
+    status = None
+    try:
+        async with client.stream(
+            "POST", f"{base_url}/api/upload-stream",
+            files={"file": (filename, content, mime)},
+            headers=_user_headers(user)
+        ) as response:
+            status = response.status_code
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if ttfc is None and "chunk" in event:
+                    ttfc = time.perf_counter() - start
+                if event.get("status") == "error":
+                    # Rejections are a valid outcome, anything else counts as a failure
+                    status = "rejected" if "financial" in event.get("message", "") else "stream_error"
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return {
+        "endpoint": "stream",
+        "status": status,
+        "latency": time.perf_counter() - start,
+        "ttfc": ttfc
+    }
+
+
+async def _sample_rss(pid: int, samples: List[float], stop: asyncio.Event) -> None:
+    """Sample server RSS until stopped"""
+    while not stop.is_set():
+        rss = read_rss_mb(pid)
+        if rss is not None:
+            samples.append(rss)
+        await asyncio.sleep(0.2)
+
+
+async def run_load(base_url: str, corpus: list, args, app_pid: int) -> dict:
+    """Drive the API with the configured concurrency and collect results"""
+    rng = random.Random(args.seed)
+    if args.endpoint == "both":
+        runners = [_upload, _upload_stream]
+    else:
+        runners = [_upload if args.endpoint == "upload" else _upload_stream]
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rss_samples: List[float] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_rss(app_pid, rss_samples, stop))
+
+    async with httpx.AsyncClient(timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        async def one(index: int):
+            async with semaphore:
+                runner = runners[index % len(runners)]
+                return await runner(client, base_url, rng.choice(corpus), index % args.users)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(args.requests)))
+        wall_time = time.perf_counter() - start
+
+    stop.set()
+    await sampler
+    return {"results": results, "wall_time": wall_time, "rss": rss_samples}
+
+
+def summarize(run: dict) -> dict:
+    """Aggregate raw results into a report"""
+    results = run["results"]
+
+    def stats(samples):
+        return {
+            "p50_ms": round(_percentile(samples, 0.50) * 1000) if samples else None,
+            "p95_ms": round(_percentile(samples, 0.95) * 1000) if samples else None,
+            "p99_ms": round(_percentile(samples, 0.99) * 1000) if samples else None
+        }
+
+    report = {
+        "requests": len(results),
+        "wall_time_s": round(run["wall_time"], 2),
+        "throughput_rps": round(len(results) / run["wall_time"], 2),
+        "endpoints": {},
+        "rss_mb": {
+            "start": round(run["rss"][0], 1) if run["rss"] else None,
+            "peak": round(max(run["rss"]), 1) if run["rss"] else None,
+            "end": round(run["rss"][-1], 1) if run["rss"] else None
+        }
+    }
+
+    for endpoint in sorted({r["endpoint"] for r in results}):
+        subset = [r for r in results if r["endpoint"] == endpoint]
+        ok = [r for r in subset if r["status"] in (200, "rejected")]
+        statuses = {}
+        for r in subset:
+            statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+        report["endpoints"][endpoint] = {
+            "count": len(subset),
+            "errors": len(subset) - len(ok),
+            "statuses": statuses,
+            "latency": stats([r["latency"] for r in ok]),
+            "time_to_first_chunk": stats([r["ttfc"] for r in ok if r["ttfc"] is not None])
+        }
+
+    return report
+
+
+def print_report(report: dict) -> None:
+    """Print a human-readable report"""
+    print(f"\nRequests: {report['requests']} in {report['wall_time_s']}s "
+          f"({report['throughput_rps']} req/s)")
+    for endpoint, data in report["endpoints"].items():
+        latency = data["latency"]
+        print(f"\n/{'api/upload' if endpoint == 'upload' else 'api/upload-stream'}: "
+              f"{data['count']} requests, {data['errors']} errors {data['statuses']}")
+        print(f"  latency       p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms p99={latency['p99_ms']}ms")
+        ttfc = data["time_to_first_chunk"]
+        if ttfc["p50_ms"] is not None:
+            print(f"  first chunk   p50={ttfc['p50_ms']}ms p95={ttfc['p95_ms']}ms p99={ttfc['p99_ms']}ms")
+    rss = report["rss_mb"]
+    print(f"\nServer RSS: start={rss['start']}MB peak={rss['peak']}MB end={rss['end']}MB")
+    event_loop = report.get("event_loop")
+    if event_loop:
+        print(f"Event loop: max lag={event_loop['max_lag_ms']}ms, "
+              f"blocked {event_loop['blocked']}x over {event_loop['block_threshold_ms']}ms")
+        for block in event_loop["recent_blocks"]:
+            print(f"  blocked {block['duration_ms']}ms in {block['stack'][-1]}")
+
+
+async def main_async(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="sacha-loadtest-")
+    stub_port, app_port = _free_port(), _free_port()
+
+    stub_env = {**os.environ,
+                "STUB_LATENCY_DIST": args.stub_latency_dist,
+                "STUB_LATENCY_MS": str(args.stub_latency_ms),
+                "STUB_TOKENS_PER_SEC": str(args.stub_tokens_per_sec),
+                "STUB_ERROR_RATE": str(args.stub_error_rate),
+                "STUB_STALL_RATE": str(args.stub_stall_rate),
+                "STUB_SEED": str(args.seed)}
+    app_env = {**os.environ,
+               "OPENAI_API_KEY": "stub-key",
+               "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+               "DATABASE_URL": "",
+               "DATABASE_PATH": os.path.join(workdir, "loadtest.db")}
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        app_env[key] = value
+    # Enough burst for each virtual user's share of the run, even if every request misses the cache
+    miss_cost = int(app_env.get("RATE_LIMIT_MISS_COST", settings.RATE_LIMIT_MISS_COST))
+    app_env.setdefault("RATE_LIMIT_BURST", str(math.ceil(args.requests / args.users) * miss_cost))
+    # Blocking stacks are behind the signed admin route
+    app_env.setdefault("PROFILER_SECRET", os.urandom(16).hex())
+
+    print("Building corpus...")
+    corpus = build_corpus(args.unique_docs, seed=args.seed)
+
+    stub = _start_server("loadtest.stub_openai:app", stub_port, stub_env,
+                         os.path.join(workdir, "stub.log"))
+    api = _start_server("app.main:app", app_port, app_env,
+                        os.path.join(workdir, "api.log"))
+    try:
+        await _wait_ready(f"http://127.0.0.1:{stub_port}/v1/models", stub)
+        healthy_after = await _wait_ready(f"http://127.0.0.1:{app_port}/health", api)
+        ready_after = healthy_after + await _wait_ready(f"http://127.0.0.1:{app_port}/ready", api)
+        print(f"API healthy after {healthy_after:.2f}s, warmed up after {ready_after:.2f}s (logs in {workdir})")
+
+        run = await run_load(f"http://127.0.0.1:{app_port}", corpus, args, api.pid)
+        report = summarize(run)
+        report["startup_to_healthy_s"] = round(healthy_after, 2)
+        report["startup_to_ready_s"] = round(ready_after, 2)
+        report["event_loop"] = await _event_loop_stats(
+            f"http://127.0.0.1:{app_port}", app_env["PROFILER_SECRET"])
+        print_report(report)
+
+        if args.json:
+            with open(args.json, "w") as output:
+                json.dump(report, output, indent=2)
+            print(f"\nReport written to {args.json}")
+
+        errors = sum(data["errors"] for data in report["endpoints"].values())
+        if report["requests"] and errors / report["requests"] > args.max_error_rate:
+            print(f"\nError rate above {args.max_error_rate:.0%}")
+            return 1
+        event_loop = report["event_loop"]
+        if args.max_loop_lag_ms is not None and event_loop and event_loop["max_lag_ms"] > args.max_loop_lag_ms:
+            print(f"\nEvent loop lag {event_loop['max_lag_ms']}ms above {args.max_loop_lag_ms}ms")
+            return 1
+        return 0
+    finally:
+        for process in (api, stub):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the upload pipeline")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10,
+                        help="Virtual users, each rate limited separately by the API")
+    parser.add_argument("--endpoint", choices=["upload", "stream", "both"], default="both")
+    parser.add_argument("--unique-docs", type=int, default=50,
+                        help="Distinct documents in the corpus (fewer = more cache hits)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stub-latency-dist", default="lognormal",
+                        choices=["constant", "uniform", "lognormal"])
+    parser.add_argument("--stub-latency-ms", type=float, default=300)
+    parser.add_argument("--stub-tokens-per-sec", type=float, default=150)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-stall-rate", type=float, default=0.0)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment variable for the API process (repeatable)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01,
+                        help="Exit non-zero above this error rate (for CI)")
+    parser.add_argument("--max-loop-lag-ms", type=float,
+                        help="Exit non-zero if the API's event loop lagged more than this (for CI)")
+    parser.add_argument("--json", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Local OpenAI-compatible stub server
+Speaks the chat-completions API (streaming and non-streaming) so the upload
+pipeline can be load-tested offline without spending real OpenAI money
+
+Behaviour is configured with STUB_* environment variables (or CLI flags):
+- STUB_LATENCY_DIST: constant | uniform | lognormal (time before first token)
+- STUB_LATENCY_MS: constant/median latency, STUB_LATENCY_MAX_MS for uniform
+- STUB_LATENCY_SIGMA: spread of the lognormal distribution
+- STUB_TOKENS_PER_SEC: generation speed (0 = instant)
+- STUB_ERROR_RATE: fraction of calls answered with HTTP 500
+- STUB_STALL_RATE / STUB_STALL_MS: fraction of calls that stall (tail latency)
+- STUB_EXPLANATION_TOKENS: approximate length of generated explanations
+
+Run standalone:
+    python -m loadtest.stub_openai --port 9100 --latency-ms 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class StubConfig:
+    """Stub behaviour, read from STUB_* environment variables"""
+
+    def __init__(self):
+        self.latency_dist = os.getenv("STUB_LATENCY_DIST", "lognormal")
+        self.latency_ms = float(os.getenv("STUB_LATENCY_MS", "300"))
+        self.latency_max_ms = float(os.getenv("STUB_LATENCY_MAX_MS", "600"))
+        self.latency_sigma = float(os.getenv("STUB_LATENCY_SIGMA", "0.4"))
+        self.tokens_per_sec = float(os.getenv("STUB_TOKENS_PER_SEC", "150"))
+        self.error_rate = float(os.getenv("STUB_ERROR_RATE", "0"))
+        self.stall_rate = float(os.getenv("STUB_STALL_RATE", "0"))
+        self.stall_ms = float(os.getenv("STUB_STALL_MS", "10000"))
+        self.explanation_tokens = int(
+            os.getenv("STUB_EXPLANATION_TOKENS", "450"))
+        self.seed = os.getenv("STUB_SEED")
+
+    def first_token_delay(self) -> float:
+        """Sample the time before the first token (seconds)"""
+        if self.stall_rate and random.random() < self.stall_rate:
+            return self.stall_ms / 1000
+
+        if self.latency_dist == "constant":
+            delay_ms = self.latency_ms
+        elif self.latency_dist == "uniform":
+            delay_ms = random.uniform(self.latency_ms, self.latency_max_ms)
+        else:
+            delay_ms = random.lognormvariate(0, self.latency_sigma) * self.latency_ms
+
+        return delay_ms / 1000
+
+    def token_delay(self) -> float:
+        """Time to generate one token (seconds)"""
+        return 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+
+config = StubConfig()
+if config.seed is not None:
+    random.seed(int(config.seed))
+
+app = FastAPI(title="OpenAI stub")
+
+# System prompts seen so far, to simulate provider-side prompt caching
+_seen_prefixes = set()
+
+SECTIONS = [
+    ("📋 Summary", "This document is a sample policy used for load testing. It describes coverage, premiums and conditions in plain words."),
+    ("✅ Key Benefits/Features", "- Covers hospital stays and day-care procedures\n- Cashless treatment at network hospitals\n- No-claim bonus every renewal year"),
+    ("❌ Exclusions/Restrictions", "- Pre-existing diseases for the first two years\n- Cosmetic treatment\n- Self-inflicted injuries"),
+    ("⚠️ Important Things to Know", "- Premium is due yearly\n- Claims must be reported within 30 days\n- Grace period is 15 days"),
+    ("💡 Simple Analogy", "Think of it like an umbrella you pay for every year: you hope not to need it, but it keeps you dry when it rains."),
+    ("🎯 5-Point Breakdown", "1. It is a health policy\n2. It pays hospital bills\n3. Some illnesses wait two years\n4. Pay on time\n5. Report claims quickly")
+]
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def _usage(messages: list, completion: str) -> dict:
+    """Build a usage block, reporting the system prompt as cached after first sight"""
+    system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+    prompt_tokens = sum(_estimate_tokens(m.get("content") or "") for m in messages)
+
+    cached_tokens = 0
+    if system in _seen_prefixes:
+        # OpenAI caches in 128-token increments once the prefix is >= 1024 tokens
+        system_tokens = _estimate_tokens(system)
+        cached_tokens = (system_tokens // 128) * 128 if system_tokens >= 1024 else 0
+    _seen_prefixes.add(system)
+
+    completion_tokens = _estimate_tokens(completion)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens, "audio_tokens": 0},
+        "completion_tokens_details": {"reasoning_tokens": 0, "audio_tokens": 0}
+    }
+
+
+def _classification(text: str) -> dict:
+    """Keyword classification mimicking the real classifier's output"""
+    financial_terms = ["insurance", "policy", "premium", "loan",
+                       "interest", "bank", "investment", "emi", "pension"]
+    is_financial = any(term in text.lower() for term in financial_terms)
+    return {
+        "is_insurance": is_financial,
+        "confidence": 0.92 if is_financial else 0.85,
+        "document_type": "insurance policy" if is_financial else "recipe",
+        "reason": "stub classification"
+    }
+
+
+def _completion_text(messages: list) -> str:
+    """Produce a plausible answer for whichever prompt was sent"""
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+
+    if "document classification expert" in system:
+        if "### Document" in user:
+            documents = user.split("### Document")[1:]
+            return json.dumps([_classification(doc) for doc in documents])
+        return json.dumps(_classification(user))
+
+    if "professional translator" in system:
+        # Echo the text back - good enough for throughput measurements
+        return user.split("\n\n", 1)[-1]
+
+    if "can only analyze financial documents" in system:
+        return "This looks like a non-financial document. Sacha Advisor explains financial documents such as insurance policies, loans and investments - please upload one of those."
+
+    # Explanation: the sectioned format, padded to the configured length
+    text = "\n\n".join(f"**{title}**\n{body}" for title, body in SECTIONS)
+    filler = " This sentence pads the explanation to a realistic length."
+    while _estimate_tokens(text) < config.explanation_tokens:
+        text += filler
+    return text
+
+
+def _split_tokens(text: str) -> list:
+    """Split text into token-sized pieces (~4 characters)"""
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def _chunk(completion_id: str, model: str, content=None, finish_reason=None, usage=None) -> str:
+    """Format one streaming chunk as an SSE frame"""
+    choices = [] if usage is not None else [{
+        "index": 0,
+        "delta": {"content": content} if content is not None else {},
+        "finish_reason": finish_reason
+    }]
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": choices,
+        "usage": usage
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "stub"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o-mini")
+    messages = body.get("messages", [])
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    if config.error_rate and random.random() < config.error_rate:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Injected stub error", "type": "server_error"}}
+        )
+
+    completion = _completion_text(messages)
+    usage = _usage(messages, completion)
+    await asyncio.sleep(config.first_token_delay())
+
+    if body.get("stream"):
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def generate():
+            yield _chunk(completion_id, model, content="")
+            for piece in _split_tokens(completion):
+                yield _chunk(completion_id, model, content=piece)
+                if config.token_delay():
+                    await asyncio.sleep(config.token_delay())
+            yield _chunk(completion_id, model, finish_reason="stop")
+            if include_usage:
+                yield _chunk(completion_id, model, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+    # Non-streaming: generation time is paid before the response
+    await asyncio.sleep(usage["completion_tokens"] * config.token_delay())
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": completion},
+            "finish_reason": "stop"
+        }],
+        "usage": usage
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the OpenAI stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-dist", choices=["constant", "uniform", "lognormal"])
+    parser.add_argument("--latency-ms", type=float)
+    parser.add_argument("--tokens-per-sec", type=float)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--stall-rate", type=float)
+    args = parser.parse_args()
+
+    for name in ("latency_dist", "latency_ms", "tokens_per_sec", "error_rate", "stall_rate"):
+        value = getattr(args, name)
+        if value is not None:
+            setattr(config, name, value)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+Shared test setup
+Settings are read when app.config is first imported, so the environment
+is pinned here: no Supabase, a throwaway SQLite file, no OpenAI key
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = ""
+os.environ["OPENAI_API_KEY"] = ""
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="sacha-tests-"), "test.db")
@@ -0,0 +1,206 @@
+"""
+Request deadlines: propagation to spawned work, bounded calls and streams,
+and hedged calls
+"""
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.config import settings
+from app.services import openai_client
+from app.services.deadline import (
+    DeadlineExceeded, current_deadline, iterate_with_deadline, remaining_time, start_deadline, with_deadline
+)
+from app.services.hedging import Hedger
+from app.services.usage_tracker import start_request_usage, usage_tracker
+
+
+def test_remaining_time_is_default_without_a_deadline():
+    async def main():
+        return current_deadline(), remaining_time(7.0)
+
+    assert asyncio.run(main()) == (None, 7.0)
+
+
+def test_deadline_propagates_to_spawned_tasks():
+    async def child():
+        return remaining_time(60.0)
+
+    async def main():
+        start_deadline(2.0)
+        return await asyncio.create_task(child())
+
+    assert 0 < asyncio.run(main()) <= 2.0
+
+
+def test_with_deadline_raises_when_time_runs_out():
+    async def main():
+        start_deadline(0.05)
+        await with_deadline(asyncio.sleep(1), 60.0)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+
+
+def test_with_deadline_refuses_an_expired_deadline_without_running_the_call():
+    started = []
+
+    async def call():
+        started.append(True)
+
+    async def main():
+        start_deadline(0)
+        await with_deadline(call(), 60.0)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert started == []
+
+
+async def _stalling_stream(items, stall_after):
+    for index, item in enumerate(items):
+        if index == stall_after:
+            await asyncio.sleep(60)
+        yield item
+
+
+def test_iterate_with_deadline_yields_a_stream_that_finishes_in_time():
+    async def main():
+        start_deadline(1.0)
+        return [item async for item in iterate_with_deadline(_stalling_stream("abc", stall_after=99), 60.0)]
+
+    assert asyncio.run(main()) == ["a", "b", "c"]
+
+
+def test_iterate_with_deadline_bounds_the_whole_stream():
+    received = []
+
+    async def main():
+        start_deadline(0.1)
+        async for item in iterate_with_deadline(_stalling_stream("abc", stall_after=2), 60.0):
+            received.append(item)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert received == ["a", "b"]
+
+
+class _StallingCompletions:
+    """chat.completions stand-in whose stream stalls after its first chunk"""
+
+    def __init__(self):
+        self.closed = False
+
+    async def create(self, **kwargs):
+        completions = self
+
+        class Stream:
+            def __aiter__(self):
+                return self.chunks()
+
+            async def chunks(self):
+                delta = SimpleNamespace(content="Hello")
+                yield SimpleNamespace(usage=None, model="stub", choices=[SimpleNamespace(delta=delta)])
+                await asyncio.sleep(60)
+
+            async def close(self):
+                completions.closed = True
+
+        return Stream()
+
+
+def test_explanation_stream_stops_at_the_request_deadline(monkeypatch):
+    completions = _StallingCompletions()
+    monkeypatch.setattr(openai_client, "_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+
+    async def excerpt(text):
+        return text
+
+    monkeypatch.setattr(openai_client, "_document_excerpt", excerpt)
+    received = []
+
+    async def main():
+        start_deadline(0.2)
+        async for chunk in openai_client.get_insurance_explanation_stream("policy text"):
+            received.append(chunk)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert received == ["Hello"]
+    assert completions.closed
+
+
+def test_hedger_returns_fast_primary_without_hedging(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_DELAY_MS", 50)
+    hedger = Hedger("test")
+    calls = []
+
+    async def attempt():
+        calls.append(True)
+        return "primary"
+
+    assert asyncio.run(hedger.run(attempt)) == "primary"
+    assert len(calls) == 1
+    assert hedger.hedges_fired == 0
+
+
+def test_hedger_hedge_wins_and_the_slow_primary_is_still_billed(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_DELAY_MS", 20)
+    hedger = Hedger("test")
+    delays = iter([0.2, 0.0])
+
+    async def attempt():
+        delay = next(delays)
+        await asyncio.sleep(delay)
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=10, prompt_tokens_details=None)
+        usage_tracker.record("hedge-test", usage, model="gpt-4o-mini", wall_time_ms=round(delay * 1000))
+        return delay
+
+    async def main():
+        usage = start_request_usage()
+        result = await hedger.run(attempt)
+        billed_at_return = len(usage.calls)
+        await asyncio.gather(*hedger._losers)
+        return result, billed_at_return, len(usage.calls)
+
+    result, billed_at_return, billed = asyncio.run(main())
+    assert result == 0.0
+    assert hedger.hedges_fired == 1 and hedger.hedge_wins == 1
+    # The loser finishes in the background and its usage is recorded too
+    assert billed_at_return == 1 and billed == 2
+    assert usage_tracker.prompts["hedge-test"]["calls"] == 2
+    assert max(hedger.attempt_latencies) >= 200
+
+
+def test_hedger_cancels_both_attempts_when_the_caller_leaves(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_DELAY_MS", 10)
+    hedger = Hedger("test")
+    cancelled = []
+
+    async def attempt():
+        try:
+            await asyncio.sleep(1.0)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        caller = asyncio.create_task(hedger.run(attempt))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == [True, True]
+
+
+def test_hedger_raises_when_every_attempt_fails(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_DELAY_MS", 10)
+    hedger = Hedger("test")
+
+    async def attempt():
+        await asyncio.sleep(0.03)
+        raise ValueError("down")
+
+    with pytest.raises(ValueError):
+        asyncio.run(hedger.run(attempt))
@@ -0,0 +1,77 @@
+"""
+Job queue: job lifetime and expiry
+"""
+import asyncio
+from app.config import settings
+from app.services import job_queue as module
+from app.services.document_pipeline import PipelineError
+from app.services.job_queue import JobQueue
+
+
+def _fake_pipeline(delay):
+    async def analyze_document(file_content, file_extension, filename, language, output, analytics):
+        await asyncio.sleep(delay)
+        if file_content == b"bad":
+            raise PipelineError("Not a financial document", 400, "rejected_by_sachadvisor", "classification")
+        return {"summary": "Explained", "content_id": "abc", "filename": filename}
+    return analyze_document
+
+
+def test_jobs_expire_from_when_they_finish(monkeypatch):
+    monkeypatch.setattr(module, "analyze_document", _fake_pipeline(delay=0.3))
+    monkeypatch.setattr(settings, "JOB_TTL_SECONDS", 0.2)
+    queue = JobQueue(workers=1, max_queued=5)
+
+    async def main():
+        job = queue.submit(b"%PDF", ".pdf", "policy.pdf")
+        # Running for longer than the TTL - still there
+        await asyncio.sleep(0.25)
+        assert queue.get(job.id) is job and job.status == "running"
+
+        while not job.done:
+            await job.wait_for_change(1.0)
+        assert queue.get(job.id).result["summary"] == "Explained"
+        assert job.file_content == b""
+
+        await asyncio.sleep(0.25)
+        return queue.get(job.id)
+
+    assert asyncio.run(main()) is None
+    assert queue.stats['completed'] == 1
+
+
+def test_finished_jobs_are_bounded(monkeypatch):
+    monkeypatch.setattr(module, "analyze_document", _fake_pipeline(delay=0))
+    monkeypatch.setattr(settings, "JOB_MAX_SIZE", 2)
+    queue = JobQueue(workers=1, max_queued=5)
+
+    async def main():
+        jobs = [queue.submit(content, ".pdf", "policy.pdf") for content in (b"bad", b"%PDF", b"%PDF")]
+        while not all(job.done for job in jobs):
+            await asyncio.sleep(0.01)
+        return jobs
+
+    rejected, first, second = asyncio.run(main())
+    assert rejected.error == {"status_code": 400, "message": "Not a financial document"}
+    # Only the most recently finished jobs are kept
+    assert queue.get(rejected.id) is None
+    assert queue.get(first.id) is first and queue.get(second.id) is second
+    assert queue.active == {}
+
+
+def test_submit_is_shed_when_a_stage_is_backed_up(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.admission import Overloaded, admission
+
+    def overloaded(stages):
+        raise Overloaded("ocr", 7)
+
+    monkeypatch.setattr(admission, "admit", overloaded)
+    submitted = module.job_queue.stats['submitted']
+
+    files = {"file": ("scan.png", b"\x89PNG", "image/png")}
+    response = TestClient(app).post("/api/jobs", files=files)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "7"
+    assert module.job_queue.stats['submitted'] == submitted
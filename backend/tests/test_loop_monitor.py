@@ -0,0 +1,29 @@
+"""
+Event-loop monitor: what /health publishes and what stays behind the admin route
+"""
+import time
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+from app.services.loop_monitor import loop_monitor
+from app.services.profiler import sign_profile_token
+
+BLOCK = {'at': time.time(), 'duration_ms': 300, 'stack': ["app/services/slow.py:12 in parse"]}
+
+
+def test_health_has_no_stacks(monkeypatch):
+    monkeypatch.setattr(loop_monitor, "blocks", [BLOCK])
+    event_loop = TestClient(app).get("/health").json()["event_loop"]
+    assert set(event_loop["lag_percentiles_ms"]) == {"p50", "p95", "p99"}
+    assert "slow.py" not in str(event_loop)
+
+
+def test_admin_route_needs_a_signed_token(monkeypatch):
+    monkeypatch.setattr(loop_monitor, "blocks", [BLOCK])
+    client = TestClient(app)
+    assert client.get("/admin/event-loop").status_code == 404  # No PROFILER_SECRET
+
+    monkeypatch.setattr(settings, "PROFILER_SECRET", "test-secret")
+    assert client.get("/admin/event-loop", headers={"X-Profile": "1.forged"}).status_code == 403
+    response = client.get("/admin/event-loop", headers={"X-Profile": sign_profile_token(60)})
+    assert response.json()["recent_blocks"] == [BLOCK]
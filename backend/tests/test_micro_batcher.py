@@ -0,0 +1,95 @@
+"""
+Micro-batcher: batching, fan-out and per-caller deadlines
+"""
+import asyncio
+import pytest
+from app.services.deadline import DeadlineExceeded, current_deadline, start_deadline
+from app.services.micro_batcher import MicroBatcher
+
+
+def test_items_submitted_in_one_window_share_a_batch():
+    batches = []
+
+    async def run_batch(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    async def main():
+        batcher = MicroBatcher(run_batch, window_ms=20, max_size=10, timeout=1)
+        return await asyncio.gather(*(batcher.submit(n) for n in range(3)))
+
+    assert asyncio.run(main()) == [0, 2, 4]
+    assert batches == [[0, 1, 2]]
+
+
+def test_full_batch_flushes_without_waiting_for_the_window():
+    async def run_batch(items):
+        return items
+
+    async def main():
+        batcher = MicroBatcher(run_batch, window_ms=10_000, max_size=2, timeout=1)
+        return await asyncio.wait_for(asyncio.gather(batcher.submit("a"), batcher.submit("b")), 1)
+
+    assert asyncio.run(main()) == ["a", "b"]
+
+
+def test_exception_result_goes_to_its_caller_only():
+    async def run_batch(items):
+        return [ValueError("bad") if item == "bad" else item for item in items]
+
+    async def main():
+        batcher = MicroBatcher(run_batch, window_ms=10, max_size=10, timeout=1)
+        return await asyncio.gather(batcher.submit("ok"), batcher.submit("bad"), return_exceptions=True)
+
+    ok, bad = asyncio.run(main())
+    assert ok == "ok"
+    assert isinstance(bad, ValueError)
+
+
+def test_batch_runs_outside_the_triggering_request_deadline():
+    seen_deadlines = []
+
+    async def run_batch(items):
+        seen_deadlines.append(current_deadline())
+        await asyncio.sleep(0.1)
+        return items
+
+    async def short_deadline_caller(batcher):
+        start_deadline(0.03)
+        return await batcher.submit("short")
+
+    async def main():
+        batcher = MicroBatcher(run_batch, window_ms=10, max_size=10, timeout=1)
+        return await asyncio.gather(short_deadline_caller(batcher), batcher.submit("patient"),
+                                    return_exceptions=True)
+
+    short, patient = asyncio.run(main())
+    # The short request gives up on its own; the batch (and its other caller) carry on
+    assert isinstance(short, DeadlineExceeded)
+    assert patient == "patient"
+    assert seen_deadlines == [None]
+
+
+def test_batch_timeout_fails_every_caller():
+    async def run_batch(items):
+        await asyncio.sleep(1)
+        return items
+
+    async def main():
+        batcher = MicroBatcher(run_batch, window_ms=10, max_size=10, timeout=0.05)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+
+
+@pytest.mark.parametrize("max_size", [0, 1])
+def test_max_size_is_at_least_one(max_size):
+    async def run_batch(items):
+        return items
+
+    async def main():
+        batcher = MicroBatcher(run_batch, window_ms=10_000, max_size=max_size, timeout=1)
+        return await asyncio.wait_for(batcher.submit("x"), 1)
+
+    assert asyncio.run(main()) == "x"
@@ -0,0 +1,212 @@
+"""
+Rate limiter: GCRA accounting, backends and batch charging
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.routers import upload
+from app.services.rate_limiter import MemoryBackend, RateLimitBackend, RateLimited, RateLimiter, RedisBackend
+
+
+def _limiter(burst=3, backend=None) -> RateLimiter:
+    # One unit per second, so retry_after reads in units
+    return RateLimiter(per_minute=60, burst=burst,
+                       backend=backend or MemoryBackend(max_keys=100))
+
+
+async def _spend(limiter, key, times, cost=1):
+    """Acquire until refused; returns how many were allowed and the refusal"""
+    for allowed in range(times):
+        try:
+            await limiter.acquire(key, cost)
+        except RateLimited as e:
+            return allowed, e
+    return times, None
+
+
+def test_burst_then_refusal_with_retry_after():
+    allowed, refusal = asyncio.run(_spend(_limiter(burst=3), "user", 10))
+    assert allowed == 3
+    assert refusal.retry_after == 1
+
+
+def test_costlier_requests_use_more_of_the_burst():
+    allowed, refusal = asyncio.run(_spend(_limiter(burst=10), "user", 10, cost=4))
+    assert allowed == 2
+    assert refusal.retry_after == 2
+
+
+def test_allowance_replenishes_over_time():
+    backend = MemoryBackend(max_keys=100)
+
+    async def main():
+        # Emission interval 1s, tolerance of two intervals
+        results = [await backend.update("user", now, 1.0, 2.0, force=False)
+                   for now in (100.0, 100.0, 100.0, 101.5)]
+        return results
+
+    assert asyncio.run(main()) == [0.0, 0.0, 1.0, 0.0]
+
+
+def test_charge_goes_into_debt_and_delays_the_next_request():
+    limiter = _limiter(burst=3)
+
+    async def main():
+        await limiter.acquire("user", 1)
+        await limiter.charge("user", 4)  # Work already done - never refused
+        return await _spend(limiter, "user", 1)
+
+    allowed, refusal = asyncio.run(main())
+    assert allowed == 0
+    assert refusal.retry_after == 3
+    assert limiter.stats['charged'] == 1
+
+
+def test_debt_outlives_a_full_burst_of_idle_time():
+    backend = MemoryBackend(max_keys=100)
+
+    async def main():
+        now = time.time()
+        await backend.update("user", now, 1.0, 2.0, force=False)
+        await backend.update("user", now, 60.0, 2.0, force=True)  # Charged deep into debt
+        return await backend.update("user", now + 30, 1.0, 2.0, force=False)
+
+    # Still 30s of debt left - the entry must not have been forgotten
+    assert asyncio.run(main()) == pytest.approx(30.0)
+
+
+def test_keys_are_limited_independently():
+    limiter = _limiter(burst=1)
+
+    async def main():
+        await limiter.acquire("first")
+        await limiter.acquire("second")
+        return await _spend(limiter, "first", 1)
+
+    assert asyncio.run(main())[0] == 0
+
+
+def test_backends_must_implement_update():
+    with pytest.raises(TypeError):
+        RateLimitBackend()
+
+
+def test_redis_errors_fail_open():
+    backend = RedisBackend.__new__(RedisBackend)
+    backend.errors = 0
+
+    async def broken_script(keys, args):
+        raise ConnectionError("Connection refused")
+
+    backend._script = broken_script
+    limiter = _limiter(burst=1, backend=backend)
+    allowed, _ = asyncio.run(_spend(limiter, "user", 5))
+    assert allowed == 5
+    assert backend.errors == 5
+
+
+@pytest.mark.skipif(not os.getenv("TEST_REDIS_URL"), reason="set TEST_REDIS_URL to test the Redis backend")
+def test_redis_script_matches_memory_backend():
+    pytest.importorskip("redis")
+    key = f"test-{uuid.uuid4().hex}"
+
+    async def main():
+        redis_backend = RedisBackend(os.environ["TEST_REDIS_URL"])
+        memory_backend = MemoryBackend(max_keys=100)
+        calls = [(100.0, 1.0, False), (100.0, 1.0, False), (100.0, 1.0, False),
+                 (100.5, 3.0, True), (101.0, 1.0, False), (106.0, 1.0, False)]
+        results = []
+        for now, increment, force in calls:
+            results.append((
+                await redis_backend.update(key, now, increment, 2.0, force),
+                await memory_backend.update(key, now, increment, 2.0, force)))
+        return results, redis_backend.errors
+
+    results, errors = asyncio.run(main())
+    assert errors == 0
+    for from_redis, from_memory in results:
+        assert from_redis == pytest.approx(from_memory)
+
+
+async def _analyze_stub(file_content, file_extension, filename, language):
+    return {"summary": f"Explained {filename}", "content_id": filename, "prefetch_key": None}
+
+
+def test_batch_is_charged_per_document(monkeypatch):
+    limiter = _limiter(burst=2)
+    monkeypatch.setattr(upload, "rate_limiter", limiter)
+
+    monkeypatch.setattr(upload, "analyze_document", _analyze_stub)
+    monkeypatch.setattr(upload.settings, "BATCH_MAX_CONCURRENCY", 1)
+    from app.main import app
+
+    files = [("files", (f"policy{index}.pdf", f"%PDF-{index}".encode(), "application/pdf")) for index in range(4)]
+    response = TestClient(app).post("/api/upload-batch", files=files)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    records = [line for line in lines if "index" in line]
+    summary = next(line for line in lines if line.get("status") == "complete")
+
+    assert response.status_code == 200
+    statuses = sorted(record.get("status_code", 200) for record in records)
+    # A burst of 2 pays for two documents; the others are refused, not charged into debt
+    assert statuses == [200, 200, 429, 429]
+    assert summary["succeeded"] == 2 and summary["failed"] == 2
+    assert all(record["retry_after"] >= 1 for record in records if record["status"] == "error")
+
+
+def test_forwarded_clients_get_their_own_buckets(monkeypatch):
+    limiter = _limiter(burst=1)
+    monkeypatch.setattr(upload, "rate_limiter", limiter)
+    monkeypatch.setattr(upload, "analyze_document", _analyze_stub)
+    monkeypatch.setattr(upload.settings, "TRUSTED_PROXY_HOPS", 1)
+    from app.main import app
+    client = TestClient(app)
+
+    def upload_from(forwarded_for):
+        headers = {"X-Forwarded-For": forwarded_for, "User-Agent": "Chrome"}
+        files = [("files", ("policy.pdf", b"%PDF-1", "application/pdf"))]
+        return client.post("/api/upload-batch", files=files, headers=headers).status_code
+
+    assert upload_from("203.0.113.7") == 200
+    assert upload_from("203.0.113.7") == 429
+    # Another client behind the same proxy has a bucket of its own
+    assert upload_from("198.51.100.4") == 200
+    # Entries left of the proxy's come from the client and don't change its bucket
+    assert upload_from("1.2.3.4, 203.0.113.7") == 429
+
+
+class _RemoteBackend(MemoryBackend):
+    """Takes a round trip per update, like Redis"""
+
+    async def update(self, *args, **kwargs):
+        await asyncio.sleep(0.05)
+        return await super().update(*args, **kwargs)
+
+
+def test_charge_survives_cancellation_of_the_caller():
+    limiter = _limiter(burst=3, backend=_RemoteBackend(max_keys=100))
+
+    async def main():
+        async def charge_after_disconnect():
+            try:
+                await asyncio.sleep(10)
+            finally:
+                await limiter.charge("user", 4)
+
+        task = asyncio.create_task(charge_after_disconnect())
+        await asyncio.sleep(0)
+        task.cancel()  # The disconnect...
+        await asyncio.sleep(0.01)
+        task.cancel()  # ...and a second one landing on the charge itself
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.1)
+        return await _spend(limiter, "user", 1)
+
+    allowed, refusal = asyncio.run(main())
+    assert allowed == 0
+    assert refusal.retry_after == 2
@@ -0,0 +1,76 @@
+"""
+Rejection messages: table lookups and shared generation of unseen types
+"""
+import asyncio
+from types import SimpleNamespace
+from app.services import rejection_messages as module
+from app.services.deadline import current_deadline, start_deadline
+from app.services.rejection_messages import RejectionMessageEngine, fallback_message, normalize_document_type
+from app.services.usage_tracker import current_request_usage, start_request_usage
+
+
+def test_spelling_variants_share_one_entry():
+    assert normalize_document_type("Aadhaar_Card") == "identity document"
+    assert normalize_document_type("Passports") == "passport"
+    assert normalize_document_type("  A scanned copy of the Lease ") == "lease"
+
+
+def _fake_completion(calls, delay=0.1):
+    async def create_chat_completion(**kwargs):
+        calls.append({'deadline': current_deadline(), 'usage': current_request_usage()})
+        await asyncio.sleep(delay)
+        message = SimpleNamespace(content=" Not a financial document. ")
+        return SimpleNamespace(usage=None, model="stub", choices=[SimpleNamespace(message=message)])
+    return create_chat_completion
+
+
+def test_table_hit_needs_no_generation(monkeypatch):
+    calls = []
+    monkeypatch.setattr(module, "create_chat_completion", _fake_completion(calls))
+    engine = RejectionMessageEngine()
+
+    message = asyncio.run(engine.get_message("passport"))
+    assert message.startswith("This looks like a passport")
+    assert calls == []
+
+
+def test_concurrent_callers_share_one_generation_outside_their_requests(monkeypatch):
+    calls = []
+    monkeypatch.setattr(module, "create_chat_completion", _fake_completion(calls))
+    engine = RejectionMessageEngine()
+
+    async def caller(deadline_seconds):
+        start_deadline(deadline_seconds)
+        start_request_usage()
+        return await engine.get_message("lease")
+
+    async def main():
+        return await asyncio.gather(caller(0.03), caller(5.0))
+
+    hurried, patient = asyncio.run(main())
+    # The hurried request falls back on its own deadline; the generation carries on for the other
+    assert hurried == fallback_message("lease")
+    assert patient == "Not a financial document."
+    assert calls == [{'deadline': None, 'usage': None}]
+    assert engine.stats['joined'] == 1 and engine.stats['cache_hits'] == 0
+    # Stored for the next rejection of the type
+    assert asyncio.run(engine.get_message("lease")) == "Not a financial document."
+    assert len(calls) == 1
+
+
+def test_prompt_names_the_type_as_classified(monkeypatch):
+    prompts = []
+
+    async def create_chat_completion(messages, **kwargs):
+        prompts.append(messages[-1]["content"])
+        message = SimpleNamespace(content="Not a financial document.")
+        return SimpleNamespace(usage=None, model="stub", choices=[SimpleNamespace(message=message)])
+
+    monkeypatch.setattr(module, "create_chat_completion", create_chat_completion)
+    engine = RejectionMessageEngine()
+
+    asyncio.run(engine.get_message("Scanned Rental_Agreement-Draft"))
+    assert "Scanned Rental_Agreement-Draft" in prompts[0]
+    # Stored under the normalized key, so other spellings are served from the cache
+    asyncio.run(engine.get_message("rental agreement draft"))
+    assert len(prompts) == 1 and engine.stats['cache_hits'] == 1
@@ -0,0 +1,137 @@
+"""
+Extraction sandbox: limits, worker replacement, warm-up and profiling across the process boundary
+Task functions live at module level so spawned workers can import them
+"""
+import asyncio
+import os
+import time
+import pytest
+from app.config import settings
+from app.services import extractor, sandbox as module
+from app.services.profiler import Profile, profiler
+from app.services.sandbox import SandboxError, SandboxPool
+
+
+def _pid() -> int:
+    return os.getpid()
+
+
+def _hang(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def _spin(seconds: float) -> int:
+    end, count = time.monotonic() + seconds, 0
+    while time.monotonic() < end:
+        count += 1
+    return count
+
+
+def _fail() -> None:
+    raise ValueError("Not a PDF")
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(size=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_timeout_kills_the_worker_and_replaces_it(pool):
+    async def main():
+        first_pid = await pool.run(_pid)
+        started = time.monotonic()
+        with pytest.raises(SandboxError) as error:
+            await pool.run(_hang, 30, timeout=0.5)
+        elapsed = time.monotonic() - started
+        return first_pid, error.value.reason, elapsed, await pool.run(_pid)
+
+    first_pid, reason, elapsed, next_pid = asyncio.run(main())
+    assert reason == "timeout"
+    assert elapsed < 5
+    # The hung worker is gone; the next task gets a fresh one
+    assert next_pid != first_pid
+    with pytest.raises(ProcessLookupError):
+        os.kill(first_pid, 0)
+    assert pool.stats['failed'] == 1 and pool.stats['started'] == 2
+
+
+def test_task_errors_keep_the_worker(pool):
+    async def main():
+        first_pid = await pool.run(_pid)
+        with pytest.raises(ValueError):
+            await pool.run(_fail)
+        return first_pid, await pool.run(_pid)
+
+    first_pid, next_pid = asyncio.run(main())
+    assert first_pid == next_pid
+
+
+def test_worker_stacks_join_the_active_profile(pool, monkeypatch):
+    profile = Profile("test", 10)  # Not started: only the worker's samples land in it
+    monkeypatch.setattr(profiler, "active", profile)
+
+    assert asyncio.run(pool.run(_spin, 0.3)) > 0
+    worker_stacks = [stack for stack in profile.stacks if stack.startswith("sandbox-worker;")]
+    assert any("_spin (test_sandbox.py)" in stack for stack in worker_stacks)
+
+
+def test_pool_size_defaults_to_the_admission_slots():
+    assert SandboxPool(size=0).size == settings.EXTRACTION_MAX_CONCURRENT + settings.OCR_MAX_CONCURRENT
+    assert SandboxPool(size=3).size == 3
+
+
+def test_warm_up_starts_only_a_few_workers(monkeypatch):
+    calls = []
+
+    async def run(fn, *args):
+        calls.append(fn.__name__)
+
+    warm_pool = SandboxPool(size=8)
+    monkeypatch.setattr(warm_pool, "run", run)
+    monkeypatch.setattr(extractor, "sandbox", warm_pool)
+    monkeypatch.setattr(settings, "WARMUP_SANDBOX_WORKERS", 2)
+
+    asyncio.run(extractor.warm_up_extraction())
+    assert calls == ["_warm_parsers", "_warm_parsers"]
+
+
+class _SlowWorker(module._Worker):
+    """Spawns and dies slowly, like a worker on a busy host"""
+
+    def __init__(self, context):
+        time.sleep(0.3)
+        super().__init__(context)
+
+    def kill(self):
+        time.sleep(0.3)
+        super().kill()
+
+
+def test_spawning_and_retiring_workers_keep_the_loop_free(pool, monkeypatch):
+    monkeypatch.setattr(module, "_Worker", _SlowWorker)
+    monkeypatch.setattr(settings, "SANDBOX_MAX_TASKS_PER_WORKER", 1)
+
+    async def main():
+        gaps, stop = [], asyncio.Event()
+
+        async def tick():
+            last = time.monotonic()
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+                now = time.monotonic()
+                gaps.append(now - last)
+                last = now
+
+        ticker = asyncio.create_task(tick())
+        pids = [await pool.run(_pid), await pool.run(_pid)]
+        await asyncio.gather(*pool._reaping)
+        stop.set()
+        await ticker
+        return pids, max(gaps)
+
+    pids, longest_gap = asyncio.run(main())
+    assert pids[0] != pids[1]  # Each worker retired after one task
+    assert longest_gap < 0.2
+    assert pool.stats['recycled'] == 2 and not pool._reaping
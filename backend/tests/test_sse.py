@@ -0,0 +1,46 @@
+"""
+SSE helpers: coalescing deltas and shutting the upstream down
+"""
+import asyncio
+from app.services.sse import coalesce
+
+
+def test_deltas_are_merged_until_the_size_limit():
+    async def source():
+        for chunk in ("ab", "cd", "ef", "g"):
+            yield chunk
+
+    async def main():
+        return [piece async for piece in coalesce(source(), interval_ms=10_000, max_bytes=4)]
+
+    assert asyncio.run(main()) == ["abcd", "efg"]
+
+
+def test_cancellation_while_closing_the_upstream_is_not_swallowed():
+    async def source():
+        yield "a"
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.2)  # Slow to close, like an HTTP stream
+            raise
+        yield "b"
+
+    steps = []
+
+    async def consumer():
+        pieces = coalesce(source(), interval_ms=10, max_bytes=1000)
+        async for _ in pieces:
+            break
+        await pieces.aclose()
+        steps.append("carried on after close")
+
+    async def main():
+        task = asyncio.create_task(consumer())
+        await asyncio.sleep(0.1)
+        task.cancel()  # Lands while coalesce waits for the upstream to close
+        await asyncio.gather(task, return_exceptions=True)
+        return task.cancelled()
+
+    assert asyncio.run(main()) is True
+    assert steps == []
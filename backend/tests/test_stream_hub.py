@@ -0,0 +1,86 @@
+"""
+Stream hub: one upstream shared by every subscriber, outside their requests
+"""
+import asyncio
+import pytest
+from types import SimpleNamespace
+from app.services.deadline import DeadlineExceeded, current_deadline, start_deadline
+from app.services.stream_hub import StreamHub
+from app.services.usage_tracker import start_request_usage, usage_tracker
+
+
+def _source(seen, chunks=("a", "b", "c"), delay=0.05):
+    async def stream():
+        seen.append(current_deadline())
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=3, prompt_tokens_details=None)
+        usage_tracker.record("explanation", usage, model="gpt-4o-mini", wall_time_ms=1)
+    return stream
+
+
+async def _collect(hub, key, source, deadline_seconds):
+    start_deadline(deadline_seconds)
+    usage = start_request_usage()
+    chunks = []
+    try:
+        async for chunk in hub.subscribe(key, source):
+            chunks.append(chunk)
+    except DeadlineExceeded:
+        chunks.append("deadline")
+    return chunks, len(usage.calls)
+
+
+def test_upstream_outlives_the_subscriber_that_started_it():
+    hub = StreamHub(timeout=5.0)
+    seen = []
+
+    async def main():
+        source = _source(seen)
+        return await asyncio.gather(
+            _collect(hub, "key-a", source, 0.08), _collect(hub, "key-a", source, 5.0))
+
+    (hurried, hurried_calls), (patient, patient_calls) = asyncio.run(main())
+    assert hurried == ["a", "deadline"]
+    assert patient == ["a", "b", "c"]
+    # The upstream ran without the starter's deadline, and only once
+    assert seen == [None]
+    assert hub.stats['started'] == 1 and hub.stats['joined'] == 1
+    assert hub.stats['completed'] == 1
+    # The starter left early, so the subscriber that stayed is billed for the shared call
+    assert hurried_calls == 0 and patient_calls == 1
+
+
+def test_starter_is_billed_for_the_upstream_call():
+    hub = StreamHub(timeout=5.0)
+
+    async def main():
+        return await _collect(hub, "key-b", _source([]), 5.0)
+
+    chunks, calls = asyncio.run(main())
+    assert chunks == ["a", "b", "c"]
+    assert calls == 1
+
+
+def test_shared_call_is_billed_once():
+    hub = StreamHub(timeout=5.0)
+
+    async def main():
+        source = _source([])
+        return await asyncio.gather(*(_collect(hub, "key-d", source, 5.0) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert [calls for _, calls in results] == [1, 0, 0]
+
+
+def test_upstream_is_bounded_by_its_own_timeout():
+    hub = StreamHub(timeout=0.1)
+
+    async def main():
+        start_deadline(10.0)
+        async for _ in hub.subscribe("key-c", _source([], delay=1.0)):
+            pass
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
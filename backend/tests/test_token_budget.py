@@ -0,0 +1,39 @@
+"""
+Token budget: encodings load off the event loop, and a failed load falls back to estimates
+"""
+import asyncio
+import threading
+from app.services import token_budget as module
+from app.services.token_budget import CHARS_PER_TOKEN, count_tokens, trim_to_token_budget
+
+
+def test_encoding_loads_once_in_a_thread(monkeypatch):
+    loads = []
+
+    def load(model):
+        loads.append(threading.current_thread() is threading.main_thread())
+        return None
+
+    monkeypatch.setattr(module, "_load_encoding", load)
+    monkeypatch.setattr(module, "_encodings", {})
+
+    async def main():
+        await count_tokens("policy", "test-model")
+        return await count_tokens("policy", "test-model")
+
+    assert asyncio.run(main()) == 2
+    assert loads == [False]
+
+
+def test_failed_load_trims_by_characters(monkeypatch):
+    import tiktoken
+
+    def offline(*args, **kwargs):
+        raise ConnectionError("Cannot fetch the encoding file")
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", offline)
+    monkeypatch.setattr(module, "_encodings", {})
+
+    text = "premium " * 100
+    trimmed = asyncio.run(trim_to_token_budget(text, 10, "gpt-4o-mini"))
+    assert trimmed == text[:10 * CHARS_PER_TOKEN]
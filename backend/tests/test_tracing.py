@@ -0,0 +1,32 @@
+"""
+Tracing: who gets stage timings back
+"""
+import pytest
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+
+SAMPLED = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+NOT_SAMPLED = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00"
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def test_untraced_by_default(client):
+    assert "server-timing" not in client.get("/").headers
+
+
+def test_sampled_traceparent_gets_server_timing(client):
+    assert "server-timing" in client.get("/", headers={"traceparent": SAMPLED}).headers
+    assert "server-timing" not in client.get("/", headers={"traceparent": NOT_SAMPLED}).headers
+
+
+def test_sampled_requests_only_report_timing_when_opted_in(client, monkeypatch):
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 1.0)
+    assert "server-timing" not in client.get("/").headers
+
+    monkeypatch.setattr(settings, "TRACE_SERVER_TIMING", True)
+    assert "server-timing" in client.get("/").headers
@@ -0,0 +1,140 @@
+"""
+Translation service: section splitting and shared in-flight translations
+"""
+import asyncio
+import pytest
+from app.config import settings
+from app.services import translation_service as module
+from app.services.deadline import DeadlineExceeded, current_deadline, start_deadline
+from app.services.translation_service import (
+    cancel_prefetch, prefetch_translation, split_sections, stream_translation, translate
+)
+
+EXPLANATION = """**📋 Summary**
+A term life policy.
+
+**✅ Key Benefits/Features**
+- Cover of
+**₹5,00,000** for 20 years
+**$1,200 premium** per year
+
+**⚠ Important Things to Know**
+- Grace period of 30 days
+
+**🎯 5-Point Breakdown**
+1. Pay on time"""
+
+
+def test_splits_at_explanation_section_headers_only():
+    sections = split_sections(EXPLANATION)
+    assert [section.splitlines()[0] for section in sections] == [
+        "**📋 Summary**",
+        "**✅ Key Benefits/Features**",
+        "**⚠ Important Things to Know**",  # Without the variation selector
+        "**🎯 5-Point Breakdown**"
+    ]
+    # Bold amounts stay with the section they belong to
+    assert "**₹5,00,000** for 20 years" in sections[1]
+    assert "**$1,200 premium** per year" in sections[1]
+
+
+def test_text_before_the_first_header_is_its_own_section():
+    assert split_sections("Intro line\n\n**📋 Summary**\nBody") == ["Intro line", "**📋 Summary**\nBody"]
+
+
+def test_text_without_headers_is_one_section():
+    assert split_sections("**Note** plain text") == ["**Note** plain text"]
+
+
+def _slow_sections(started, delay=0.2):
+    async def translate_section(section, code):
+        started.append((section, current_deadline()))
+        await asyncio.sleep(delay)
+        return f"[{code}] {section}"
+    return translate_section
+
+
+def test_cancel_prefetch_releases_the_uploader_hold_once(monkeypatch):
+    started = []
+    monkeypatch.setattr(module, "translate_section", _slow_sections(started))
+    monkeypatch.setattr(settings, "TRANSLATION_PREFETCH_ENABLED", True)
+
+    async def main():
+        key = prefetch_translation("**📋 Summary**\nPrefetch cancel", "Hindi")
+        translation = module._inflight[key]
+        reader = asyncio.create_task(translate("**📋 Summary**\nPrefetch cancel", "hi"))
+        await asyncio.sleep(0.01)
+        cancel_prefetch(key)
+        cancel_prefetch(key)  # A second cancel must not drop the reader's hold
+        assert not translation.task.done()
+        return await reader
+
+    assert asyncio.run(main()) == "[hi] **📋 Summary**\nPrefetch cancel"
+    assert len(started) == 1
+
+
+def test_cancel_prefetch_stops_an_unwanted_translation(monkeypatch):
+    monkeypatch.setattr(module, "translate_section", _slow_sections([]))
+    monkeypatch.setattr(settings, "TRANSLATION_PREFETCH_ENABLED", True)
+
+    async def main():
+        key = prefetch_translation("**📋 Summary**\nNobody reads this", "Hindi")
+        translation = module._inflight[key]
+        cancel_prefetch(key)
+        await asyncio.sleep(0)
+        return translation.task
+
+    assert asyncio.run(main()).cancelled()
+
+
+def test_identical_requests_share_one_translation_outside_their_requests(monkeypatch):
+    started = []
+    monkeypatch.setattr(module, "translate_section", _slow_sections(started))
+    text = "**📋 Summary**\nShared\n\n**💡 Tip**\nJoined"
+
+    async def caller(deadline_seconds):
+        start_deadline(deadline_seconds)
+        return await translate(text, "ta")
+
+    async def main():
+        return await asyncio.gather(caller(0.05), caller(5.0), return_exceptions=True)
+
+    hurried, patient = asyncio.run(main())
+    # The hurried caller gives up on its own deadline; the work carries on for the other
+    assert isinstance(hurried.__context__, DeadlineExceeded)
+    assert patient == "[ta] **📋 Summary**\nShared\n\n[ta] **💡 Tip**\nJoined"
+    # One call per section, none of them bound to the first caller's deadline
+    assert started == [("**📋 Summary**\nShared", None), ("**💡 Tip**\nJoined", None)]
+
+
+def test_stream_wait_is_bounded_by_the_callers_deadline(monkeypatch):
+    monkeypatch.setattr(module, "translate_section", _slow_sections([], delay=1.0))
+
+    async def main():
+        start_deadline(0.05)
+        async for _ in stream_translation("**📋 Summary**\nStalled stream", "mr"):
+            pass
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+
+
+def test_router_only_translates_stored_explanations(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.routers import translate as router
+    from app.services.result_store import result_store
+
+    async def fake_translate(text, target_language, content_id=None):
+        return f"[{target_language}] {text}"
+
+    monkeypatch.setattr(router, "translate", fake_translate)
+    client = TestClient(app)
+
+    response = client.post("/api/translate", json={"text": "Translate my essay", "target_language": "hi"})
+    assert response.status_code == 404
+
+    result_store.put(EXPLANATION)
+    response = client.post("/api/translate", json={"text": EXPLANATION, "target_language": "hi"})
+    assert response.status_code == 200
+    assert response.json()["translated_text"] == f"[hi] {EXPLANATION}"
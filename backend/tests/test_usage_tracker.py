@@ -0,0 +1,17 @@
+"""
+Usage tracker: splitting a shared call across requests
+"""
+from app.services.usage_tracker import LLMCall
+
+
+def test_split_shares_add_up_to_the_call():
+    call = LLMCall("classification_batch", "gpt-4o-mini",
+                   prompt_tokens=1001, completion_tokens=302, cached_tokens=512, wall_time_ms=900)
+    shares = call.split(3)
+
+    assert sum(share.prompt_tokens for share in shares) == 1001
+    assert sum(share.completion_tokens for share in shares) == 302
+    assert sum(share.cached_tokens for share in shares) == 512
+    assert [share.prompt_tokens for share in shares] == [334, 334, 333]
+    assert all(share.cached_tokens <= share.prompt_tokens for share in shares)
+    assert all(share.wall_time_ms == 900 for share in shares)
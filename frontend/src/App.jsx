@@ -53,16 +53,34 @@ function App() {
                 if (selectedLanguage === 'hi') {
                     setIsTranslating(true)
                     try {
-                        const translateResponse = await fetch(`${apiUrl}/api/translate`, {
+                        // Reference the explanation by ID instead of posting it back
+                        const translateById = (contentId) => fetch(`${apiUrl}/api/translate-by-id`, {
                             method: 'POST',
                             headers: {
                                 'Content-Type': 'application/json'
                             },
                             body: JSON.stringify({
-                                text: data.summary,
+                                content_id: contentId,
                                 target_language: 'hi'
                             })
                         })
+                        let translateResponse = await translateById(data.content_id)
+                        if (translateResponse.status === 404) {
+                            // Result expired or was stored by another instance - upload again
+                            // (the explanation is cached, so this is quick) and use the new ID
+                            const reuploadResponse = await fetch(`${apiUrl}/api/upload`, {
+                                method: 'POST',
+                                headers: {
+                                    'X-Session-ID': sessionId,
+                                    'X-Language': 'english'
+                                },
+                                body: formData,
+                            })
+                            const reuploadData = await reuploadResponse.json()
+                            if (reuploadResponse.ok && reuploadData.content_id) {
+                                translateResponse = await translateById(reuploadData.content_id)
+                            }
+                        }
                         const translateData = await translateResponse.json()
                         if (translateResponse.ok) {
                             data.translatedSummary = translateData.translated_text